@@ -6,40 +6,63 @@
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from pymodbus.client.serial import ModbusSerialClient as ModbusClient
-import serial.tools.list_ports
-import json
-import threading
+import argparse
 import time
 
-# Constants
-LOGICAL_MIN = 0
-LOGICAL_MAX = 999
-ACTUAL_MIN = 500
-ACTUAL_MAX = 2500
-
-MODBUS_UNIT_ID = 1
-
-VALUES_LOGICAL_ADDR = 100
-VALUES_ACTUAL_ADDR = 10
-VALUES_MIN_ADDR = 20
-VALUES_MAX_ADDR = 30
-
-SERVO_NAMES = ["yaw", "horizontal", "vertical", "pitch", "twist", "grab"]
+from command_lanes import LANE_INTERACTIVE, LANE_PLAYBACK, MOTION_LANES
+from instrumentation import tracer
+from playback import PlaybackEngine
+from port_watcher import PortWatcher
+from recorder import DEFAULT_TOLERANCE, DeviceSource, Recorder, load_recording
+from register_cache import CachedSession, RegisterCache
+from registers import (LOGICAL_MIN, LOGICAL_MAX, ACTUAL_MIN, ACTUAL_MAX,
+                       VALUES_LOGICAL_ADDR, VALUES_ACTUAL_ADDR, VALUES_MIN_ADDR, VALUES_MAX_ADDR,
+                       VALUES_SPEED_ADDR, SPEED_MIN, SPEED_MAX, DEFAULT_SPEED, NUM_SERVOS,
+                       SERVO_NAMES, BAUD_RATES, BOOT_BAUDRATE, ILLEGAL_ADDRESS, ILLEGAL_FUNCTION,
+                       MODBUS_UNIT_ID)
+from kinematics import JOINTS, ArmModel, IKSolver, load_path, plan_path
+from script_lint import estimate, retime
+from script_model import (ScriptData, default_row, load_script, row_speeds, save_script,
+                          script_frames)
+from script_table import ScriptTable
+from stats_panel import StatsPanel
+from telemetry import TelemetryPoller
+from telemetry_plot import TelemetryPlot
+from tk_bridge import TkBridge
+from write_coalescer import WriteCoalescer
+
+# slider drags are flushed to the bus once per tick (seconds)
+WRITE_TICK = 0.1
+
+# longest Stop waits for the playback thread to leave, it only ever waits on its own event
+STOP_JOIN_TIMEOUT = 0.5
+
+# Go sends script rows as they are; other motion modes stream an interpolated trajectory
+MOTION_STEPS = "steps"
+
+SCRIPT_FILE_TYPES = [("JSON files", "*.txt *.json"), ("Binary scripts", "*.hss")]
+PATH_FILE_TYPES = [("Cartesian paths", "*.json")]
+
+# manual sliders follow polled device values unless touched within this many seconds
+FOLLOW_HOLD = 1.0
+
+# teach mode sources: the Script tab sliders or the positions polled from the controller
+RECORD_SLIDERS = "sliders"
+RECORD_DEVICE = "device"
 
 
 class ServoControlGroup:
-    debounce_timers = {}
-
-    def __init__(self, parent, name, index, write_callback):
+    def __init__(self, parent, name, index, write_callback, queue_write_callback):
         self.index = index
         self.write_callback = write_callback
+        self.queue_write_callback = queue_write_callback
 
         self.frame = ttk.LabelFrame(parent, text=name)
         self.frame.pack(fill='x', padx=5, pady=2)
 
         initial_value = (ACTUAL_MIN + ACTUAL_MAX) // 2
         self.value_var = tk.IntVar(value=initial_value)
+        self.touched = 0.0
 
         self.scale = ttk.Scale(
             self.frame, from_=ACTUAL_MIN, to=ACTUAL_MAX,
@@ -63,19 +86,11 @@ class ServoControlGroup:
         if self.value_var.get() == val:
             return
         self.value_var.set(val)
-
-        key = f"servo_{self.index}"
-        if key in ServoControlGroup.debounce_timers:
-            ServoControlGroup.debounce_timers[key].cancel()
-
-        def delayed_send():
-            self.write_callback("values_actual", VALUES_ACTUAL_ADDR + self.index, val)
-
-        timer = threading.Timer(0.1, delayed_send)
-        ServoControlGroup.debounce_timers[key] = timer
-        timer.start()
+        self.touched = time.monotonic()
+        self.queue_write_callback(VALUES_ACTUAL_ADDR + self.index, val)
 
     def on_entry_change(self, event):
+        self.touched = time.monotonic()
         try:
             val = int(self.entry.get())
             if ACTUAL_MIN <= val <= ACTUAL_MAX:
@@ -96,14 +111,21 @@ class ServoControlGroup:
         self.value_var.set(val)
         self.scale.set(val)
 
+    # polled device value; ignored while the user is working with this slider
+    def follow_device(self, val):
+        if time.monotonic() - self.touched > FOLLOW_HOLD and val != self.value_var.get():
+            self.update_value(val)
+
 
 class ScriptServoControl:
-    debounce_timers = {}
-    def __init__(self, parent, name, write_callback):
+    def __init__(self, parent, name, write_callback, queue_write_callback, speed_callback):
         self.name = name
         self.write_callback = write_callback
+        self.queue_write_callback = queue_write_callback
+        self.speed_callback = speed_callback
         self.updating = False
         self.var = tk.IntVar(value=499)
+        self.speed_var = tk.IntVar(value=DEFAULT_SPEED)
 
         self.frame = ttk.LabelFrame(parent, text=name)
         self.frame.pack(side="left", padx=5, pady=5)
@@ -117,6 +139,13 @@ class ScriptServoControl:
         self.scale.pack()
         self.scale.config(command=self.on_slider_change)
 
+        # ramp speed on the controller, logical units per 100 ms tick, 0 - no ramp
+        ttk.Label(self.frame, text="speed").pack()
+        self.speed_spin = ttk.Spinbox(self.frame, from_=SPEED_MIN, to=SPEED_MAX, width=5,
+                                      textvariable=self.speed_var, command=self.on_speed_change)
+        self.speed_spin.pack()
+        self.speed_spin.bind("<Return>", self.on_speed_change)
+
     def on_slider_change(self, value):
         if self.updating:
             return
@@ -124,17 +153,17 @@ class ScriptServoControl:
         if val == self.var.get():
             return
         self.var.set(val)
+        self.queue_write_callback(self.name, val)
 
-        key = f"script_{self.name}"
-        if key in ScriptServoControl.debounce_timers:
-            ScriptServoControl.debounce_timers[key].cancel()
-
-        def delayed_send():
-            self.write_callback(self.name, val)
-
-        timer = threading.Timer(0.1, delayed_send)
-        ScriptServoControl.debounce_timers[key] = timer
-        timer.start()
+    def on_speed_change(self, event=None):
+        if self.updating:
+            return
+        try:
+            val = max(SPEED_MIN, min(SPEED_MAX, int(self.speed_spin.get())))
+            self.speed_var.set(val)
+            self.speed_callback(self.name, val)
+        except ValueError:
+            pass
 
     def on_entry_change(self, event):
         if self.updating:
@@ -150,12 +179,24 @@ class ScriptServoControl:
 
 
 class ScriptTab:
-    def __init__(self, parent, write_logical_callback, write_logical_array_callback):
+    def __init__(self, parent, write_logical_callback, write_logical_array_callback,
+                 queue_logical_callback, post_callback, get_session, write_speed_callback, stop_callback):
         self.parent = parent
         self.write_logical_callback = write_logical_callback
+        self.queue_logical_callback = queue_logical_callback
+        self.write_speed_callback = write_speed_callback
         self.write_logical_array_callback = write_logical_array_callback
-        self.script_data = []
+        self.stop_callback = stop_callback  # drops queued motion and holds the arm
+        self.post_callback = post_callback  # post_callback(fn, *args) runs fn on the Tk thread
+        self.get_session = get_session
+        self.script_data = ScriptData()
         self.running = False
+        self.playback = None
+        self.recorder = None
+        self.pose = [499] * len(SERVO_NAMES)  # slider values, read by the recorder thread
+        self.path_solver = None     # kept between paths: its cache makes re-planning an edited path cheap
+        self.path_geometry = None
+        self.path_limits = None
 
         self.setup_ui()
 
@@ -164,18 +205,16 @@ class ScriptTab:
         top_frame.pack(fill="x", padx=5, pady=5)
         ttk.Button(top_frame, text="Load", command=self.load_script).pack(side="left", padx=2)
         ttk.Button(top_frame, text="Save", command=self.save_script).pack(side="left", padx=2)
+        # delays against the firmware ramp speed, see script_lint.py
+        ttk.Button(top_frame, text="Check", command=self.check_script).pack(side="left", padx=(10, 2))
+        ttk.Button(top_frame, text="Retime", command=self.retime_script).pack(side="left", padx=2)
+        ttk.Button(top_frame, text="Path", command=self.insert_path).pack(side="left", padx=(10, 2))
+        self.check_label = ttk.Label(top_frame, text="")
+        self.check_label.pack(side="left", padx=10)
 
         table_frame = ttk.Frame(self.parent)
         table_frame.pack(fill="both", expand=True, padx=5)
-        self.table = ttk.Treeview(table_frame, columns=("data",), show="headings")
-        self.table.heading("data", text="Script Row")
-        self.table.pack(side="left", fill="both", expand=True)
-
-        self.table_scroll = ttk.Scrollbar(table_frame, command=self.table.yview)
-        self.table_scroll.pack(side="right", fill="y")
-        self.table.config(yscrollcommand=self.table_scroll.set)
-
-        self.table.bind("<<TreeviewSelect>>", self.on_tree_select)
+        self.table = ScriptTable(table_frame, self.script_data, self.on_tree_select)
 
         control_frame = ttk.Frame(self.parent)
         control_frame.pack(fill="x", pady=5, padx=5)
@@ -192,12 +231,34 @@ class ScriptTab:
         self.btn_delete = ttk.Button(control_frame, text="Delete", command=self.delete_selected)
         self.btn_delete.pack(side="left", padx=2)
         self.btn_add.pack(side="left", padx=10)
+        ttk.Label(control_frame, text="motion:").pack(side="left")
+        self.motion_var = tk.StringVar(value=MOTION_STEPS)
+        self.motion_combo = ttk.Combobox(control_frame, state='readonly', width=8, textvariable=self.motion_var,
+                                         values=[MOTION_STEPS, "linear", "cubic", "minjerk"])
+        self.motion_combo.pack(side="left", padx=2)
+        self.timing_label = ttk.Label(control_frame, text="")
+        self.timing_label.pack(side="left", padx=10)
+
+        record_frame = ttk.Frame(self.parent)
+        record_frame.pack(fill="x", padx=5)
+        self.btn_record = ttk.Button(record_frame, text="Record", command=self.toggle_record)
+        self.btn_record.pack(side="left", padx=2)
+        ttk.Label(record_frame, text="from:").pack(side="left")
+        self.record_source_var = tk.StringVar(value=RECORD_SLIDERS)
+        ttk.Combobox(record_frame, state='readonly', width=8, textvariable=self.record_source_var,
+                     values=[RECORD_SLIDERS, RECORD_DEVICE]).pack(side="left", padx=2)
+        ttk.Label(record_frame, text="tolerance:").pack(side="left")
+        self.tolerance_var = tk.IntVar(value=DEFAULT_TOLERANCE)
+        ttk.Entry(record_frame, width=4, textvariable=self.tolerance_var).pack(side="left", padx=2)
+        self.record_label = ttk.Label(record_frame, text="")
+        self.record_label.pack(side="left", padx=10)
 
         self.servo_controls = {}
         servo_frame = ttk.Frame(self.parent)
         servo_frame.pack(fill="x", pady=5)
         for name in SERVO_NAMES:
-            control = ScriptServoControl(servo_frame, name, self.write_logical_callback)
+            control = ScriptServoControl(servo_frame, name, self.on_pose_write, self.on_pose_queue,
+                                         self.write_speed_callback)
             self.servo_controls[name] = control
 
         delay_frame = ttk.Frame(self.parent)
@@ -206,39 +267,99 @@ class ScriptTab:
         self.delay_var = tk.IntVar(value=2000)
         self.delay_entry = ttk.Entry(delay_frame, width=8, textvariable=self.delay_var)
         self.delay_entry.pack(side="left")
+        # rows with a speed send it with their targets, the controller ramps between rows
+        self.row_speed_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(delay_frame, text="speed in row", variable=self.row_speed_var).pack(side="left", padx=10)
 
-        default_entry = {"servos": {name: 499 for name in SERVO_NAMES}, "delay": 2000}
-        self.script_data.append(default_entry)
+        self.script_data.append(default_row())
         self.refresh_table()
-        self.update_step_button()
 
+    # full redraw, only needed when the whole script is replaced
     def refresh_table(self):
-        self.table.delete(*self.table.get_children())
-        for i, row in enumerate(self.script_data, start=1):
-            self.table.insert("", "end", iid=str(i), values=(json.dumps(row),))
+        self.table.set_data(self.script_data)
         self.update_step_button()
 
     def load_script(self):
-        path = filedialog.askopenfilename(filetypes=[("JSON files", "*.txt *.json")])
+        path = filedialog.askopenfilename(filetypes=SCRIPT_FILE_TYPES)
         if not path:
             return
         try:
-            with open(path, "r") as f:
-                self.script_data = json.load(f)
+            self.script_data = load_script(path)
             self.refresh_table()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load script: {e}")
 
     def save_script(self):
-        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=SCRIPT_FILE_TYPES)
         if not path:
             return
         try:
-            with open(path, "w") as f:
-                json.dump(self.script_data, f, indent=2)
+            save_script(path, self.script_data)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save script: {e}")
 
+    # mark the rows the arm can not finish before the next one starts
+    def check_script(self):
+        report = estimate(self.script_data)
+        late = report.late_rows()
+        self.table.set_marked(late.tolist())
+        text = f"{len(late)} late rows" if len(late) else "no late rows"
+        self.check_label.config(
+            text=f"{text}, {report.duration / 1000:.1f} s, arm at rest {report.finish / 1000:.1f} s")
+        for row in late[:3]:
+            print(report.describe(row))
+
+    def retime_script(self):
+        if self.running:
+            return
+        self.script_data, changed = retime(self.script_data)
+        self.refresh_table()
+        print(f"{changed} rows retimed")
+        self.check_script()
+
+    # compile a Cartesian path file (see kinematics.py) and insert its rows after the selected row
+    def insert_path(self):
+        path = filedialog.askopenfilename(filetypes=PATH_FILE_TYPES)
+        if not path:
+            return
+        try:
+            waypoints, geometry = load_path(path)
+            solver = self.get_path_solver(geometry or {})
+            warm = solver.arm.to_angles(self.pose[:len(JOINTS)])
+            rows = plan_path(waypoints, solver, warm=warm)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to plan path: {e}")
+            return
+        print("path", len(waypoints), "waypoints ->", len(rows), "rows, ik cache", solver.stats())
+        selected = self.table.selected_row()
+        index = len(self.script_data) if selected is None else selected + 1
+        self.script_data.insert_data(index, rows)
+        self.table.rows_inserted(index, len(rows))
+        self.table.select_row(index, notify=False)
+        self.show_row(index)
+
+    # the solver of the last path while geometry and servo limits stay the same
+    def get_path_solver(self, geometry):
+        if self.path_solver is None or geometry != self.path_geometry:
+            self.path_solver = IKSolver(ArmModel.from_config(geometry))
+            self.path_geometry = geometry
+            self.path_limits = None
+        limits = self.servo_limits()
+        if limits != self.path_limits:
+            self.path_solver.set_limits(*limits)
+            self.path_limits = limits
+        return self.path_solver
+
+    # min/max pulses from the register cache, (None, None) until they have been read
+    def servo_limits(self):
+        cache = getattr(self.get_session(), "cache", None)
+        if cache is None:
+            return None, None
+        mins, maxs = cache.get(VALUES_MIN_ADDR, NUM_SERVOS), cache.get(VALUES_MAX_ADDR, NUM_SERVOS)
+        if None in mins or None in maxs:
+            return None, None
+        return mins, maxs
+
     def on_slider_change(self, name, value):
         if self.servo_controls[name].get("updating"):
             return
@@ -273,80 +394,160 @@ class ScriptTab:
         except ValueError:
             pass
 
+    def on_pose_write(self, name, value):
+        self.pose[SERVO_NAMES.index(name)] = value
+        self.write_logical_callback(name, value)
+
+    def on_pose_queue(self, name, value):
+        self.pose[SERVO_NAMES.index(name)] = value
+        self.queue_logical_callback(name, value)
+
+    def toggle_record(self):
+        if self.recorder is None:
+            self.start_record()
+        else:
+            self.stop_record()
+
+    def start_record(self):
+        if self.record_source_var.get() == RECORD_DEVICE:
+            session = self.get_session()
+            if session is None or not session.connected:
+                messagebox.showerror("Error", "Connect to the controller to record its positions")
+                return
+            source = DeviceSource(session)
+        else:
+            source = lambda: list(self.pose)
+        self.recorder = Recorder(source).start()
+        self.btn_record.config(text="Stop recording")
+        self.record_label.config(text=f"recording to {self.recorder.path}")
+
+    # reduce the recording to keyframes and insert them after the selected row
+    def stop_record(self):
+        recorder, self.recorder = self.recorder, None
+        self.btn_record.config(text="Record")
+        path = recorder.stop()
+        try:
+            keyframes = load_recording(path, self.tolerance_var.get())
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to read recording: {e}")
+            return
+        self.record_label.config(text=f"{recorder.samples} samples -> {len(keyframes)} rows, log {path}")
+        if not len(keyframes):
+            return
+        selected = self.table.selected_row()
+        index = len(self.script_data) if selected is None else selected + 1
+        self.script_data.insert_data(index, keyframes)
+        self.table.rows_inserted(index, len(keyframes))
+        self.table.select_row(index, notify=False)
+        self.show_row(index)
+
+    # the row shown in the controls, as added or updated into the script
+    def current_row(self):
+        row = {"servos": {name: self.servo_controls[name].var.get() for name in SERVO_NAMES},
+               "delay": self.delay_var.get()}
+        if self.row_speed_var.get():
+            row["speed"] = {name: self.servo_controls[name].speed_var.get() for name in SERVO_NAMES}
+        return row
+
     def add_after(self):
-        selected = self.table.selection()
-        if not selected:
+        selected = self.table.selected_row()
+        if selected is None:
             index = len(self.script_data)
         else:
-            all_iids = self.table.get_children()
-            index = all_iids.index(selected[0]) + 1
-
-        new_row = {
-            "servos": {name: self.servo_controls[name].var.get() for name in SERVO_NAMES},
-            "delay": self.delay_var.get()
-        }
-        self.script_data.insert(index, new_row)
-        self.refresh_table()
-        if self.table.get_children():
-            self.table.selection_set(self.table.get_children()[index if index < len(self.script_data) else -1])
+            index = selected + 1
+
+        self.script_data.insert(index, self.current_row())
+        self.table.rows_inserted(index)
+        self.table.select_row(index)
 
     def update_step_button(self):
-        if not self.table.selection():
+        if self.table.selected_row() is None:
             self.btn_step.config(state="normal")
 
     def step(self):
-        all_iids = self.table.get_children()
-        selected = self.table.selection()
-        if not all_iids:
+        if not len(self.script_data):
             return
-        if not selected:
+        selected = self.table.selected_row()
+        if selected is None:
             next_index = 0
         else:
-            current_index = all_iids.index(selected[0])
-            if current_index + 1 >= len(all_iids):
+            if selected + 1 >= len(self.script_data):
                 self.running = False  # End of script
                 return
-            next_index = current_index + 1
+            next_index = selected + 1
 
-        next_iid = all_iids[next_index]
-        self.table.selection_set(next_iid)
-        # Treeview selection change will trigger on_tree_select automatically
-        # Removed redundant focus to avoid duplicate event triggers
+        # selecting the row sends it through on_tree_select
+        self.table.select_row(next_index)
 
     def go(self):
         if self.running:
             return
+        selected = self.table.selected_row()
+        start_index = selected + 1 if selected is not None else 0
+        if start_index >= len(self.script_data):
+            return
+        if self.motion_var.get() == MOTION_STEPS:
+            frames = script_frames(self.script_data)
+            on_progress = lambda index: self.post_callback(self.on_playback_progress, index)
+        else:
+            frames, on_progress = self.stream_frames(start_index)
+            start_index = 0
         self.running = True
-
-        def run_loop():
-            while self.running:
-                self.step()
-                if not self.running:
-                    break
-                time.sleep(self.delay_var.get() / 1000.0)
-            self.running = False
-
-        threading.Thread(target=run_loop, daemon=True).start()
+        self.playback = PlaybackEngine(
+            frames, lambda values: self.write_logical_array_callback(values, LANE_PLAYBACK),
+            on_progress=on_progress,
+            on_finished=lambda engine: self.post_callback(self.on_playback_finished, engine),
+            start_index=start_index).start()
+
+    # smooth motion: interpolate the remaining rows into a fixed-rate setpoint stream
+    def stream_frames(self, start_index):
+        from trajectory import compile_trajectory
+        trajectory = compile_trajectory(self.script_data[start_index:], profile=self.motion_var.get())
+        rows = (trajectory.rows + start_index).tolist()
+        last_row = [None]
+
+        def on_progress(index):
+            if rows[index] != last_row[0]:
+                last_row[0] = rows[index]
+                self.post_callback(self.on_playback_progress, rows[index])
+
+        return trajectory.frames(), on_progress
+
+    # playback progress, on the Tk thread: show the row without sending it again
+    def on_playback_progress(self, index):
+        if index < len(self.script_data):
+            self.table.select_row(index, notify=False)
+            self.show_row(index)
+
+    def on_playback_finished(self, engine):
+        if engine is not self.playback:
+            return
+        self.running = False
+        self.playback = None
+        report = engine.timing_report()
+        print("playback timing", report)
+        if report["rows"]:
+            self.timing_label.config(text="late avg {:.1f} ms, max {:.1f} ms, jitter {:.1f} ms".format(
+                report["mean_late_ms"], report["max_late_ms"], report["jitter_ms"]))
 
     def send_current_row(self):
-        selected = self.table.selection()
-        if not selected:
+        selected = self.table.selected_row()
+        if selected is None:
             return
-        item = self.table.item(selected[0])
         try:
-            row = json.loads(item['values'][0])
-            values = [row['servos'].get(name, 499) for name in SERVO_NAMES]
-            self.write_logical_array_callback(values)
+            # targets and speed of the row in one request
+            self.write_logical_array_callback(self.script_data.frame(selected))
         except Exception as e:
             print("error sending current row ->", e)
 
-    def on_tree_select(self, event):
-        selected = self.table.selection()
-        if not selected:
-            return
-        item = self.table.item(selected[0])
+    def on_tree_select(self, index):
+        self.show_row(index)
+        self.send_current_row()
+
+    # load a row into the servo controls without sending anything
+    def show_row(self, index):
         try:
-            row = json.loads(item['values'][0])
+            row = self.script_data[index]
             for name in SERVO_NAMES:
                 value = row['servos'].get(name, 499)
                 self.servo_controls[name].updating = True
@@ -355,52 +556,70 @@ class ScriptTab:
                 self.servo_controls[name].entry.delete(0, tk.END)
                 self.servo_controls[name].entry.insert(0, str(value))
                 self.servo_controls[name].updating = False
+                self.pose[SERVO_NAMES.index(name)] = value
             self.delay_var.set(row.get('delay', 2000))
-            self.send_current_row()
-            # self.send_current_row()
+            speeds = row_speeds(row)
+            self.row_speed_var.set(speeds is not None)
+            for name, speed in zip(SERVO_NAMES, speeds or []):
+                self.servo_controls[name].speed_var.set(speed)
         except Exception as e:
             print("error parsing selected row ->", e)
 
     def delete_selected(self):
-        selected = self.table.selection()
-        if not selected:
+        index = self.table.selected_row()
+        if index is None:
             return
-        index = self.table.index(selected[0])
         if len(self.script_data) <= 1:
             print("Cannot delete last remaining row")
             return
         self.script_data.pop(index)
-        self.refresh_table()
-        remaining = self.table.get_children()
-        if remaining:
-            new_index = max(0, index - 1)
-            self.table.selection_set(remaining[new_index])
+        self.table.rows_deleted(index)
+        self.table.select_row(max(0, index - 1))
 
     def update_selected(self):
-        selected = self.table.selection()
-        if not selected:
+        index = self.table.selected_row()
+        if index is None:
             return
         try:
-            index = self.table.index(selected[0])
-            values = {name: self.servo_controls[name].var.get() for name in SERVO_NAMES}
-            delay_val = self.delay_var.get()
-            full = {"servos": values, "delay": delay_val}
-            self.script_data[index] = full
-            self.refresh_table()
-            self.table.selection_set(self.table.get_children()[index])
+            self.script_data[index] = self.current_row()
+            self.table.row_updated(index)
+            self.table.select_row(index)
         except Exception as e:
             print("error updating row ->", e)
 
     def stop(self):
         self.running = False
+        if self.playback is not None:
+            self.playback.stop()
+            # the engine never blocks on I/O, once it is gone no row can slip in after the drop
+            self.playback.join(STOP_JOIN_TIMEOUT)
+        self.stop_callback()
 
 
 class ModbusServoApp:
-    def __init__(self, root):
+    def __init__(self, root, session_factory=None, extra_ports=(), trace_path=None, unit=MODBUS_UNIT_ID, port=None):
         self.root = root
         self.root.title("Modbus Servo Control")
-        self.client = None
+        self.session_factory = session_factory or transport_factory("thread")
+        self.extra_ports = list(extra_ports)  # e.g. the controller simulator
+        self.port = port                      # port to open as soon as it shows up
+        self.ports = {}                       # device -> identity, last port scan
+        self.port_identity = None             # identity of the open port, follows it to a new name
+        self.trace_path = trace_path          # Chrome trace written on close
+        self.unit = unit                      # Modbus unit id of the controller
+        self.speed_supported = True           # cleared when the firmware rejects 106..111
+        self.readback_supported = True        # cleared when the firmware rejects FC23
+        self.cache = RegisterCache()          # shadow registers, repeated writes are not sent
+        self.session = None
+        self.bridge = TkBridge(root).start()
+        self.coalescer = WriteCoalescer(self.write_block, tick=WRITE_TICK).start()
+        self.telemetry = TelemetryPoller(lambda: self.session,
+                                         on_sample=lambda sample: self.bridge.post(self.on_telemetry, sample))
+        self.port_watcher = PortWatcher(lambda ports: self.bridge.post(self.on_ports_changed, ports))
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.telemetry.start()
+        self.port_watcher.start()
 
     def setup_ui(self):
         top_frame = ttk.Frame(self.root)
@@ -408,10 +627,17 @@ class ModbusServoApp:
 
         ttk.Label(top_frame, text="COM port:").pack(side='left')
         self.combobox = ttk.Combobox(top_frame, state='readonly')
-        self.combobox['values'] = self.get_serial_ports()
+        self.combobox['values'] = self.extra_ports  # serial ports are added by the port watcher
         self.combobox.bind("<<ComboboxSelected>>", self.on_port_selected)
         self.combobox.pack(side='left', padx=5)
 
+        ttk.Label(top_frame, text="Baud:").pack(side='left')
+        self.baud_combobox = ttk.Combobox(top_frame, state='readonly', width=8,
+                                          values=[str(b) for b in BAUD_RATES])
+        self.baud_combobox.set(str(BOOT_BAUDRATE))
+        self.baud_combobox.bind("<<ComboboxSelected>>", self.on_baud_selected)
+        self.baud_combobox.pack(side='left', padx=5)
+
         self.status_label = tk.Label(top_frame, text="not available", bg='red', fg='white', width=15)
         self.status_label.pack(side='left', padx=10)
 
@@ -422,46 +648,96 @@ class ModbusServoApp:
         self.tabs.add(self.manual_tab, text="Manual")
         self.script_tab = ttk.Frame(self.tabs)
         self.tabs.add(self.script_tab, text="Script")
+        self.telemetry_tab = ttk.Frame(self.tabs)
+        self.tabs.add(self.telemetry_tab, text="Telemetry")
 
         self.servo_controls = []
         for i, name in enumerate(SERVO_NAMES):
-            group = ServoControlGroup(self.manual_tab, name, i, self.write_register)
+            group = ServoControlGroup(self.manual_tab, name, i, self.write_register, self.queue_register)
             self.servo_controls.append(group)
 
-        self.script = ScriptTab(self.script_tab, self.write_logical_named, self.write_logical_array)
+        self.script = ScriptTab(self.script_tab, self.write_logical_named, self.write_logical_array,
+                                self.queue_logical_named, self.bridge.post, lambda: self.session,
+                                self.write_speed_named, self.stop_motion)
 
-    def get_serial_ports(self):
-        ports = serial.tools.list_ports.comports()
-        return [port.device for port in ports]
+        self.telemetry_plot = TelemetryPlot(self.telemetry_tab, self.telemetry.history)
+        self.stats_panel = StatsPanel(self.telemetry_tab, tracer,
+                                      lambda: self.session.link_baudrate if self.session is not None else None)
 
-    def on_port_selected(self, event):
+    # hot-plug: refresh the list, reconnect when the open port is back, follow it to a new device name
+    def on_ports_changed(self, ports):
+        previous, self.ports = self.ports, dict(ports)
+        self.combobox['values'] = [device for device, _ in ports] + self.extra_ports
         port = self.combobox.get()
         if not port:
-            self.set_status(False)
+            if self.port in self.ports or self.port in self.extra_ports:
+                self.combobox.set(self.port)
+                self.on_port_selected(None)
             return
-        self.client = ModbusClient(port=port, baudrate=9600, timeout=1,
-                                   stopbits=1, bytesize=8, parity='N')
-        if not self.client.connect():
+        if port in self.extra_ports:
+            return
+        if port in self.ports:
+            if port not in previous and self.session is not None:
+                print(f"{port} is back, reconnecting")
+                self.session.reconnect_now()
+            return
+        if port in previous:
+            print(f"{port} unplugged")
+        moved = [device for device, identity in ports if identity is not None and identity == self.port_identity]
+        if moved:
+            print(f"{port} is back as {moved[0]}")
+            self.combobox.set(moved[0])
+            self.on_port_selected(None)
+
+    def on_port_selected(self, event):
+        port = self.combobox.get()
+        if self.session is not None and self.session.port != port:
+            self.session.close()
+            self.session = None
+        if not port:
             self.set_status(False)
-            print("error read values_actual -> connect failed")
             return
+        self.port_identity = self.ports.get(port)
+        if self.session is None:
+            self.speed_supported = True
+            self.readback_supported = True
+            self.session = CachedSession(self.session_factory(
+                port, baudrate=int(self.baud_combobox.get()), unit=self.unit,
+                on_status=lambda ok: self.bridge.post(self.on_session_status, ok)), self.cache).start()
+        self.bridge.deliver(self.session.read_registers(VALUES_ACTUAL_ADDR, 6), self.on_actual_values_read)
+
+    # the session negotiates the new rate with the controller, and again after every reconnect
+    def on_baud_selected(self, event):
+        if self.session is not None:
+            self.bridge.deliver(self.session.set_baudrate(int(self.baud_combobox.get())), self.on_baud_set)
+
+    def on_baud_set(self, future):
         try:
+            print("link baud rate", future.result())
+        except Exception as e:
+            print("error set baud rate ->", e)
+            self.baud_combobox.set(str(self.session.link_baudrate if self.session is not None else BOOT_BAUDRATE))
 
-            result = self.client.read_holding_registers(address=VALUES_ACTUAL_ADDR, count=6)
-            if hasattr(result, "registers"):
-                values = result.registers
-                print("got values_actual [0..5]", ", ".join(map(str, values)))
-                for i, val in enumerate(values):
-                    self.servo_controls[i].update_value(val)
-                self.set_status(True)
-            else:
-                print("error read values_actual ->", result)
-                self.set_status(False)
+    def on_actual_values_read(self, future):
+        try:
+            values = future.result()
         except Exception as e:
             print("error read values_actual ->", e)
             self.set_status(False)
-        finally:
-            self.client.close()
+            return
+        print("got values_actual [0..5]", ", ".join(map(str, values)))
+        for i, val in enumerate(values):
+            self.servo_controls[i].update_value(val)
+        self.set_status(True)
+
+    def on_session_status(self, connected):
+        self.set_status(connected)
+        if connected:
+            self.telemetry.request_full()
+
+    def on_telemetry(self, sample):
+        for control, val in zip(self.servo_controls, sample["actual"]):
+            control.follow_device(val)
 
     def set_status(self, is_ready):
         if is_ready:
@@ -469,49 +745,200 @@ class ModbusServoApp:
         else:
             self.status_label.config(text="not available", bg='red')
 
+    def on_close(self):
+        if self.script.recorder is not None:
+            print("recording kept in", self.script.recorder.stop())
+        self.port_watcher.stop()
+        self.telemetry.stop()
+        self.bridge.stop()
+        self.coalescer.stop()
+        print("write coalescer stats", self.coalescer.stats())
+        print("transport counters", tracer.snapshot_counters())
+        print("register cache stats", self.cache.stats())
+        if self.trace_path:
+            baudrate = self.session.link_baudrate if self.session is not None else None
+            print(f"trace written to {self.trace_path},", tracer.export_chrome(self.trace_path, baudrate), "events")
+        if self.session is not None:
+            self.session.close()
+        self.root.destroy()
+
+    # Stop: nothing queued for the arm goes out any more, the hold overtakes the rest of the queue
+    def stop_motion(self):
+        pending = self.coalescer.clear()
+        if self.session is None:
+            return
+        start = time.perf_counter()
+        dropped = self.session.drop(MOTION_LANES)
+        future = self.session.hold()
+        log_send(f"stop: hold, {dropped} queued commands and {pending} slider values dropped", future)
+        future.add_done_callback(lambda f: self.on_hold_done(f, start))
+
+    # I/O side, stop-to-bus latency: Stop pressed until the hold is answered
+    def on_hold_done(self, future, start):
+        latency = time.perf_counter() - start
+        tracer.span("stop", start, start + latency)
+        if future.exception() is not None:
+            print("error hold ->", future.exception(), f"#{future.txn_id}")
+            return
+        print("hold at", ", ".join(map(str, future.result())), f"after {latency * 1000:.0f} ms")
+        self.telemetry.boost()
+
     def write_register(self, reg_type, address, value):
-        port = self.combobox.get()
-        if not port:
-            print(f"error send {reg_type} [{address % 10}] {value} -> port not selected")
+        # a direct write supersedes whatever the slider left pending for this register
+        self.coalescer.discard(address)
+        if self.session is None:
+            print(f"error send {reg_type} [{register_index(address)}] {value} -> port not selected")
             return
-        print(f"send {reg_type} [{address % 10}] {value}")
-        try:
-            self.client = ModbusClient(
-                port=port, baudrate=9600, timeout=1,
-                stopbits=1, bytesize=8, parity='N')
-            if self.client.connect():
-                self.client.write_register(address=address, value=value)
-                self.client.close()
-            else:
-                print(f"error send {reg_type} [{address % 10}] {value} -> connect failed")
-        except Exception as e:
-            print(f"error send {reg_type} [{address % 10}] {value} -> {e}")
+        future = self.session.write_register(address, value)
+        log_send(f"send {reg_type} [{register_index(address)}] {value}", future)
+        if address >= VALUES_MIN_ADDR and address < VALUES_MAX_ADDR + len(SERVO_NAMES):
+            self.telemetry.request_full()
+        else:
+            self.telemetry.boost()
+        future.add_done_callback(
+            lambda f: report_error(f, f"error send {reg_type} [{register_index(address)}] {value} ->"))
 
     def write_logical_named(self, name, value):
         if name in SERVO_NAMES:
             index = SERVO_NAMES.index(name)
             self.write_register("values_logical", VALUES_LOGICAL_ADDR + index, value)
 
-    def write_logical_array(self, values):
-        port = self.combobox.get()
-        if not port:
-            print("send values_logical [0..5]", ", ".join(map(str, values)), " -> port not selected")
+    def write_speed_named(self, name, value):
+        if name in SERVO_NAMES:
+            self.write_register("values_speed", VALUES_SPEED_ADDR + SERVO_NAMES.index(name), value)
+
+    # slider drags: only the newest value per register is sent on the next coalescer tick
+    def queue_register(self, address, value):
+        self.coalescer.set(address, value)
+
+    def queue_logical_named(self, name, value):
+        if name in SERVO_NAMES:
+            self.queue_register(VALUES_LOGICAL_ADDR + SERVO_NAMES.index(name), value)
+
+    # called from the coalescer thread with a run of contiguous registers
+    def write_block(self, address, values):
+        if self.session is None:
+            print(f"error send [{address}..{address + len(values) - 1}]", ", ".join(map(str, values)),
+                  "-> port not selected")
             return
-        print("send values_logical [0..5]", ", ".join(map(str, values)))
-        try:
-            self.client = ModbusClient(port=port, baudrate=9600, timeout=1,
-                                       stopbits=1, bytesize=8, parity='N')
-            if self.client.connect():
-
-                self.client.write_registers(address=VALUES_LOGICAL_ADDR, values=values)
-                self.client.close()
-            else:
-                print("error send values_logical [0..5] -> connect failed")
-        except Exception as e:
-            print("error send values_logical [0..5] ->", e)
+        future = self.send_block(address, values)
+        log_send(f"send [{address}..{address + len(values) - 1}] " + ", ".join(map(str, values)), future)
+        future.add_done_callback(lambda f: self.on_write_done(
+            f, lambda: self.write_block(address, values), f"error send [{address}..{address + len(values) - 1}] ->"))
+
+    # targets of all servos, optionally followed by their speeds (100..111) in the same request
+    def write_logical_array(self, values, lane=LANE_INTERACTIVE):
+        if not self.speed_supported:
+            values = values[:NUM_SERVOS]
+        span = f"[0..{len(values) - 1}]"
+        if self.session is None:
+            print(f"send values_logical {span}", ", ".join(map(str, values)), " -> port not selected")
+            return
+        future = self.send_block(VALUES_LOGICAL_ADDR, values, lane)
+        log_send(f"send values_logical {span} " + ", ".join(map(str, values)), future)
+        if len(values) > NUM_SERVOS:
+            future.add_done_callback(lambda f: self.on_speed_write_done(f, values, lane))
+        else:
+            future.add_done_callback(lambda f: self.on_write_done(
+                f, lambda: self.write_logical_array(values, lane), f"error send values_logical {span} ->"))
+
+    # firmware without speed registers rejects the whole write: send the targets alone from now on
+    def on_speed_write_done(self, future, values, lane):
+        if getattr(future.exception(), "exception_code", None) == ILLEGAL_ADDRESS:
+            print("controller has no speed registers, row speeds are ignored ->", future.exception())
+            self.speed_supported = False
+            self.write_logical_array(values[:NUM_SERVOS], lane)
+        else:
+            self.on_write_done(future, lambda: self.write_logical_array(values, lane),
+                               f"error send values_logical [0..{len(values) - 1}] ->")
+
+    # one FC23 frame: the block is written and values_actual comes back in the reply, so the
+    # UI follows the arm without a poll. Without FC23 the write goes alone and the poller catches up
+    def send_block(self, address, values, lane=LANE_INTERACTIVE):
+        if not self.readback_supported:
+            self.telemetry.boost()
+            return self.session.write_registers(address, values, lane=lane)
+        future = self.session.readwrite_registers(address, values, VALUES_ACTUAL_ADDR, NUM_SERVOS, lane=lane)
+        future.add_done_callback(self.on_readback)
+        return future
+
+    # I/O side; None when the register cache found nothing to send
+    def on_readback(self, future):
+        if future.exception() is None and future.result() is not None:
+            self.telemetry.record(future.result())
+
+    # firmware without FC23 rejects the frame: it and every write after it go out as plain writes
+    def on_write_done(self, future, resend, message):
+        if getattr(future.exception(), "exception_code", None) != ILLEGAL_FUNCTION:
+            report_error(future, message)
+            return
+        if self.readback_supported:
+            print("controller does not serve FC23, writes go out without readback ->", future.exception())
+            self.readback_supported = False
+        resend()
+
+
+# servo index of a register for log lines
+def register_index(address):
+    if VALUES_SPEED_ADDR <= address < VALUES_SPEED_ADDR + NUM_SERVOS:
+        return address - VALUES_SPEED_ADDR
+    return address % 10
+
+
+# the #id in the log is the transaction id in the exported trace
+def log_send(message, future):
+    txn_id = getattr(future, "txn_id", None)
+    if txn_id is None:
+        print(f"{message} - unchanged, not sent")
+        return
+    print(f"{message} #{txn_id}")
+    tracer.instant(message, txn=txn_id)
+
+
+def report_error(future, message):
+    error = future.exception()
+    if error is not None:
+        print(message, error, f"#{getattr(future, 'txn_id', None)}")
+
+
+# session_factory for ModbusServoApp. The transport stack (pymodbus, pyserial) is
+# imported when the first port is opened, the window does not wait for it
+def transport_factory(backend, simulator=None):
+    def factory(port, **kwargs):
+        if backend == "asyncio":
+            from async_session import AsyncModbusSession
+            return AsyncModbusSession(port, **kwargs)
+        from modbus_session import ModbusSession
+        if simulator is not None:
+            from controller_sim import SIM_PORT
+            if port == SIM_PORT:
+                kwargs["client_factory"] = simulator.client_factory
+        return ModbusSession(port, **kwargs)
+    return factory
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Modbus Servo Control")
+    parser.add_argument("--backend", choices=["thread", "asyncio"], default="thread",
+                        help="Modbus transport: blocking client on an I/O thread or asyncio event loop")
+    parser.add_argument("--simulate", action="store_true",
+                        help="offer the built-in controller simulator in the port list")
+    parser.add_argument("--port", help="serial port to open as soon as it is plugged in")
+    parser.add_argument("--unit", type=int, default=MODBUS_UNIT_ID, help="Modbus unit id of the controller")
+    parser.add_argument("--trace", help="write a Chrome trace of all Modbus transactions to this file on exit")
+    args = parser.parse_args()
+
+    simulator = None
+    extra_ports = []
+    if args.simulate:
+        from controller_sim import SIM_PORT, ControllerSimulator
+        simulator = ControllerSimulator(unit=args.unit).start()
+        # the asyncio client opens a real device, it gets the simulator on a pty
+        extra_ports.append(simulator.open_pty() if args.backend == "asyncio" else SIM_PORT)
+
     root = tk.Tk()
-    app = ModbusServoApp(root)
+    app = ModbusServoApp(root, transport_factory(args.backend, simulator), extra_ports, args.trace, args.unit,
+                         args.port)
     root.mainloop()
+    if simulator is not None:
+        simulator.stop()
@@ -0,0 +1,377 @@
+# hand-stand/pc-app/async_session.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Optional asyncio transport backend built on pymodbus AsyncModbusSerialClient.
+#
+# All async sessions share one event loop running on a background thread.
+# The public API mirrors ModbusSession (read_registers, write_register,
+# write_registers return concurrent.futures.Future), so the app can pick
+# either backend. Inside the loop the same requests are available as
+# coroutines (read, write, write_many) with a per-request timeout.
+# Results reach tkinter through TkBridge, the GUI thread never waits on I/O.
+# Requests are traced like in ModbusSession, gate wait counts as queue time.
+# LaneGate hands the wire to waiting requests by command_lanes priority.
+
+import asyncio
+import contextlib
+import threading
+import time
+from collections import deque
+
+from pymodbus.client import AsyncModbusSerialClient
+
+from command_lanes import LANE_INTERACTIVE, LANE_STOP, LANES, MOTION_LANES, expired, lane_deadline
+from instrumentation import tracer
+from modbus_session import (BAUD_SWITCH_DELAY, DEFAULT_BAUDRATE, DEFAULT_TIMEOUT, RECONNECT_DELAY,
+                            RECONNECT_DELAY_MAX, TRACE_PACKET, UNIT_KWARG, ModbusError, check, count_failure,
+                            link_lost, set_client_baudrate)
+from registers import (BAUD_ADDR, BAUD_PROBATION, BAUD_RATES, BOOT_BAUDRATE, MODBUS_UNIT_ID, NUM_SERVOS,
+                       VALUES_ACTUAL_ADDR)
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+# the single event loop shared by every async session
+def event_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="modbus-asyncio", daemon=True).start()
+        return _loop
+
+
+# asyncio counterpart of CommandLanes: the wire goes to the oldest waiter of the highest lane
+class LaneGate:
+    def __init__(self):
+        self.busy = False
+        self.waiters = [deque() for _ in LANES]
+
+    @contextlib.asynccontextmanager
+    async def slot(self, lane):
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, lane):
+        if not self.busy:
+            self.busy = True
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[lane].append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # handed the wire, but cancelled before using it
+            elif waiter in self.waiters[lane]:
+                self.waiters[lane].remove(waiter)
+            raise
+
+    def release(self):
+        for waiters in self.waiters:
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.busy = False
+
+    # fail every waiter of the given lanes, returns how many
+    def drop(self, lanes, message):
+        dropped = 0
+        for lane in lanes:
+            for waiter in self.waiters[lane]:
+                if not waiter.done():
+                    waiter.set_exception(ModbusError(message))
+                    dropped += 1
+            self.waiters[lane].clear()
+        return dropped
+
+
+class AsyncModbusSession:
+    def __init__(self, port, baudrate=DEFAULT_BAUDRATE, timeout=DEFAULT_TIMEOUT,
+                 unit=MODBUS_UNIT_ID, on_status=None, reconnect_delay=RECONNECT_DELAY,
+                 reconnect_delay_max=RECONNECT_DELAY_MAX, boot_baudrate=BOOT_BAUDRATE):
+        self.port = port
+        self.baudrate = baudrate            # wanted link rate, negotiated after connect
+        self.boot_baudrate = boot_baudrate  # rate the controller listens at after reset
+        self.link_baudrate = boot_baudrate  # rate the port runs at right now
+        self.timeout = timeout
+        self.unit = unit
+        self.on_status = on_status  # called from the event loop thread with True/False
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_delay_max = reconnect_delay_max
+
+        self.loop = event_loop()
+        self.client = None
+        self.connected = False
+        self.closing = False
+        self.gate = LaneGate()
+        self.backoff = reconnect_delay
+        self.next_attempt = 0.0
+        self.was_connected = False
+        self.current = None  # transaction on the wire, fed by the trace_packet hook
+
+    def start(self):
+        asyncio.run_coroutine_threadsafe(self.reconnect(), self.loop)
+        return self
+
+    def close(self):
+        if self.closing:
+            return
+        self.closing = True
+        future = asyncio.run_coroutine_threadsafe(self.disconnect(), self.loop)
+        try:
+            future.result(timeout=2)
+        except Exception:
+            pass
+
+    # ---- thread-safe API, returns concurrent.futures.Future ----
+
+    # run coroutine fn(client, *args) in the loop with a per-request timeout, lane and deadline as in ModbusSession
+    def submit(self, fn, *args, timeout=None, lane=LANE_INTERACTIVE, deadline=None):
+        txn = tracer.transaction(fn.__name__.lstrip("_"))
+        request = self.request(fn, args, timeout, txn, lane, lane_deadline(lane, deadline))
+        future = asyncio.run_coroutine_threadsafe(request, self.loop)
+        future.txn_id = txn.id  # correlates the caller's log line with the trace
+        return future
+
+    # unit overrides the session's unit id, for several controllers on one RS-485 bus
+    def read_registers(self, address, count, timeout=None, unit=None, lane=LANE_INTERACTIVE, deadline=None):
+        return self.submit(_read_registers, self.unit if unit is None else unit, address, count, timeout=timeout,
+                           lane=lane, deadline=deadline)
+
+    def write_register(self, address, value, timeout=None, unit=None, lane=LANE_INTERACTIVE, deadline=None):
+        return self.submit(_write_register, self.unit if unit is None else unit, address, value, timeout=timeout,
+                           lane=lane, deadline=deadline)
+
+    def write_registers(self, address, values, timeout=None, unit=None, lane=LANE_INTERACTIVE, deadline=None):
+        return self.submit(_write_registers, self.unit if unit is None else unit, address, list(values),
+                           timeout=timeout, lane=lane, deadline=deadline)
+
+    # FC23 write plus read back in one frame, as ModbusSession.readwrite_registers()
+    def readwrite_registers(self, address, values, read_address, read_count, timeout=None, unit=None,
+                            lane=LANE_INTERACTIVE, deadline=None):
+        return self.submit(_readwrite_registers, self.unit if unit is None else unit, address, list(values),
+                           read_address, read_count, timeout=timeout, lane=lane, deadline=deadline)
+
+    # stop all servos where they are, ahead of everything waiting; the Future gives the positions
+    def hold(self, unit=None):
+        return self.submit(_hold, self.unit if unit is None else unit, lane=LANE_STOP)
+
+    # fail the waiting requests of some lanes, e.g. on Stop; returns how many were waiting.
+    # The drop runs in the event loop, ahead of anything submitted after it - the caller
+    # (the Tk thread) does not wait for it
+    def drop(self, lanes=MOTION_LANES):
+        waiting = sum(len(self.gate.waiters[lane]) for lane in lanes)
+        self.loop.call_soon_threadsafe(self.drop_waiting, lanes)
+        return waiting
+
+    def drop_waiting(self, lanes):
+        tracer.count("dropped", self.gate.drop(lanes, "dropped by stop"))
+
+    # switch the link to another rate from BAUD_RATES, the Future gives the rate in use afterwards
+    def set_baudrate(self, baudrate):
+        return self.submit(self._set_baudrate, baudrate, timeout=BAUD_PROBATION + self.timeout * 4)
+
+    # connect now instead of waiting out the backoff, e.g. the port was just plugged in again
+    def reconnect_now(self):
+        if not self.closing:
+            self.loop.call_soon_threadsafe(self.wake)
+
+    # ---- coroutine API, for code already running in the event loop ----
+
+    async def read(self, address, count, timeout=None):
+        return await self.request(_read_registers, (self.unit, address, count), timeout)
+
+    async def write(self, address, value, timeout=None):
+        return await self.request(_write_register, (self.unit, address, value), timeout)
+
+    async def write_many(self, address, values, timeout=None):
+        return await self.request(_write_registers, (self.unit, address, list(values)), timeout)
+
+    # ---- event loop side ----
+
+    async def request(self, fn, args, timeout, txn=None, lane=LANE_INTERACTIVE, deadline=None):
+        if txn is None:
+            txn = tracer.transaction(fn.__name__.lstrip("_"))
+        try:
+            result = await self.transact(fn, args, timeout, txn, lane, deadline)
+        except Exception as e:
+            tracer.finish(txn, str(e) or type(e).__name__)
+            raise
+        tracer.finish(txn)
+        return result
+
+    async def transact(self, fn, args, timeout, txn, lane, deadline):
+        if self.closing:
+            raise ModbusError("session closed")
+        # RTU is half-duplex: one transaction on the wire at a time
+        async with self.gate.slot(lane):
+            if expired(deadline):
+                tracer.count("expired")
+                raise ModbusError("deadline expired")
+            txn.start = time.perf_counter()
+            if not self.connected:
+                connected = await self.try_connect()
+                txn.connect = time.perf_counter() - txn.start
+                if not connected:
+                    raise ModbusError(f"{self.port}: connect failed")
+            self.current = txn
+            try:
+                return await asyncio.wait_for(fn(self.client, *args), timeout or self.timeout * 2)
+            except ModbusError:
+                tracer.count("exception_responses")
+                raise
+            except Exception as e:
+                count_failure(txn)
+                if link_lost(e):  # after a timeout the port stays open, the next request may get through
+                    await self.disconnect()
+                raise
+            finally:
+                self.current = None
+
+    # trace_packet hook of the client
+    def on_packet(self, sending, data):
+        txn = self.current
+        if txn is not None:
+            txn.on_packet(sending, data)
+        return data
+
+    async def try_connect(self):
+        now = time.monotonic()
+        if self.closing or now < self.next_attempt:
+            return False
+        if self.client is None:
+            # reconnects are driven by our own backoff, not by pymodbus, and a lost reply is not
+            # retried: it would hold back a Stop queued behind it (see serial_client)
+            kwargs = {"trace_packet": self.on_packet} if TRACE_PACKET else {}
+            self.client = AsyncModbusSerialClient(port=self.port, baudrate=self.boot_baudrate, timeout=self.timeout,
+                                                  stopbits=1, bytesize=8, parity='N',
+                                                  reconnect_delay=0, retries=0, **kwargs)
+            self.link_baudrate = self.boot_baudrate
+        try:
+            ok = await self.client.connect()
+        except Exception as e:
+            print(f"error connect {self.port} -> {e}")
+            ok = False
+        if ok:
+            if self.was_connected:
+                tracer.count("reconnects")
+            self.was_connected = True
+            self.backoff = self.reconnect_delay
+            self.next_attempt = 0.0
+            if self.baudrate != self.link_baudrate:
+                try:
+                    await self.negotiate(self.client, self.baudrate)
+                except Exception as e:
+                    print(f"error set baudrate {self.baudrate} on {self.port} -> {e}")
+        else:
+            tracer.count("connect_failures")
+            self.next_attempt = now + self.backoff
+            self.backoff = min(self.backoff * 2, self.reconnect_delay_max)
+            self.loop.call_later(self.next_attempt - now, self.reconnect_later)
+        self.set_connected(ok)
+        return ok
+
+    async def _set_baudrate(self, client, baudrate):
+        try:
+            self.baudrate = await self.negotiate(client, baudrate)
+        except Exception:
+            self.baudrate = self.link_baudrate  # a rate that failed is not retried on reconnect
+            raise
+        return self.baudrate
+
+    # same protocol as ModbusSession.negotiate(), called while holding the gate
+    async def negotiate(self, client, baudrate):
+        if baudrate not in BAUD_RATES:
+            raise ModbusError(f"unsupported baud rate {baudrate}, use one of {BAUD_RATES}")
+        if baudrate == self.link_baudrate:
+            return baudrate
+        code = BAUD_RATES.index(baudrate)
+        try:
+            await asyncio.wait_for(_write_register(client, self.unit, BAUD_ADDR, code), self.timeout * 2)
+        except ModbusError as e:
+            raise ModbusError(f"controller does not support baud switching -> {e}")
+        except Exception:
+            pass
+        await asyncio.sleep(BAUD_SWITCH_DELAY)
+        set_client_baudrate(client, baudrate)
+        try:
+            await asyncio.wait_for(_write_register(client, self.unit, BAUD_ADDR, code), self.timeout * 2)
+        except Exception as e:
+            set_client_baudrate(client, self.boot_baudrate)
+            self.link_baudrate = self.boot_baudrate
+            await asyncio.sleep(BAUD_PROBATION + BAUD_SWITCH_DELAY)
+            try:
+                await asyncio.wait_for(_read_registers(client, self.unit, BAUD_ADDR, 1), self.timeout * 2)
+            except Exception:
+                set_client_baudrate(client, baudrate)
+                if await asyncio.wait_for(_read_registers(client, self.unit, BAUD_ADDR, 1),
+                                          self.timeout * 2) != [code]:
+                    raise
+            else:
+                raise ModbusError(f"switch to {baudrate} failed ({e!r}), link is back at {self.boot_baudrate}")
+        self.link_baudrate = baudrate
+        print(f"{self.port}: link at {baudrate} baud")
+        return baudrate
+
+    def wake(self):
+        self.backoff = self.reconnect_delay
+        self.next_attempt = 0.0
+        self.reconnect_later()
+
+    def reconnect_later(self):
+        if not self.connected and not self.closing:
+            self.loop.create_task(self.reconnect())
+
+    async def reconnect(self):
+        async with self.gate.slot(LANE_INTERACTIVE):
+            if not self.connected:
+                await self.try_connect()
+
+    async def disconnect(self):
+        if self.client is not None:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+            self.client = None
+        self.set_connected(False)
+
+    def set_connected(self, connected):
+        changed = connected != self.connected
+        self.connected = connected
+        if changed and self.on_status:
+            self.on_status(connected)
+
+
+async def _read_registers(client, unit, address, count):
+    return check(await client.read_holding_registers(address=address, count=count,
+                                                     **{UNIT_KWARG: unit})).registers
+
+
+async def _write_register(client, unit, address, value):
+    check(await client.write_register(address=address, value=value, **{UNIT_KWARG: unit}))
+
+
+async def _write_registers(client, unit, address, values):
+    check(await client.write_registers(address=address, values=values, **{UNIT_KWARG: unit}))
+
+
+async def _readwrite_registers(client, unit, address, values, read_address, read_count):
+    return check(await client.readwrite_registers(read_address=read_address, read_count=read_count,
+                                                  write_address=address, values=values,
+                                                  **{UNIT_KWARG: unit})).registers
+
+
+async def _hold(client, unit):
+    actual = await _read_registers(client, unit, VALUES_ACTUAL_ADDR, NUM_SERVOS)
+    await _write_registers(client, unit, VALUES_ACTUAL_ADDR, actual)
+    return actual
@@ -0,0 +1,83 @@
+# hand-stand/pc-app/command_lanes.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Priority lanes of the session command queue.
+#
+# Every request goes into one of four lanes: stop/hold, interactive (GUI
+# writes and reads), playback rows and telemetry polls. The I/O side always
+# takes the oldest command of the highest non-empty lane, so a Stop
+# overtakes everything already queued. A frame on the wire is never cut
+# short (RTU is half-duplex): Stop waits for at most one transaction.
+#
+# Commands carry a deadline on the monotonic clock, by default now + the
+# TTL of their lane. A command still queued at its deadline is dropped
+# unsent - a playback row half a second late is no use to anybody.
+# drop() removes every queued command of some lanes at once.
+
+import queue
+import threading
+import time
+from collections import deque
+
+LANE_STOP = 0
+LANE_INTERACTIVE = 1
+LANE_PLAYBACK = 2
+LANE_TELEMETRY = 3
+LANES = (LANE_STOP, LANE_INTERACTIVE, LANE_PLAYBACK, LANE_TELEMETRY)
+LANE_NAMES = ("stop", "interactive", "playback", "telemetry")
+
+# seconds a command may wait in its lane, None: never dropped
+LANE_TTL = {LANE_STOP: None, LANE_INTERACTIVE: 5.0, LANE_PLAYBACK: 0.5, LANE_TELEMETRY: 1.0}
+
+# what Stop throws away: everything that moves the arm
+MOTION_LANES = (LANE_INTERACTIVE, LANE_PLAYBACK)
+
+
+# absolute deadline of a command submitted now, None when it has none
+def lane_deadline(lane, deadline=None):
+    if deadline is not None:
+        return deadline
+    ttl = LANE_TTL[lane]
+    return None if ttl is None else time.monotonic() + ttl
+
+
+def expired(deadline):
+    return deadline is not None and time.monotonic() > deadline
+
+
+class CommandLanes:
+    def __init__(self):
+        self.lanes = [deque() for _ in LANES]
+        self.condition = threading.Condition()
+
+    def put(self, lane, item):
+        with self.condition:
+            self.lanes[lane].append(item)
+            self.condition.notify()
+
+    # oldest item of the highest non-empty lane, queue.Empty after timeout (None waits forever)
+    def get(self, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(self.pending, timeout):
+                raise queue.Empty
+            for items in self.lanes:
+                if items:
+                    return items.popleft()
+
+    def pending(self):
+        return any(self.lanes)
+
+    # remove and return every queued item of the given lanes
+    def drop(self, lanes):
+        with self.condition:
+            dropped = []
+            for lane in lanes:
+                dropped.extend(self.lanes[lane])
+                self.lanes[lane].clear()
+        return dropped
+
+    def __len__(self):
+        with self.condition:
+            return sum(len(items) for items in self.lanes)
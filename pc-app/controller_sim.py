@@ -0,0 +1,636 @@
+# hand-stand/pc-app/controller_sim.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Modbus RTU simulator of servo_controller_speed_ctrl.ino for runs without hardware.
+#
+# ControllerModel reproduces the sketch: register map (incl. the 16..19/26..29
+# fillers), onHregSet() clamping and map() between logical and actual values,
+# min/max persisted in an EEPROM image, the 100 ms updateServo() tick with
+# approach_val() stepping and values_actual published to 10..15 every 20 ms.
+# Ramp speeds are served at 106..111 (VALUES_SPEED_ADDR).
+# Known firmware quirks are kept on purpose (blank EEPROM max defaults to
+# ACTUAL_MIN, registers keep the raw written value) - the simulator answers
+# like the real board does.
+#
+# ControllerSimulator speaks RTU frames (FC 3, 6, 16, 23, CRC, exception
+# replies, unit id filtering) and delays every reply by the wire time at the
+# configured baud rate, the t3.5 turnaround and debug-print stalls on Serial.
+# Faults can be injected: dropped replies, corrupted CRC, exception replies
+# and extra latency.
+# The BAUD_ADDR register switches the simulated link rate like the sketch:
+# after the reply, with a fall back to the boot rate unless confirmed in
+# time. The in-process client gets no answer while its rate does not match.
+#
+# SimBus puts several simulators with different unit ids on one in-process bus.
+#
+# Two transports:
+#   - in-process: ModbusSession(SIM_PORT, client_factory=sim.client_factory)
+#     gives the session a SimClient with the pymodbus client API, works everywhere
+#   - pty (Linux/macOS): sim.open_pty() returns a /dev/pts/N path that any
+#     serial client (pymodbus sync/async, the GUI) can open like a real port
+#
+# Usage (from pc-app directory):
+#   python -m controller_sim [--baud 9600] [--drop 0.01] [--corrupt 0.01] [--eeprom sim_eeprom.json]
+# prints the pty path and serves it until Ctrl-C.
+
+import argparse
+import json
+import os
+import random
+import select
+import struct
+import threading
+import time
+
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+
+from registers import (ACTUAL_MAX, ACTUAL_MIN, BAUD_ADDR, BAUD_PROBATION, BAUD_RATES, BOOT_BAUDRATE, LOGICAL_MAX,
+                       LOGICAL_MIN, MODBUS_UNIT_ID, NUM_SERVOS, SPEED_MAX, SPEED_MIN, VALUES_ACTUAL_ADDR,
+                       VALUES_LOGICAL_ADDR, VALUES_MAX_ADDR, VALUES_MIN_ADDR, VALUES_SPEED_ADDR)
+
+SIM_PORT = "sim://controller"
+
+DEFAULT_BAUDRATE = BOOT_BAUDRATE
+BITS_PER_CHAR = 10          # start + 8 data + stop, no parity
+TICK_PERIOD = 0.1           # Timer1.initialize(100000)
+PUBLISH_PERIOD = 0.02       # loop() publishActual()
+DEFAULT_DELTA = 10
+ACTUAL_DEFAULT = 1500
+LOGICAL_DEFAULT = 500
+
+EEPROM_MIN_ADDR = 0         # EEPROM.put(idx * 2, min)
+EEPROM_MAX_ADDR = 100       # EEPROM.put(100 + idx * 2, max)
+EEPROM_BLANK = 0xFFFF
+
+DEBUG_BAUDRATE = 9600       # Serial debug prints
+DEBUG_TX_BUFFER = 64        # HardwareSerial tx buffer, a full buffer blocks the sketch
+
+# Modbus exception codes
+ILLEGAL_FUNCTION = 1
+ILLEGAL_ADDRESS = 2
+ILLEGAL_VALUE = 3
+DEVICE_FAILURE = 4
+
+MAX_READ = 0x7D
+MAX_WRITE = 0x7B
+
+
+def crc16(data):
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def frame(pdu):
+    return pdu + struct.pack("<H", crc16(pdu))
+
+
+def constrain(x, low, high):
+    return low if x < low else high if x > high else x
+
+
+# Arduino map(): long arithmetic, division truncates towards zero
+def arduino_map(x, in_min, in_max, out_min, out_max):
+    if in_max == in_min:
+        return out_min  # division by zero on the board, value is garbage there
+    num = (x - in_min) * (out_max - out_min)
+    den = in_max - in_min
+    q = abs(num) // abs(den)
+    return (q if (num >= 0) == (den >= 0) else -q) + out_min
+
+
+def approach_val(current, target, step):
+    if current < target:
+        return current + step if target - current > step else target
+    if current > target:
+        return current - step if current - target > step else target
+    return current
+
+
+class ModbusException(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class ControllerModel:
+    def __init__(self, eeprom=None):
+        # EEPROM image: address -> uint16 as written by EEPROM.put(), missing means blank
+        if eeprom is None:
+            eeprom = {}
+            for i in range(NUM_SERVOS):
+                eeprom[EEPROM_MIN_ADDR + i * 2] = ACTUAL_MIN
+                eeprom[EEPROM_MAX_ADDR + i * 2] = ACTUAL_MAX
+        self.eeprom = eeprom
+        self.registers = {}
+        self.callbacks = set()
+        self.debug_lines = []   # Serial.println() output of the last request
+        self.baud_code = 0
+        self.baud_pending = None  # code to switch to once the reply is sent
+        self.baud_confirmed = False
+        self.setup()
+
+    def add_hreg(self, address, value, count=1, callback=False):
+        for a in range(address, address + count):
+            self.registers[a] = value
+            if callback:
+                self.callbacks.add(a)
+
+    def setup(self):
+        n = NUM_SERVOS
+        self.values_logical = [0] * n
+        self.values_logical_target = [0] * n
+        self.delta_logical = [DEFAULT_DELTA] * n
+        self.values_min = [0] * n
+        self.values_max = [0] * n
+        self.values_actual = [0] * n
+
+        self.add_hreg(VALUES_ACTUAL_ADDR, ACTUAL_DEFAULT, n, callback=True)
+        self.add_hreg(VALUES_MIN_ADDR, ACTUAL_MIN, n, callback=True)
+        self.add_hreg(VALUES_MAX_ADDR, ACTUAL_MAX, n, callback=True)
+        self.add_hreg(VALUES_LOGICAL_ADDR, LOGICAL_DEFAULT, n, callback=True)
+        self.add_hreg(VALUES_SPEED_ADDR, DEFAULT_DELTA, n, callback=True)
+        self.add_hreg(VALUES_ACTUAL_ADDR + n, 0, VALUES_MIN_ADDR - VALUES_ACTUAL_ADDR - n)
+        self.add_hreg(VALUES_MIN_ADDR + n, 0, VALUES_MAX_ADDR - VALUES_MIN_ADDR - n)
+        self.add_hreg(BAUD_ADDR, self.baud_code, callback=True)
+
+        for i in range(n):
+            self.values_min[i] = self.eeprom.get(EEPROM_MIN_ADDR + i * 2, EEPROM_BLANK)
+            self.values_max[i] = self.eeprom.get(EEPROM_MAX_ADDR + i * 2, EEPROM_BLANK)
+            if not ACTUAL_MIN <= self.values_min[i] <= ACTUAL_MAX:
+                self.values_min[i] = ACTUAL_MIN
+            if not ACTUAL_MIN <= self.values_max[i] <= ACTUAL_MAX:
+                self.values_max[i] = ACTUAL_MIN
+            self.values_actual[i] = (self.values_min[i] + self.values_max[i]) // 2
+            self.values_logical_target[i] = self.to_logical(i, self.values_actual[i])
+            self.values_logical[i] = self.values_logical_target[i]
+            self.registers[VALUES_ACTUAL_ADDR + i] = self.values_actual[i]
+            self.registers[VALUES_MIN_ADDR + i] = self.values_min[i]
+            self.registers[VALUES_MAX_ADDR + i] = self.values_max[i]
+            self.registers[VALUES_LOGICAL_ADDR + i] = self.values_logical_target[i]
+
+    def to_logical(self, i, actual):
+        return constrain(arduino_map(actual, self.values_min[i], self.values_max[i], LOGICAL_MIN, LOGICAL_MAX),
+                         LOGICAL_MIN, LOGICAL_MAX)
+
+    def to_actual(self, i, logical):
+        return constrain(arduino_map(logical, LOGICAL_MIN, LOGICAL_MAX, self.values_min[i], self.values_max[i]),
+                         ACTUAL_MIN, ACTUAL_MAX)
+
+    # ---- sketch entry points ----
+
+    # updateServo(), Timer1 interrupt
+    def tick(self):
+        for i in range(NUM_SERVOS):
+            self.values_logical[i] = approach_val(self.values_logical[i], self.values_logical_target[i],
+                                                  self.delta_logical[i])
+            self.values_actual[i] = self.to_actual(i, self.values_logical[i])
+
+    # publishActual(), callbacks disabled
+    def publish(self):
+        for i in range(NUM_SERVOS):
+            self.registers[VALUES_ACTUAL_ADDR + i] = self.values_actual[i]
+
+    def read(self, address, count):
+        if not all(a in self.registers for a in range(address, address + count)):
+            raise ModbusException(ILLEGAL_ADDRESS)
+        return [self.registers[a] for a in range(address, address + count)]
+
+    def write(self, address, values):
+        if not all(a in self.registers for a in range(address, address + len(values))):
+            raise ModbusException(ILLEGAL_ADDRESS)
+        for a, val in zip(range(address, address + len(values)), values):
+            self.registers[a] = self.on_hreg_set(a, val) if a in self.callbacks else val
+
+    # onHregSet(), the returned value is stored in the register
+    def on_hreg_set(self, addr, val):
+        n = NUM_SERVOS
+        if VALUES_ACTUAL_ADDR <= addr < VALUES_ACTUAL_ADDR + n:
+            idx = addr - VALUES_ACTUAL_ADDR
+            self.values_actual[idx] = constrain(val, ACTUAL_MIN, ACTUAL_MAX)
+            self.values_logical_target[idx] = self.to_logical(idx, self.values_actual[idx])
+            self.values_logical[idx] = self.values_logical_target[idx]
+            self.registers[VALUES_LOGICAL_ADDR + idx] = self.values_logical_target[idx]  # cbDisable()d Hreg()
+            self.debug_lines.append(f"act [{idx}]: {self.values_actual[idx]} ({val})")
+        elif VALUES_LOGICAL_ADDR <= addr < VALUES_LOGICAL_ADDR + n:
+            idx = addr - VALUES_LOGICAL_ADDR
+            self.values_logical_target[idx] = constrain(val, LOGICAL_MIN, LOGICAL_MAX)
+            self.debug_lines.append(f"log [{idx}]: {self.values_logical_target[idx]} ({val})")
+        elif VALUES_SPEED_ADDR <= addr < VALUES_SPEED_ADDR + n:
+            idx = addr - VALUES_SPEED_ADDR
+            val = constrain(val, SPEED_MIN, SPEED_MAX)
+            self.delta_logical[idx] = val if val else LOGICAL_MAX  # 0 - no ramp
+            self.debug_lines.append(f"spd [{idx}]: {val}")
+        elif VALUES_MIN_ADDR <= addr < VALUES_MIN_ADDR + n:
+            idx = addr - VALUES_MIN_ADDR
+            self.values_min[idx] = val
+            self.eeprom[EEPROM_MIN_ADDR + idx * 2] = val
+            self.debug_lines.append(f"min [{idx}]: {val}")
+        elif VALUES_MAX_ADDR <= addr < VALUES_MAX_ADDR + n:
+            idx = addr - VALUES_MAX_ADDR
+            self.values_max[idx] = val
+            self.eeprom[EEPROM_MAX_ADDR + idx * 2] = val
+            self.debug_lines.append(f"max [{idx}]: {val}")
+        elif addr == BAUD_ADDR:
+            if val >= len(BAUD_RATES):
+                self.debug_lines.append(f"baud: invalid code {val}")
+                return self.baud_code
+            if val == self.baud_code:
+                self.baud_pending = None
+                self.baud_confirmed = True
+                self.debug_lines.append(f"baud: {BAUD_RATES[val]} confirmed")
+            else:
+                self.baud_pending = val
+                self.debug_lines.append(f"baud: switch to {BAUD_RATES[val]}")
+        else:
+            self.debug_lines.append(f"Error set: unknown addr [{addr}]: {val}")
+        return val
+
+
+class Faults:
+    def __init__(self, drop=0.0, corrupt=0.0, exception=0.0, latency=0.0, seed=None):
+        self.drop = drop            # probability the request gets no reply
+        self.corrupt = corrupt      # probability the reply has a bad CRC
+        self.exception = exception  # probability of a DEVICE_FAILURE exception reply
+        self.latency = latency      # extra reply delay, uniform in [0, latency] s
+        self.random = random.Random(seed)
+
+    def hit(self, probability):
+        return probability > 0 and self.random.random() < probability
+
+
+class ControllerSimulator:
+    def __init__(self, baudrate=DEFAULT_BAUDRATE, unit=MODBUS_UNIT_ID, eeprom=None, eeprom_path=None,
+                 faults=None, realtime=True):
+        self.boot_baudrate = baudrate
+        self.baudrate = baudrate        # current link rate
+        self.baud_switched = None       # time of an unconfirmed switch
+        self.unit = unit
+        self.eeprom_path = eeprom_path  # json file the EEPROM image is loaded from and saved to
+        if eeprom is None and eeprom_path and os.path.exists(eeprom_path):
+            with open(eeprom_path, "r") as f:
+                eeprom = {int(k): v for k, v in json.load(f).items()}
+        self.model = ControllerModel(eeprom)
+        if baudrate in BAUD_RATES:
+            self.model.baud_code = self.model.registers[BAUD_ADDR] = BAUD_RATES.index(baudrate)
+        self.faults = faults or Faults()
+        self.realtime = realtime        # sleep the simulated wire time
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "replies": 0, "dropped": 0, "corrupted": 0, "exceptions": 0,
+                      "crc_errors": 0}
+        self.debug_level = 0.0          # bytes waiting in the Serial tx buffer
+        self.debug_time = time.monotonic()
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="controller-sim", daemon=True)
+        self.pty_thread = None
+        self.master_fd = None
+        self.slave_fd = None
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.master_fd is not None:
+            os.close(self.master_fd)
+            os.close(self.slave_fd)
+            self.master_fd = self.slave_fd = None
+        self.save_eeprom()
+
+    def save_eeprom(self):
+        if self.eeprom_path:
+            with self.lock:
+                image = dict(self.model.eeprom)
+            with open(self.eeprom_path, "w") as f:
+                json.dump(image, f, indent=2)
+
+    # timer interrupt and loop() on simulated time
+    def run(self):
+        next_tick = next_publish = time.monotonic()
+        while not self.stop_event.wait(max(0.0, min(next_tick, next_publish) - time.monotonic())):
+            now = time.monotonic()
+            with self.lock:
+                if self.baud_switched is not None and now - self.baud_switched > BAUD_PROBATION:
+                    self.switch_baudrate(None)  # never confirmed, back to the boot rate
+                if now >= next_tick:
+                    self.model.tick()
+                    next_tick += TICK_PERIOD
+                if now >= next_publish:
+                    self.model.publish()
+                    next_publish += PUBLISH_PERIOD
+
+    # called with the lock held; code None means the boot rate
+    def switch_baudrate(self, code):
+        model = self.model
+        if code is None:
+            self.baudrate = self.boot_baudrate
+            self.baud_switched = None
+            code = BAUD_RATES.index(self.boot_baudrate) if self.boot_baudrate in BAUD_RATES else 0
+        else:
+            self.baudrate = BAUD_RATES[code]
+            self.baud_switched = time.monotonic()
+        model.baud_code = model.registers[BAUD_ADDR] = code
+        model.baud_pending = None
+
+    # ---- wire timing ----
+
+    def char_time(self):
+        return BITS_PER_CHAR / self.baudrate
+
+    # modbus-esp8266 ends a frame after 3.5 characters of silence, fixed 1750 us above 19200
+    def frame_gap(self):
+        return 3.5 * self.char_time() if self.baudrate <= 19200 else 0.00175
+
+    # time the sketch blocks in Serial.println() once the debug tx buffer is full
+    def debug_stall(self, lines):
+        now = time.monotonic()
+        drain = DEBUG_BAUDRATE / BITS_PER_CHAR
+        self.debug_level = max(0.0, self.debug_level - (now - self.debug_time) * drain)
+        self.debug_time = now
+        self.debug_level += sum(len(line) + 2 for line in lines)
+        overflow = self.debug_level - DEBUG_TX_BUFFER
+        return overflow / drain if overflow > 0 else 0.0
+
+    # ---- RTU ----
+
+    # handle one request frame, returns (reply frame or None, seconds until the reply is complete).
+    # baudrate is the sender's rate if known, a mismatch reads as line noise
+    def transact(self, request, baudrate=None):
+        char_time = self.char_time()
+        delay = len(request) * char_time + self.frame_gap()
+        if baudrate is not None and baudrate != self.baudrate:
+            self.stats["crc_errors"] += 1
+            return None, delay
+        if len(request) < 4 or crc16(request[:-2]) != struct.unpack("<H", request[-2:])[0]:
+            self.stats["crc_errors"] += 1
+            return None, delay
+        unit, pdu = request[0], request[1:-2]
+        if unit not in (0, self.unit):
+            return None, delay
+        self.stats["requests"] += 1
+        with self.lock:
+            self.model.debug_lines = []
+            if self.faults.hit(self.faults.exception):
+                reply = bytes([pdu[0] | 0x80, DEVICE_FAILURE])
+            else:
+                reply = self.handle_pdu(pdu)
+            delay += self.debug_stall(self.model.debug_lines)
+            if self.model.baud_confirmed:
+                self.model.baud_confirmed = False
+                self.baud_switched = None
+            if self.model.baud_pending is not None:
+                # the reply still goes out at the old rate
+                self.switch_baudrate(self.model.baud_pending)
+        if self.faults.latency:
+            delay += self.faults.random.uniform(0, self.faults.latency)
+        if unit == 0:
+            return None, delay  # broadcast: executed, never answered
+        if self.faults.hit(self.faults.drop):
+            self.stats["dropped"] += 1
+            return None, delay
+        if reply[0] & 0x80:
+            self.stats["exceptions"] += 1
+        reply = frame(bytes([unit]) + reply)
+        if self.faults.hit(self.faults.corrupt):
+            self.stats["corrupted"] += 1
+            reply = reply[:-1] + bytes([reply[-1] ^ 0xFF])
+        self.stats["replies"] += 1
+        return reply, delay + len(reply) * char_time
+
+    def handle_pdu(self, pdu):
+        fc = pdu[0]
+        try:
+            if fc == 3 and len(pdu) == 5:
+                address, count = struct.unpack(">HH", pdu[1:5])
+                if not 1 <= count <= MAX_READ:
+                    raise ModbusException(ILLEGAL_VALUE)
+                values = self.model.read(address, count)
+                return bytes([fc, 2 * count]) + struct.pack(f">{count}H", *values)
+            if fc == 6 and len(pdu) == 5:
+                address, value = struct.unpack(">HH", pdu[1:5])
+                self.model.write(address, [value])
+                return pdu
+            if fc == 16 and len(pdu) >= 6:
+                address, count, size = struct.unpack(">HHB", pdu[1:6])
+                if not 1 <= count <= MAX_WRITE or size != 2 * count or len(pdu) != 6 + size:
+                    raise ModbusException(ILLEGAL_VALUE)
+                self.model.write(address, list(struct.unpack(f">{count}H", pdu[6:])))
+                return pdu[:5]
+            if fc == 23 and len(pdu) >= 10:
+                read_address, read_count, address, count, size = struct.unpack(">HHHHB", pdu[1:10])
+                if (not 1 <= read_count <= MAX_READ or not 1 <= count <= 0x79 or size != 2 * count
+                        or len(pdu) != 10 + size):
+                    raise ModbusException(ILLEGAL_VALUE)
+                # the write is performed before the read
+                self.model.write(address, list(struct.unpack(f">{count}H", pdu[10:])))
+                values = self.model.read(read_address, read_count)
+                return bytes([fc, 2 * read_count]) + struct.pack(f">{read_count}H", *values)
+            raise ModbusException(ILLEGAL_FUNCTION)
+        except ModbusException as e:
+            return bytes([fc | 0x80, e.code])
+
+    # ---- transports ----
+
+    # ModbusSession client_factory
+    def client_factory(self, port, baudrate, timeout, trace_packet=None):
+        return SimClient(self, timeout, trace_packet, baudrate)
+
+    def client(self, timeout=1, baudrate=None):
+        return SimClient(self, timeout, baudrate=baudrate or self.baudrate)
+
+    # serve RTU on a pseudo terminal, returns the path clients open as a serial port
+    def open_pty(self):
+        import tty
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.master_fd)
+        tty.setraw(self.slave_fd)
+        self.pty_thread = threading.Thread(target=self.serve_pty, name="controller-sim-pty", daemon=True)
+        self.pty_thread.start()
+        return os.ttyname(self.slave_fd)
+
+    def serve_pty(self):
+        fd = self.master_fd
+        buffer = b""
+        while not self.stop_event.is_set():
+            # a frame ends with a silent gap; bytes arrive in bursts on a pty, so wait a little longer
+            ready, _, _ = select.select([fd], [], [], max(self.frame_gap(), 0.005) if buffer else 0.2)
+            if ready:
+                try:
+                    buffer += os.read(fd, 256)
+                except OSError:
+                    break
+                length = request_length(buffer)
+                if length is None or len(buffer) < length:
+                    continue
+                request, buffer = buffer[:length], buffer[length:]
+            elif buffer:
+                request, buffer = buffer, b""
+            else:
+                continue
+            start = time.monotonic()
+            reply, delay = self.transact(request)
+            if self.realtime:
+                time.sleep(max(0.0, start + delay - time.monotonic()))
+            if reply is not None:
+                try:
+                    os.write(fd, reply)
+                except OSError:
+                    break
+
+
+# several simulated controllers with their own unit ids on one RS-485 bus
+class SimBus:
+    def __init__(self, simulators):
+        self.simulators = list(simulators)
+        self.realtime = all(sim.realtime for sim in self.simulators)
+
+    def start(self):
+        for sim in self.simulators:
+            sim.start()
+        return self
+
+    def stop(self):
+        for sim in self.simulators:
+            sim.stop()
+
+    # every controller sees the frame, only the addressed one answers (unit ids are unique on a bus)
+    def transact(self, request, baudrate=None):
+        answers = [sim.transact(request, baudrate) for sim in self.simulators]
+        for reply, delay in answers:
+            if reply is not None:
+                return reply, delay
+        return None, max(delay for _, delay in answers)
+
+    def client_factory(self, port, baudrate, timeout, trace_packet=None):
+        return SimClient(self, timeout, trace_packet, baudrate)
+
+
+# expected size of an RTU request frame from its first bytes, None while unknown
+def request_length(buffer):
+    if len(buffer) < 2:
+        return None
+    fc = buffer[1]
+    if fc in (3, 6):
+        return 8
+    if fc == 16:
+        return 9 + buffer[6] if len(buffer) >= 7 else None
+    if fc == 23:
+        return 13 + buffer[10] if len(buffer) >= 11 else None
+    return None
+
+
+class SimResult:
+    def __init__(self, function_code, registers=None, exception_code=None):
+        self.function_code = function_code
+        self.registers = registers or []
+        self.exception_code = exception_code
+
+    def isError(self):
+        return self.exception_code is not None
+
+    def __str__(self):
+        if self.isError():
+            return f"Exception Response({self.function_code}, {self.function_code & 0x7F}, {self.exception_code})"
+        return f"SimResult(fc={self.function_code}, registers={self.registers})"
+
+
+# in-process stand-in for pymodbus ModbusSerialClient, only what the sessions use
+class SimClient:
+    def __init__(self, simulator, timeout=1, trace_packet=None, baudrate=DEFAULT_BAUDRATE):
+        self.simulator = simulator
+        self.timeout = timeout
+        self.baudrate = baudrate
+        self.trace_packet = trace_packet  # same hook as the pymodbus client: trace_packet(sending, data)
+        self.connected = False
+
+    def connect(self):
+        self.connected = True
+        return True
+
+    def close(self):
+        self.connected = False
+
+    def set_baudrate(self, baudrate):
+        self.baudrate = baudrate
+
+    def read_holding_registers(self, address, count=1, **unit):
+        return self.execute(unit, struct.pack(">BHH", 3, address, count))
+
+    def write_register(self, address, value, **unit):
+        return self.execute(unit, struct.pack(">BHH", 6, address, value))
+
+    def write_registers(self, address, values, **unit):
+        values = list(values)
+        return self.execute(unit, struct.pack(f">BHHB{len(values)}H", 16, address, len(values),
+                                              2 * len(values), *values))
+
+    def readwrite_registers(self, read_address=0, read_count=0, write_address=0, values=(), **unit):
+        values = list(values)
+        return self.execute(unit, struct.pack(f">BHHHHB{len(values)}H", 23, read_address, read_count,
+                                              write_address, len(values), 2 * len(values), *values))
+
+    def execute(self, unit, pdu):
+        if not self.connected:
+            raise ConnectionException("simulator client not connected")
+        unit_id = next(iter(unit.values()), MODBUS_UNIT_ID)
+        request = frame(bytes([unit_id]) + pdu)
+        if self.trace_packet:
+            self.trace_packet(True, request)
+        start = time.monotonic()
+        reply, delay = self.simulator.transact(request, self.baudrate)
+        if reply is not None and self.trace_packet:
+            self.wait_until(start + delay)
+            self.trace_packet(False, reply)
+        if reply is None or crc16(reply[:-2]) != struct.unpack("<H", reply[-2:])[0]:
+            # nothing usable on the wire: the client waits for its timeout
+            self.wait_until(start + self.timeout)
+            raise ModbusIOException(f"no response from unit {unit_id}")
+        self.wait_until(start + delay)
+        fc = reply[1]
+        if fc & 0x80:
+            return SimResult(fc, exception_code=reply[2])
+        if fc in (3, 23):
+            return SimResult(fc, list(struct.unpack(f">{reply[2] // 2}H", reply[3:3 + reply[2]])))
+        return SimResult(fc)
+
+    def wait_until(self, deadline):
+        if self.simulator.realtime:
+            time.sleep(max(0.0, deadline - time.monotonic()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="controller_sim",
+                                     description="Simulate the servo controller on a pseudo terminal")
+    parser.add_argument("--baud", type=int, default=DEFAULT_BAUDRATE, help="simulated wire baud rate")
+    parser.add_argument("--unit", type=int, default=MODBUS_UNIT_ID, help="Modbus unit id")
+    parser.add_argument("--eeprom", help="json file keeping min/max between runs")
+    parser.add_argument("--drop", type=float, default=0.0, help="probability a request is not answered")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="probability a reply has a bad CRC")
+    parser.add_argument("--exception", type=float, default=0.0, help="probability of an exception reply")
+    parser.add_argument("--latency", type=float, default=0.0, help="extra random reply delay, s")
+    parser.add_argument("--seed", type=int, help="fault injection random seed")
+    args = parser.parse_args(argv)
+
+    faults = Faults(args.drop, args.corrupt, args.exception, args.latency, args.seed)
+    sim = ControllerSimulator(baudrate=args.baud, unit=args.unit, eeprom_path=args.eeprom, faults=faults).start()
+    print("controller simulator on", sim.open_pty())
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+        print("simulator stats", sim.stats)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,257 @@
+# hand-stand/pc-app/fleet.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Several arms driven as one fleet.
+#
+# An arm is one controller: a serial port plus a Modbus unit id. Every port
+# gets its own ModbusSession, so separate ports run their I/O in parallel.
+# Arms on one port (several unit ids on an RS-485 bus) share its session,
+# a bus carries one frame at a time anyway.
+#
+# Arms file (json), or --arm NAME=PORT[:UNIT] on the run_script command line:
+#   {"left": {"port": "COM5", "unit": 1, "baud": 115200}, "right": {"port": "COM6"}}
+#
+# Fleet script rows address arms by name, an arm missing from a row holds
+# its position, a plain {"servos": ..., "speed": ...} row goes to every arm.
+# The speed of an "arms" row goes to every arm named in it:
+#   {"arms": {"left": {"yaw": 499, "vertical": 300}, "right": {"yaw": 100}}, "delay": 500, "speed": 20}
+#
+# Synchronized start: a row is handed to every session as one job that waits
+# on a shared barrier, so the frames leave on all ports together once every
+# I/O thread is free, not whenever each queue gets to them. The spread of the
+# send times (skew) is kept per row. Rows go in the playback lane, so a late
+# row is dropped like a single arm's; Stop drops the queued rows of all arms
+# and holds every arm where it is.
+
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from command_lanes import LANE_PLAYBACK
+from instrumentation import tracer
+from modbus_session import UNIT_KWARG, ModbusError, ModbusSession, check
+from registers import BOOT_BAUDRATE, MODBUS_UNIT_ID, VALUES_LOGICAL_ADDR
+from script_model import DEFAULT_DELAY, ScriptData, load_script
+
+SYNC_TIMEOUT = 0.2      # longest a ready port waits for the others before sending anyway
+SYNC_HISTORY = 10000
+
+
+class Arm:
+    def __init__(self, name, session, unit):
+        self.name = name
+        self.session = session
+        self.unit = unit
+
+    def read_registers(self, address, count):
+        return self.session.read_registers(address, count, unit=self.unit)
+
+    def write_register(self, address, value):
+        return self.session.write_register(address, value, unit=self.unit)
+
+    def write_registers(self, address, values):
+        return self.session.write_registers(address, values, unit=self.unit)
+
+    def hold(self):
+        return self.session.hold(unit=self.unit)
+
+
+# one row across all sessions: a barrier plus the time each frame was handed to its port
+class SyncPoint:
+    def __init__(self, parties, frames, timeout):
+        self.barrier = threading.Barrier(parties)
+        self.frames = frames
+        self.timeout = timeout
+        self.sent = {}  # arm name -> perf_counter() its frame was handed to the port
+        self.dropped = False
+
+    # called on every I/O thread, False when some session did not arrive in time
+    def wait(self):
+        try:
+            self.barrier.wait(self.timeout)
+            return True
+        except threading.BrokenBarrierError:
+            return False
+
+    # Stop: sessions waiting on the barrier give up at once and do not send
+    def drop(self):
+        self.dropped = True
+        self.barrier.abort()
+
+    def complete(self):
+        return len(self.sent) == self.frames
+
+    def skew(self):
+        sent = self.sent.values()
+        return max(sent) - min(sent)
+
+
+class Fleet:
+    # arms: {name: {"port": ..., "unit": ..., "baud": ...}}
+    def __init__(self, arms, session_factory=ModbusSession, sync_timeout=SYNC_TIMEOUT, on_status=None):
+        self.sync_timeout = sync_timeout
+        self.on_status = on_status  # on_status(port, connected), called from the I/O threads
+        self.arms = {}
+        self.sessions = {}  # port -> session
+        bauds = {}
+        for name, config in arms.items():
+            port = config["port"]
+            unit = config.get("unit", MODBUS_UNIT_ID)
+            baud = config.get("baud", BOOT_BAUDRATE)
+            if any(arm.session.port == port and arm.unit == unit for arm in self.arms.values()):
+                raise ValueError(f"arm {name}: unit {unit} on {port} is already used")
+            if port in bauds and bauds[port] != baud:
+                raise ValueError(f"arm {name}: {port} can not run at {baud} and {bauds[port]} baud")
+            if port in self.sessions and baud != BOOT_BAUDRATE:
+                # the session negotiates with one unit, the others would stay at the boot rate
+                raise ValueError(f"arm {name}: baud switching is not supported on a shared bus")
+            if port not in self.sessions:
+                bauds[port] = baud
+                self.sessions[port] = session_factory(port, baudrate=baud, unit=unit,
+                                                      on_status=lambda ok, port=port: self.set_status(port, ok))
+            self.arms[name] = Arm(name, self.sessions[port], unit)
+        self.syncs = deque(maxlen=SYNC_HISTORY)
+
+    def start(self):
+        for session in self.sessions.values():
+            session.start()
+        return self
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
+
+    def set_status(self, port, connected):
+        if self.on_status:
+            self.on_status(port, connected)
+
+    @property
+    def names(self):
+        return list(self.arms)
+
+    @property
+    def connected(self):
+        return all(session.connected for session in self.sessions.values())
+
+    def wait_connected(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self.connected and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.connected
+
+    # write {arm name: values} to all arms with a synchronized start, returns one Future per port
+    def send(self, values_by_arm, address=VALUES_LOGICAL_ADDR):
+        jobs = {}
+        for name, values in values_by_arm.items():
+            arm = self.arms[name]
+            jobs.setdefault(arm.session, []).append((name, arm.unit, list(values)))
+        if not jobs:
+            return []
+        sync = SyncPoint(len(jobs), len(values_by_arm), self.sync_timeout)
+        self.syncs.append(sync)
+        return [session.submit(_write_arms, sync, address, writes, lane=LANE_PLAYBACK)
+                for session, writes in jobs.items()]
+
+    # throw away the rows queued for all arms, e.g. on Stop; returns how many jobs were dropped
+    def drop(self):
+        for sync in list(self.syncs):
+            if not sync.complete():
+                sync.drop()
+        return sum(session.drop() for session in self.sessions.values())
+
+    # stop every arm where it is, ahead of everything queued: {arm name: Future with the positions}
+    def hold(self):
+        return {name: arm.hold() for name, arm in self.arms.items()}
+
+    # spread of the send times per row over all arms, in milliseconds
+    def skew_report(self):
+        skews = np.array([sync.skew() for sync in list(self.syncs) if sync.frames > 1 and sync.complete()])
+        if not len(skews):
+            return {"rows": 0}
+        skews *= 1000.0
+        p50, p95 = np.percentile(skews, [50, 95])
+        return {"rows": len(skews), "skew_p50_ms": float(p50), "skew_p95_ms": float(p95),
+                "skew_max_ms": float(skews.max())}
+
+
+# runs on the I/O thread of one session
+def _write_arms(client, sync, address, writes):
+    # a retry after a reconnect goes out at once, the other ports passed the barrier long ago
+    retry = any(name in sync.sent for name, unit, values in writes)
+    if not retry and not sync.wait() and not sync.dropped:
+        tracer.count("sync_misses")
+    if sync.dropped:
+        raise ModbusError("dropped by stop")
+    for name, unit, values in writes:
+        sync.sent[name] = time.perf_counter()
+        check(client.write_registers(address=address, values=values, **{UNIT_KWARG: unit}))
+
+
+# ---- configuration and scripts ----
+
+def load_arms(path):
+    with open(path, "r") as f:
+        arms = json.load(f)
+    for name, config in arms.items():
+        if "port" not in config:
+            raise ValueError(f"{path}: arm {name} has no port")
+    return arms
+
+
+# NAME=PORT[:UNIT], the unit is split off the right so COM ports and /dev paths both work
+def parse_arm(spec):
+    name, sep, port = spec.partition("=")
+    if not sep or not name or not port:
+        raise ValueError(f"bad arm {spec!r}, expected NAME=PORT[:UNIT]")
+    config = {"port": port}
+    head, sep, unit = port.rpartition(":")
+    if sep and unit.isdigit():
+        config = {"port": head, "unit": int(unit)}
+    return name, config
+
+
+# fleet scripts are json rows, a binary .hss script plays on every arm
+def load_fleet_script(path):
+    if path.lower().endswith(".json"):
+        with open(path, "r") as f:
+            return json.load(f)
+    return load_script(path)
+
+
+# ({arm name: values}, delay_ms) frames for PlaybackEngine. JSON rows are split into one script per
+# arm and checked like any script (ScriptData.from_rows): a bad row stops the load, out of range
+# values are clamped, before anything is sent
+def fleet_frames(script, names, source="script"):
+    if isinstance(script, ScriptData):
+        return [({name: values for name in names}, delay) for values, delay in script.frames()]
+    rows = list(script)
+    arm_rows = {name: [] for name in names}
+    present = {name: [] for name in names}  # False where a row leaves the arm where it is
+    for index, row in enumerate(rows):
+        arms = row.get("arms") if isinstance(row, dict) else None
+        if arms is None:
+            for name in names:
+                arm_rows[name].append(row)
+                present[name].append(True)
+            continue
+        if not isinstance(arms, dict):
+            raise ValueError(f'{source}: row {index + 1}: expected {{"arms": {{name: {{servo: value}}}}}}')
+        unknown = set(arms) - set(names)
+        if unknown:
+            raise ValueError(f"{source}: row {index + 1}: unknown arms {', '.join(sorted(unknown))}")
+        for name in names:
+            arm_row = {"servos": arms.get(name, {}), "delay": row.get("delay", DEFAULT_DELAY)}
+            if name in arms and "speed" in row:
+                arm_row["speed"] = row["speed"]
+            arm_rows[name].append(arm_row)
+            present[name].append(name in arms)
+    if not names:
+        return []
+    arm_frames = {name: ScriptData.from_rows(arm_rows[name], f"{source}: arm {name}").frames() for name in names}
+    return [({name: arm_frames[name][index][0] for name in names if present[name][index]}, delay)
+            for index, (values, delay) in enumerate(arm_frames[names[0]])]
@@ -0,0 +1,208 @@
+# hand-stand/pc-app/instrumentation.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Transaction spans, counters and Chrome trace export.
+#
+# Every Modbus request is one Transaction: submitted (any thread), started
+# on the I/O thread, optional reconnect, TX start / RX done taken from the
+# pymodbus trace_packet hook, finished. Records are kept in a bounded deque,
+# so tracing costs one small object and a handful of perf_counter() calls
+# per request and can stay on in production runs.
+# Counters (timeouts, exception replies, retries, reconnects, coalesced
+# writes, register cache hits, expired and dropped commands, ...) are always on.
+#
+# export_chrome() writes the Chrome trace event format, open it in
+# chrome://tracing or https://ui.perfetto.dev. Transactions are drawn on the
+# I/O thread with connect/tx/rx phases, queue waits as async slices and an
+# arrow from the submitting thread (GUI, coalescer, playback) to the frame.
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+SPAN_CAPACITY = 20000
+BITS_PER_CHAR = 10
+
+COUNTERS = ("transactions", "errors", "timeouts", "bad_frames", "exception_responses", "retries",
+            "reconnects", "connect_failures", "coalesced_writes", "coalescer_frames", "sync_misses",
+            "cache_hits", "cache_misses", "expired", "dropped")
+
+
+class Transaction:
+    __slots__ = ("id", "name", "origin", "submit", "start", "connect", "tx", "tx_bytes", "rx", "rx_bytes",
+                 "end", "error", "thread")
+
+    def __init__(self, id, name, submit):
+        self.id = id
+        self.name = name
+        self.origin = threading.get_ident()
+        self.submit = submit
+        self.start = self.end = self.tx = self.rx = None
+        self.connect = 0.0      # seconds spent reconnecting before the request
+        self.tx_bytes = self.rx_bytes = 0
+        self.error = None
+        self.thread = None
+
+    # trace_packet hook of the pymodbus client, called with every frame sent / chunk received
+    def on_packet(self, sending, data):
+        now = time.perf_counter()
+        if sending:
+            self.tx = now
+            self.tx_bytes = len(data)
+        else:
+            self.rx = now
+            self.rx_bytes += len(data)
+        return data
+
+
+class Tracer:
+    def __init__(self, capacity=SPAN_CAPACITY, enabled=True):
+        self.enabled = enabled      # record spans, counters are always kept
+        self.records = deque(maxlen=capacity)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.thread_names = {}
+        self.lock = threading.Lock()
+        self.ids = 0
+        self.epoch = time.perf_counter()
+
+    # ---- recording ----
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def transaction(self, name):
+        with self.lock:
+            self.ids += 1
+            return Transaction(self.ids, name, time.perf_counter())
+
+    def finish(self, txn, error=None):
+        txn.end = time.perf_counter()
+        txn.error = error
+        txn.thread = threading.get_ident()
+        with self.lock:
+            self.counters["transactions"] += 1
+            if error is not None:
+                self.counters["errors"] += 1
+        if self.enabled:
+            self.remember_thread()
+            self.records.append(("txn", txn))
+
+    # a plain span, e.g. a coalescer flush
+    def span(self, name, start, end, **args):
+        if self.enabled:
+            self.remember_thread()
+            self.records.append(("span", (name, start, end, threading.get_ident(), args)))
+
+    # a point event, e.g. the GUI action that caused a transaction (pass txn=future.txn_id)
+    def instant(self, name, **args):
+        if self.enabled:
+            self.remember_thread()
+            self.records.append(("instant", (name, time.perf_counter(), threading.get_ident(), args)))
+
+    def remember_thread(self):
+        ident = threading.get_ident()
+        if ident not in self.thread_names:
+            self.thread_names[ident] = threading.current_thread().name
+
+    def reset(self):
+        with self.lock:
+            self.records.clear()
+            self.counters = dict.fromkeys(COUNTERS, 0)
+
+    # ---- reporting ----
+
+    def snapshot_counters(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def transactions(self):
+        return [record for kind, record in list(self.records) if kind == "txn"]
+
+    # latency percentiles in ms over the recorded transactions
+    def summary(self):
+        txns = [t for t in self.transactions() if t.start is not None]
+        result = {"count": len(txns)}
+        if not txns:
+            return result
+        total = np.array([t.end - t.submit for t in txns]) * 1000.0
+        queue = np.array([t.start - t.submit for t in txns]) * 1000.0
+        wire = np.array([t.rx - t.tx for t in txns if t.tx is not None and t.rx is not None]) * 1000.0
+        for name, values in (("total", total), ("queue", queue), ("wire", wire)):
+            if len(values):
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                result[name] = {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+                                "max_ms": float(values.max())}
+        return result
+
+    def export_chrome(self, path, baudrate=None):
+        events = []
+        pid = os.getpid()
+
+        def us(t):
+            return (t - self.epoch) * 1e6
+
+        for ident, name in list(self.thread_names.items()):
+            events.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": ident, "args": {"name": name}})
+        for kind, record in list(self.records):
+            if kind == "txn":
+                events.extend(chrome_transaction(record, pid, us, baudrate))
+            elif kind == "span":
+                name, start, end, tid, args = record
+                events.append({"ph": "X", "name": name, "cat": "span", "pid": pid, "tid": tid,
+                               "ts": us(start), "dur": (end - start) * 1e6, "args": args})
+            else:
+                name, t, tid, args = record
+                events.append({"ph": "i", "s": "t", "name": name, "cat": "event", "pid": pid, "tid": tid,
+                               "ts": us(t), "args": args})
+        counters = self.snapshot_counters()
+        events.append({"ph": "C", "name": "counters", "pid": pid, "ts": us(time.perf_counter()), "args": counters})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+def chrome_transaction(txn, pid, us, baudrate):
+    if txn.start is None:
+        # failed before it reached the I/O thread, e.g. session closed
+        return [{"ph": "i", "s": "t", "name": txn.name, "cat": "modbus", "pid": pid, "tid": txn.origin,
+                 "ts": us(txn.submit), "args": {"txn": txn.id, "error": txn.error}}]
+    tid = txn.thread
+    args = {"txn": txn.id, "queue_ms": (txn.start - txn.submit) * 1000.0, "tx_bytes": txn.tx_bytes,
+            "rx_bytes": txn.rx_bytes}
+    if txn.error is not None:
+        args["error"] = txn.error
+    events = [
+        {"ph": "X", "name": txn.name, "cat": "modbus", "pid": pid, "tid": tid, "ts": us(txn.start),
+         "dur": (txn.end - txn.start) * 1e6, "args": args},
+        {"ph": "b", "name": "queue", "cat": "queue", "id": txn.id, "pid": pid, "tid": txn.origin,
+         "ts": us(txn.submit)},
+        {"ph": "e", "name": "queue", "cat": "queue", "id": txn.id, "pid": pid, "tid": txn.origin,
+         "ts": us(txn.start)},
+        {"ph": "s", "name": "submit", "cat": "flow", "id": txn.id, "pid": pid, "tid": txn.origin,
+         "ts": us(txn.submit)},
+        {"ph": "f", "bp": "e", "name": "submit", "cat": "flow", "id": txn.id, "pid": pid, "tid": tid,
+         "ts": us(txn.start)},
+    ]
+    if txn.connect:
+        events.append({"ph": "X", "name": "connect", "cat": "modbus", "pid": pid, "tid": tid,
+                       "ts": us(txn.start), "dur": txn.connect * 1e6})
+    if txn.tx is not None:
+        # the hook only tells when the frame was handed to the port, its wire time follows from the baud rate
+        tx_end = txn.tx + txn.tx_bytes * BITS_PER_CHAR / baudrate if baudrate else txn.tx
+        events.append({"ph": "X", "name": "tx", "cat": "modbus", "pid": pid, "tid": tid, "ts": us(txn.tx),
+                       "dur": (tx_end - txn.tx) * 1e6})
+        if txn.rx is not None:
+            events.append({"ph": "X", "name": "rx", "cat": "modbus", "pid": pid, "tid": tid, "ts": us(tx_end),
+                           "dur": max(0.0, txn.rx - tx_end) * 1e6})
+    return events
+
+
+# process-wide tracer used by the sessions, the coalescer and the app
+tracer = Tracer()
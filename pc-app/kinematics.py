@@ -0,0 +1,343 @@
+# hand-stand/pc-app/kinematics.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Cartesian paths: arm geometry, servo calibration, forward and inverse
+# kinematics, and straight-line tool paths compiled into scripts.
+#
+# Joints: yaw turns the arm about the vertical axis, horizontal (shoulder),
+# vertical (elbow) and pitch (wrist) bend it in the vertical plane, twist
+# rolls the tool, grab is passed through as a logical value. Angles are
+# measured from the arm pointing straight up (shoulder) or straight on
+# (elbow, wrist), positive forwards/down; the tool pitch of a pose is its
+# angle above the horizontal. Lengths in mm, angles in degrees in files.
+#
+# Calibration: a servo turns to angle a at pulse zero + a * us_per_deg. The
+# firmware maps logical 0..999 onto the min..max pulse of the servo
+# (registers 20..25 / 30..35), so the min/max registers set both the joint
+# limits and the logical value of every angle.
+#
+# Inverse kinematics is closed form - yaw from atan2, shoulder and elbow
+# from the triangle of the two arm links, wrist from the tool pitch - and
+# solves a whole path with NumPy at once. There are four solutions (elbow
+# up or down, reaching forwards or back over the top); the one within the
+# servo limits and nearest the warm start is taken. The warm start is the
+# previous point's solution where that came from the cache, else the last
+# solution of the solver, so a path continues the way the arm stands.
+# IKSolver keeps recently solved poses (rounded to 0.1 mm / 0.1 deg): when a
+# path is re-planned after editing a waypoint, the unchanged points keep
+# their solution and only the new ones are solved.
+#
+# Path file (json), a list of waypoints or {"arm": geometry, "waypoints": [...]}:
+#   {"xyz": [200, 0, 150], "pitch": -30, "twist": 0, "grab": 200, "velocity": 50, "dwell": 500}
+# pitch, twist and grab default to the waypoint before, velocity (mm/s, on
+# the way into the waypoint) to DEFAULT_VELOCITY, dwell (ms held there) to 0.
+# The first waypoint is approached at the default ramp speed from wherever
+# the arm is, its dwell (DEFAULT_DELAY) has to cover that. Geometry file (json):
+#   {"links": {"base": 70, "upper": 105, "forearm": 100, "tool": 140},
+#    "servos": {"yaw": {"zero": 1500, "us_per_deg": 11.1}, ...}}
+# Segments are cut into rows every step mm (or 1/rate s for a fixed-rate
+# setpoint stream), no row shorter than a controller tick. Every row carries
+# per-servo ramp speeds that bring all joints to it together, within its
+# delay, so the tool moves along the line between rows too.
+#
+# Usage (from pc-app directory):
+#   python -m kinematics path.json -o script.json [--geometry arm.json] [--step 5 | --rate 10]
+
+import argparse
+import json
+import math
+import sys
+
+import numpy as np
+
+from registers import (ACTUAL_MAX, ACTUAL_MIN, DEFAULT_SPEED, LOGICAL_MAX, LOGICAL_MIN, NUM_SERVOS, SERVO_NAMES,
+                       SPEED_MAX, SPEED_TICK)
+from script_model import DEFAULT_DELAY, DEFAULT_LOGICAL, clamped_script, save_script
+
+JOINTS = ("yaw", "horizontal", "vertical", "pitch", "twist")  # calibrated servos, in SERVO_NAMES order
+IK_JOINTS = 4  # yaw, shoulder, elbow, wrist: set by the pose; twist is given
+GRAB = SERVO_NAMES.index("grab")
+
+DEFAULT_LINKS = {"base": 70.0, "upper": 105.0, "forearm": 100.0, "tool": 140.0}
+DEFAULT_ZERO = 1500.0               # us at 0 deg
+DEFAULT_US_PER_DEG = 2000.0 / 180   # 500..2500 us over 180 deg
+DEFAULT_STEP = 5.0                  # mm between rows
+DEFAULT_VELOCITY = 50.0             # mm/s
+CACHE_SIZE = 16384                  # poses kept by IKSolver
+REACH_EPS = 1e-9
+TICK_MS = SPEED_TICK * 1000
+
+# pose key resolution: 0.1 mm, 0.1 deg, 16 bits a coordinate
+KEY_SCALE = np.array([10.0, 10.0, 10.0, 10.0 * 180.0 / math.pi])
+KEY_SHIFT = np.array([48, 32, 16, 0], dtype=np.uint64)
+KEY_OFFSET = 1 << 15
+
+
+class ArmModel:
+    def __init__(self, links=None, zero=None, us_per_deg=None, values_min=None, values_max=None):
+        links = {**DEFAULT_LINKS, **(links or {})}
+        self.base, self.upper, self.forearm, self.tool = (float(links[name]) for name in DEFAULT_LINKS)
+        self.zero = np.broadcast_to(np.asarray(DEFAULT_ZERO if zero is None else zero, dtype=np.float64),
+                                    (len(JOINTS),))
+        self.us_per_deg = np.broadcast_to(
+            np.asarray(DEFAULT_US_PER_DEG if us_per_deg is None else us_per_deg, dtype=np.float64), (len(JOINTS),))
+        if not np.all(self.us_per_deg):
+            raise ValueError("us_per_deg can not be 0")
+        self.set_limits(values_min, values_max)
+
+    @classmethod
+    def from_config(cls, config):
+        servos = config.get("servos", {})
+        unknown = set(servos) - set(JOINTS)
+        if unknown:
+            raise ValueError(f"unknown servos {', '.join(sorted(unknown))}, expected {', '.join(JOINTS)}")
+        return cls(config.get("links"),
+                   [servos.get(name, {}).get("zero", DEFAULT_ZERO) for name in JOINTS],
+                   [servos.get(name, {}).get("us_per_deg", DEFAULT_US_PER_DEG) for name in JOINTS])
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            return cls.from_config(json.load(f))
+
+    # min/max pulse of every servo (registers 20..25 / 30..35), None: the full ACTUAL range
+    def set_limits(self, values_min=None, values_max=None):
+        self.values_min = np.asarray(ACTUAL_MIN if values_min is None else values_min, dtype=np.float64)
+        self.values_max = np.asarray(ACTUAL_MAX if values_max is None else values_max, dtype=np.float64)
+        self.values_min, self.values_max = (np.broadcast_to(x, (NUM_SERVOS,))[:len(JOINTS)]
+                                            for x in (self.values_min, self.values_max))
+        ends = self.angles_at(np.stack((self.values_min, self.values_max)))
+        self.angle_low, self.angle_high = ends.min(axis=0), ends.max(axis=0)
+
+    # (..., joints) servo pulses -> radians
+    def angles_at(self, actual):
+        return np.radians((actual - self.zero) / self.us_per_deg)
+
+    # (..., joints) radians -> logical values as the firmware maps them back onto min..max
+    def to_logical(self, angles):
+        actual = self.zero + np.degrees(angles) * self.us_per_deg
+        span = np.where(self.values_max != self.values_min, self.values_max - self.values_min, 1.0)
+        return np.rint((actual - self.values_min) * (LOGICAL_MAX - LOGICAL_MIN) / span) + LOGICAL_MIN
+
+    def to_angles(self, logical):
+        actual = self.values_min + (np.asarray(logical, dtype=np.float64) - LOGICAL_MIN) * (
+            self.values_max - self.values_min) / (LOGICAL_MAX - LOGICAL_MIN)
+        return self.angles_at(actual)
+
+    def within_limits(self, angles, joints=slice(None)):
+        return np.all((angles >= self.angle_low[joints] - REACH_EPS) &
+                      (angles <= self.angle_high[joints] + REACH_EPS), axis=-1)
+
+    # (N, >=4) joint angles -> (N, 4) poses: x, y, z, tool pitch (radians above the horizontal)
+    def forward(self, angles):
+        angles = np.atleast_2d(angles)
+        yaw, shoulder, elbow, wrist = (angles[:, i] for i in range(IK_JOINTS))
+        a1 = shoulder
+        a2 = a1 + elbow
+        a3 = a2 + wrist
+        r = self.upper * np.sin(a1) + self.forearm * np.sin(a2) + self.tool * np.sin(a3)
+        z = self.base + self.upper * np.cos(a1) + self.forearm * np.cos(a2) + self.tool * np.cos(a3)
+        return np.column_stack((r * np.cos(yaw), r * np.sin(yaw), z, np.pi / 2 - a3))
+
+    # (N, 4) poses -> (4, N, 4) yaw/shoulder/elbow/wrist of every solution and (4, N) which are valid
+    def inverse_candidates(self, poses):
+        x, y, z, pitch = poses.T
+        a3 = np.pi / 2 - pitch
+        yaw = np.arctan2(y, x)
+        r = np.hypot(x, y)
+        candidates, valid = [], []
+        for flip in (False, True):
+            yaw_c = np.where(yaw > 0, yaw - np.pi, yaw + np.pi) if flip else yaw
+            r_c = -r if flip else r
+            rw = r_c - self.tool * np.sin(a3)
+            zw = z - self.base - self.tool * np.cos(a3)
+            cos_elbow = (rw * rw + zw * zw - self.upper ** 2 - self.forearm ** 2) / (2 * self.upper * self.forearm)
+            reachable = np.abs(cos_elbow) <= 1 + REACH_EPS
+            for sign in (1.0, -1.0):
+                elbow = sign * np.arccos(np.clip(cos_elbow, -1.0, 1.0))
+                shoulder = np.arctan2(rw, zw) - np.arctan2(self.forearm * np.sin(elbow),
+                                                          self.upper + self.forearm * np.cos(elbow))
+                shoulder = (shoulder + np.pi) % (2 * np.pi) - np.pi
+                wrist = (a3 - shoulder - elbow + np.pi) % (2 * np.pi) - np.pi
+                joints = np.column_stack((yaw_c, shoulder, elbow, wrist))
+                candidates.append(joints)
+                valid.append(reachable & self.within_limits(joints, slice(IK_JOINTS)))
+        return np.stack(candidates), np.stack(valid)
+
+
+class IKSolver:
+    def __init__(self, arm, size=CACHE_SIZE):
+        self.arm = arm
+        self.size = size
+        self.reference = np.zeros(IK_JOINTS)  # warm start of a path with nothing cached
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+        self.clear()
+
+    # the cached solutions depend on geometry and limits: call after changing the arm
+    def clear(self):
+        self.keys = np.zeros(0, dtype=np.uint64)    # sorted pose keys
+        self.solutions = np.zeros((0, IK_JOINTS))
+        self.used = np.zeros(0, dtype=np.int64)     # call that last used the entry, for eviction
+
+    def set_limits(self, values_min, values_max):
+        self.arm.set_limits(values_min, values_max)
+        self.clear()
+
+    # (N, 4) poses (x, y, z mm, tool pitch radians) -> (N, 4) yaw/shoulder/elbow/wrist radians.
+    # ValueError names the points out of reach or outside the servo limits
+    def solve(self, poses, warm=None):
+        poses = np.atleast_2d(np.asarray(poses, dtype=np.float64))
+        self.calls += 1
+        keys = pose_keys(poses)
+        slots = np.minimum(np.searchsorted(self.keys, keys), max(len(self.keys) - 1, 0))
+        hit = self.keys[slots] == keys if len(self.keys) else np.zeros(len(poses), dtype=bool)
+        solutions = np.empty((len(poses), IK_JOINTS))
+        solutions[hit] = self.solutions[slots[hit]]
+        self.used[slots[hit]] = self.calls
+        miss = np.flatnonzero(~hit)
+        self.hits += len(poses) - len(miss)
+        self.misses += len(miss)
+        if len(miss):
+            reference = self.reference if warm is None else np.asarray(warm, dtype=np.float64)[:IK_JOINTS]
+            previous = np.maximum(miss - 1, 0)
+            from_cache = (miss > 0) & hit[previous]
+            warm_rows = np.where(from_cache[:, None], solutions[previous], reference)
+            candidates, valid = self.arm.inverse_candidates(poses[miss])
+            cost = np.where(valid, np.square(candidates - warm_rows).sum(axis=2), np.inf)
+            best = cost.argmin(axis=0)
+            failed = miss[~valid.any(axis=0)]
+            if len(failed):
+                shown = ", ".join(str(i + 1) for i in failed[:5]) + (" ..." if len(failed) > 5 else "")
+                raise ValueError(f"{len(failed)} points out of reach or outside the servo limits: {shown}")
+            solutions[miss] = candidates[best, np.arange(len(miss))]
+            self.store(keys[miss], solutions[miss])
+        if len(solutions):
+            self.reference = solutions[-1]
+        return solutions
+
+    def store(self, keys, solutions):
+        keys, first = np.unique(keys, return_index=True)
+        keys = np.concatenate((self.keys, keys))
+        solutions = np.concatenate((self.solutions, solutions[first]))
+        used = np.concatenate((self.used, np.full(len(first), self.calls)))
+        if len(keys) > self.size:
+            keep = np.sort(np.argsort(used, kind="stable")[-self.size:])
+            keys, solutions, used = keys[keep], solutions[keep], used[keep]
+        order = np.argsort(keys, kind="stable")
+        self.keys, self.solutions, self.used = keys[order], solutions[order], used[order]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "cached": len(self.keys),
+                "hit_rate": self.hits / total if total else 0.0}
+
+
+def pose_keys(poses):
+    quantized = np.rint(poses * KEY_SCALE).astype(np.int64) + KEY_OFFSET
+    if len(quantized) and (quantized.min() < 0 or quantized.max() >= 1 << 16):
+        raise ValueError("pose out of the key range (+-3.2 m, +-180 deg)")
+    return np.bitwise_or.reduce(quantized.astype(np.uint64) << KEY_SHIFT, axis=1)
+
+
+# ---- paths ----
+
+def load_path(path):
+    with open(path, "r") as f:
+        config = json.load(f)
+    if isinstance(config, dict):
+        return config.get("waypoints", []), config.get("arm")
+    return config, None
+
+
+# waypoint columns: (W, 3) xyz, then (W,) pitch radians, twist radians, grab, velocity, dwell
+def waypoint_arrays(waypoints):
+    if not waypoints:
+        raise ValueError("path has no waypoints")
+    xyz = np.zeros((len(waypoints), 3))
+    columns = np.zeros((5, len(waypoints)))
+    last = [0.0, 0.0, DEFAULT_LOGICAL]
+    for index, waypoint in enumerate(waypoints):
+        try:
+            xyz[index] = waypoint["xyz"]
+            last = [waypoint.get(name, value) for name, value in zip(("pitch", "twist", "grab"), last)]
+            columns[:3, index] = last
+            columns[3, index] = waypoint.get("velocity", DEFAULT_VELOCITY)
+            columns[4, index] = waypoint.get("dwell", DEFAULT_DELAY if index == 0 else 0)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"waypoint {index + 1}: {e!r}") from None
+    if np.any(columns[3, 1:] <= 0):
+        raise ValueError("velocity must be above 0")
+    pitch, twist, grab, velocity, dwell = columns
+    return xyz, np.radians(pitch), np.radians(twist), grab, velocity, dwell
+
+
+# straight segments between the waypoints -> ScriptData; rows every step mm, or every 1/rate s
+# warm: joint angles to start from, e.g. the current pose, by default where the solver left off
+def plan_path(waypoints, solver, step=DEFAULT_STEP, rate=None, warm=None):
+    xyz, pitch, twist, grab, velocity, dwell = waypoint_arrays(waypoints)
+    lengths = np.linalg.norm(np.diff(xyz, axis=0), axis=1)
+    durations = lengths / velocity[1:] * 1000.0  # ms
+    counts = np.ceil(durations * rate / 1000.0 if rate else lengths / step)
+    # the controller ramps once a tick, shorter rows would leave it behind
+    counts = np.maximum(np.minimum(counts, durations // TICK_MS), 1).astype(np.int64)
+
+    # every row: the segment it ends and how far along it; row 0 is the first waypoint
+    segment = np.repeat(np.arange(len(counts)), counts)
+    ends = np.cumsum(counts)
+    fraction = (np.arange(len(segment)) - (ends - counts)[segment] + 1) / counts[segment]
+    columns = np.column_stack((xyz, pitch, twist, grab))
+    rows = columns[segment] + fraction[:, None] * (columns[segment + 1] - columns[segment])
+    rows = np.vstack((columns[:1], rows))
+    travel = np.concatenate(([0.0], (durations / counts)[segment]))
+    delays = np.rint(travel)
+    delays[np.concatenate(([0], ends))] += dwell
+
+    poses = rows[:, :IK_JOINTS]
+    joints = solver.solve(poses, warm)
+    angles = np.column_stack((joints, rows[:, 4]))
+    twist_ok = solver.arm.within_limits(angles[:, IK_JOINTS:], slice(IK_JOINTS, None))
+    if not twist_ok.all():
+        raise ValueError(f"twist outside the servo limits at point {np.flatnonzero(~twist_ok)[0] + 1}")
+    values = np.empty((len(rows), NUM_SERVOS), dtype=np.int64)
+    values[:, :len(JOINTS)] = solver.arm.to_logical(angles)
+    values[:, GRAB] = np.rint(rows[:, 5])
+    return clamped_script(values, delays.astype(np.int64), row_ramp_speeds(values, travel))
+
+
+# per-servo ramp speed of every row: all joints reach the row together, within its travel time
+def row_ramp_speeds(values, travel):
+    ticks = np.maximum(travel // TICK_MS, 1)
+    moves = np.abs(np.diff(values, axis=0))
+    speeds = np.clip(np.ceil(moves / ticks[1:, None]), 1, SPEED_MAX).astype(np.int64)
+    return np.vstack((np.full((1, NUM_SERVOS), DEFAULT_SPEED), speeds))  # the way to the start: default ramp
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="kinematics", description="Compile a Cartesian tool path into a script")
+    parser.add_argument("path", help="waypoint file (.json)")
+    parser.add_argument("-o", "--output", required=True, help="script file to write (.json or binary .hss)")
+    parser.add_argument("--geometry", help="arm geometry and servo calibration (.json)")
+    parser.add_argument("--step", type=float, default=DEFAULT_STEP, help="mm between rows")
+    parser.add_argument("--rate", type=float, help="rows per second instead of --step: a fixed-rate stream")
+    args = parser.parse_args(argv)
+    try:
+        waypoints, geometry = load_path(args.path)
+        if args.geometry:
+            arm = ArmModel.load(args.geometry)
+        else:
+            arm = ArmModel.from_config(geometry or {})
+        script = plan_path(waypoints, IKSolver(arm), args.step, args.rate)
+    except (OSError, ValueError) as e:
+        print("error", e)
+        return 1
+    save_script(args.output, script)
+    print(f"{len(waypoints)} waypoints -> {len(script)} rows, {script.delays.sum() / 1000:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,422 @@
+# hand-stand/pc-app/modbus_session.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Long-lived Modbus RTU session for one serial port.
+#
+# The serial port is opened once and owned by a dedicated I/O thread.
+# Every port open toggles DTR and resets the Mega 2560, so callers never
+# open the port themselves - they submit work to the session and get a
+# concurrent.futures.Future back.
+# Lost connections are re-established transparently with exponential backoff.
+# Every request is traced as an instrumentation.Transaction.
+# Requests wait in priority lanes (command_lanes.py) with a deadline: Stop
+# goes first, GUI commands before playback rows, telemetry last.
+#
+# The port always opens at the controller boot rate (9600). A higher
+# baudrate is negotiated through the BAUD_ADDR register once connected,
+# and again after every reconnect, because the reset drops the controller
+# back to the boot rate.
+
+import inspect
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from pymodbus.client.serial import ModbusSerialClient as ModbusClient
+from pymodbus.exceptions import ConnectionException
+
+from command_lanes import (LANE_INTERACTIVE, LANE_STOP, LANE_TELEMETRY, MOTION_LANES, CommandLanes, expired,
+                           lane_deadline)
+from instrumentation import tracer
+from registers import (BAUD_ADDR, BAUD_PROBATION, BAUD_RATES, BOOT_BAUDRATE, MODBUS_UNIT_ID, NUM_SERVOS,
+                       VALUES_ACTUAL_ADDR)
+
+DEFAULT_BAUDRATE = BOOT_BAUDRATE
+DEFAULT_TIMEOUT = 1
+BITS_PER_CHAR = 10          # 8N1
+BAUD_SWITCH_DELAY = 0.05    # controller flushes its reply and reopens Serial1
+
+RECONNECT_DELAY = 0.5
+RECONNECT_DELAY_MAX = 8.0
+
+WAKE = "wake"  # command that only makes the I/O thread connect
+
+# the port itself failed: pyserial raises SerialException, an OSError, and pymodbus turns it
+# into ConnectionException. A reply timeout (ModbusIOException, or TimeoutError - an OSError too)
+# leaves the port open: opening it again would reset the controller for nothing
+LINK_ERRORS = (OSError, ConnectionException)
+
+
+# pymodbus renamed the unit id keyword from "slave" to "device_id" in 3.10
+UNIT_KWARG = ("device_id" if "device_id" in inspect.signature(ModbusClient.read_holding_registers).parameters
+              else "slave")
+# raw frame hook, added in pymodbus 3.8
+TRACE_PACKET = "trace_packet" in inspect.signature(ModbusClient.__init__).parameters
+
+
+class ModbusError(Exception):
+    def __init__(self, message, exception_code=None):
+        super().__init__(message)
+        self.exception_code = exception_code  # code of an exception reply, None for local errors
+
+
+# RTU inter-character (t1.5) and inter-frame (t3.5) silence in seconds,
+# fixed at 750/1750 us above 19200 baud as the Modbus serial line spec recommends
+def rtu_timing(baudrate, bits=BITS_PER_CHAR):
+    if baudrate > 19200:
+        return 0.00075, 0.00175
+    char = bits / baudrate
+    return 1.5 * char, 3.5 * char
+
+
+# change the baud rate of an open client without reopening the port - reopening resets the controller
+def set_client_baudrate(client, baudrate):
+    if hasattr(client, "set_baudrate"):
+        client.set_baudrate(baudrate)
+        return
+    port = getattr(client, "socket", None)
+    if port is None:
+        # asyncio client: the pyserial object sits behind the transport
+        transport = getattr(getattr(client, "ctx", None), "transport", None)
+        port = getattr(transport, "sync_serial", None)
+    if port is None:
+        raise ModbusError("this client can not change its baud rate while open")
+    port.baudrate = baudrate
+    if hasattr(client, "comm_params"):
+        client.comm_params.baudrate = baudrate
+    if hasattr(client, "_t0"):
+        # pymodbus derives its receive polling and inter-byte timeout from the baud rate at construction
+        client._t0 = BITS_PER_CHAR / baudrate
+        client._recv_interval = max(client._t0 * 4, 0.001)
+        client.inter_byte_timeout = rtu_timing(baudrate)[0] if baudrate <= 19200 else 0
+        port.inter_byte_timeout = client.inter_byte_timeout or None
+
+
+class ModbusSession:
+    def __init__(self, port, baudrate=DEFAULT_BAUDRATE, timeout=DEFAULT_TIMEOUT,
+                 unit=MODBUS_UNIT_ID, on_status=None, reconnect_delay=RECONNECT_DELAY,
+                 reconnect_delay_max=RECONNECT_DELAY_MAX, client_factory=None, boot_baudrate=BOOT_BAUDRATE):
+        self.port = port
+        self.baudrate = baudrate            # wanted link rate, negotiated after connect
+        self.boot_baudrate = boot_baudrate  # rate the controller listens at after reset
+        self.link_baudrate = boot_baudrate  # rate the port runs at right now
+        self.timeout = timeout
+        self.unit = unit
+        self.on_status = on_status  # called from the I/O thread with True/False
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_delay_max = reconnect_delay_max
+        self.client_factory = client_factory or serial_client  # (port, baudrate, timeout, trace_packet) -> client
+
+        self.client = None
+        self.connected = False
+        self.commands = CommandLanes()
+        self.closing = False
+        self.backoff = reconnect_delay
+        self.next_attempt = 0.0
+        self.was_connected = False
+        self.current = None  # transaction on the wire, fed by the trace_packet hook
+        self.thread = threading.Thread(target=self.run, name=f"modbus-{port}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def close(self):
+        if self.closing:
+            return
+        self.closing = True
+        self.commands.put(LANE_TELEMETRY, None)  # lowest lane: whatever is queued still goes out
+        if threading.current_thread() is not self.thread:
+            self.thread.join(timeout=2)
+
+    # ---- public API, safe to call from any thread ----
+
+    # run fn(client, *args) on the I/O thread, return a Future with its result.
+    # lane: command_lanes priority; deadline: monotonic time after which it is dropped unsent
+    def submit(self, fn, *args, lane=LANE_INTERACTIVE, deadline=None):
+        future = Future()
+        txn = tracer.transaction(fn.__name__.lstrip("_"))
+        future.txn_id = txn.id  # correlates the caller's log line with the trace
+        if self.closing:
+            fail(future, txn, "session closed")
+            return future
+        self.commands.put(lane, (fn, args, future, txn, lane_deadline(lane, deadline)))
+        return future
+
+    # unit overrides the session's unit id, for several controllers on one RS-485 bus
+    def read_registers(self, address, count, unit=None, lane=LANE_INTERACTIVE, deadline=None):
+        return self.submit(_read_registers, self.unit if unit is None else unit, address, count,
+                           lane=lane, deadline=deadline)
+
+    def write_register(self, address, value, unit=None, lane=LANE_INTERACTIVE, deadline=None):
+        return self.submit(_write_register, self.unit if unit is None else unit, address, value,
+                           lane=lane, deadline=deadline)
+
+    def write_registers(self, address, values, unit=None, lane=LANE_INTERACTIVE, deadline=None):
+        return self.submit(_write_registers, self.unit if unit is None else unit, address, list(values),
+                           lane=lane, deadline=deadline)
+
+    # FC23: write values from address on, then read read_count registers from read_address in the
+    # same frame; the Future gives the registers read
+    def readwrite_registers(self, address, values, read_address, read_count, unit=None, lane=LANE_INTERACTIVE,
+                            deadline=None):
+        return self.submit(_readwrite_registers, self.unit if unit is None else unit, address, list(values),
+                           read_address, read_count, lane=lane, deadline=deadline)
+
+    # switch the link to another rate from BAUD_RATES, the Future gives the rate in use afterwards
+    def set_baudrate(self, baudrate):
+        return self.submit(self._set_baudrate, baudrate)
+
+    # stop all servos where they are, ahead of everything queued; the Future gives the positions
+    def hold(self, unit=None):
+        return self.submit(_hold, self.unit if unit is None else unit, lane=LANE_STOP)
+
+    # throw away the queued commands of some lanes, e.g. on Stop; returns how many
+    def drop(self, lanes=MOTION_LANES):
+        dropped = 0
+        for command in self.commands.drop(lanes):
+            if command is None:
+                self.commands.put(LANE_TELEMETRY, None)
+            elif command is not WAKE:
+                fn, args, future, txn, deadline = command
+                dropped += fail(future, txn, "dropped by stop")
+        tracer.count("dropped", dropped)
+        return dropped
+
+    # connect now instead of waiting out the backoff, e.g. the port was just plugged in again
+    def reconnect_now(self):
+        if not self.closing:
+            self.commands.put(LANE_STOP, WAKE)
+
+    # ---- I/O thread ----
+
+    def run(self):
+        self.try_connect()
+        while True:
+            try:
+                command = self.commands.get(timeout=self.idle_timeout())
+            except queue.Empty:
+                if not self.connected:
+                    self.try_connect()
+                continue
+            if command is None:
+                break
+            if command is WAKE:
+                if not self.connected:
+                    self.backoff = self.reconnect_delay
+                    self.try_connect(force=True)
+                continue
+            fn, args, future, txn, deadline = command
+            if expired(deadline):
+                tracer.count("expired", fail(future, txn, "deadline expired"))
+                continue
+            if not future.set_running_or_notify_cancel():
+                continue
+            txn.start = time.perf_counter()
+            self.current = txn
+            try:
+                result = self.execute(fn, args, txn)
+            except Exception as e:
+                tracer.finish(txn, str(e))
+                future.set_exception(e)
+            else:
+                tracer.finish(txn)
+                future.set_result(result)
+            finally:
+                self.current = None
+        self.disconnect()
+
+    def idle_timeout(self):
+        if self.connected:
+            return None
+        return max(0.0, self.next_attempt - time.monotonic())
+
+    def execute(self, fn, args, txn):
+        if not self.connected:
+            t = time.perf_counter()
+            connected = self.try_connect()
+            txn.connect += time.perf_counter() - t
+            if not connected:
+                raise ModbusError(f"{self.port}: connect failed")
+        try:
+            return self.call(fn, args, txn)
+        except Exception as e:
+            if not link_lost(e):
+                raise
+            # port dropped mid-transaction: reopen once and retry the same request,
+            # the reopen resets the controller and undoes whatever the first one did
+            self.disconnect()
+            t = time.perf_counter()
+            connected = self.try_connect(force=True)
+            txn.connect += time.perf_counter() - t
+            if not connected:
+                raise
+            tracer.count("retries")
+            return self.call(fn, args, txn)
+
+    def call(self, fn, args, txn):
+        try:
+            return fn(self.client, *args)
+        except ModbusError:
+            tracer.count("exception_responses")
+            raise
+        except Exception:
+            count_failure(txn)
+            raise
+
+    # trace_packet hook of the client
+    def on_packet(self, sending, data):
+        txn = self.current
+        if txn is not None:
+            txn.on_packet(sending, data)
+        return data
+
+    def try_connect(self, force=False):
+        now = time.monotonic()
+        if not force and now < self.next_attempt:
+            return False
+        if self.client is None:
+            self.client = self.client_factory(self.port, self.boot_baudrate, self.timeout,
+                                              trace_packet=self.on_packet)
+            self.link_baudrate = self.boot_baudrate
+        try:
+            ok = self.client.connect()
+        except Exception as e:
+            print(f"error connect {self.port} -> {e}")
+            ok = False
+        if ok:
+            if self.was_connected:
+                tracer.count("reconnects")
+            self.was_connected = True
+            self.backoff = self.reconnect_delay
+            self.next_attempt = 0.0
+            if self.baudrate != self.link_baudrate:
+                try:
+                    self.negotiate(self.client, self.baudrate)
+                except Exception as e:
+                    print(f"error set baudrate {self.baudrate} on {self.port} -> {e}")
+        else:
+            tracer.count("connect_failures")
+            self.next_attempt = now + self.backoff
+            self.backoff = min(self.backoff * 2, self.reconnect_delay_max)
+        self.set_connected(ok)
+        return ok
+
+    def _set_baudrate(self, client, baudrate):
+        try:
+            self.baudrate = self.negotiate(client, baudrate)
+        except Exception:
+            self.baudrate = self.link_baudrate  # a rate that failed is not retried on reconnect
+            raise
+        return self.baudrate
+
+    def negotiate(self, client, baudrate):
+        if baudrate not in BAUD_RATES:
+            raise ModbusError(f"unsupported baud rate {baudrate}, use one of {BAUD_RATES}")
+        if baudrate == self.link_baudrate:
+            return baudrate
+        code = BAUD_RATES.index(baudrate)
+        try:
+            # answered at the current rate, the controller switches right after the reply
+            _write_register(client, self.unit, BAUD_ADDR, code)
+        except ModbusError as e:
+            raise ModbusError(f"controller does not support baud switching -> {e}")
+        except Exception:
+            pass  # no answer: it may still run at the target rate from before, the probe below tells
+        time.sleep(BAUD_SWITCH_DELAY)
+        set_client_baudrate(client, baudrate)
+        try:
+            # the same code written at the new rate ends the controller's probation
+            _write_register(client, self.unit, BAUD_ADDR, code)
+        except Exception as e:
+            # wait for the controller to fall back and probe it at the boot rate
+            set_client_baudrate(client, self.boot_baudrate)
+            self.link_baudrate = self.boot_baudrate
+            time.sleep(BAUD_PROBATION + BAUD_SWITCH_DELAY)
+            try:
+                _read_registers(client, self.unit, BAUD_ADDR, 1)
+            except Exception:
+                # only the reply to the confirmation got lost, the controller stayed at the new rate
+                set_client_baudrate(client, baudrate)
+                if _read_registers(client, self.unit, BAUD_ADDR, 1) != [code]:
+                    raise
+            else:
+                raise ModbusError(f"switch to {baudrate} failed ({e}), link is back at {self.boot_baudrate}")
+        self.link_baudrate = baudrate
+        print(f"{self.port}: link at {baudrate} baud")
+        return baudrate
+
+    def disconnect(self):
+        if self.client is not None:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+            self.client = None
+        self.set_connected(False)
+
+    def set_connected(self, connected):
+        changed = connected != self.connected
+        self.connected = connected
+        if changed and self.on_status:
+            self.on_status(connected)
+
+
+# no retries in pymodbus: a request without a reply holds the I/O thread, and the Stop behind it,
+# for one timeout only; the session retries by itself after a reconnect
+def serial_client(port, baudrate, timeout, trace_packet=None):
+    kwargs = {"trace_packet": trace_packet} if TRACE_PACKET and trace_packet else {}
+    return ModbusClient(port=port, baudrate=baudrate, timeout=timeout, stopbits=1, bytesize=8, parity='N',
+                        retries=0, **kwargs)
+
+
+# a request that got no valid reply: silence is a timeout, bytes that never formed a frame are a bad frame
+def link_lost(e):
+    return isinstance(e, LINK_ERRORS) and not isinstance(e, TimeoutError)
+
+
+def count_failure(txn):
+    tracer.count("bad_frames" if txn.rx_bytes else "timeouts")
+
+
+# fail a command that never reached the wire, 1 if it was still pending
+def fail(future, txn, message):
+    tracer.finish(txn, message)
+    if not future.set_running_or_notify_cancel():
+        return 0
+    future.set_exception(ModbusError(message))
+    return 1
+
+
+def check(result):
+    if result is None or result.isError():
+        raise ModbusError(str(result), getattr(result, "exception_code", None))
+    return result
+
+
+def _read_registers(client, unit, address, count):
+    return check(client.read_holding_registers(address=address, count=count, **{UNIT_KWARG: unit})).registers
+
+
+def _write_register(client, unit, address, value):
+    check(client.write_register(address=address, value=value, **{UNIT_KWARG: unit}))
+
+
+def _write_registers(client, unit, address, values):
+    check(client.write_registers(address=address, values=values, **{UNIT_KWARG: unit}))
+
+
+def _readwrite_registers(client, unit, address, values, read_address, read_count):
+    return check(client.readwrite_registers(read_address=read_address, read_count=read_count, write_address=address,
+                                            values=values, **{UNIT_KWARG: unit})).registers
+
+
+# the current positions written back as actual values: every ramp stops there,
+# the firmware moves the logical targets to the same place
+def _hold(client, unit):
+    actual = _read_registers(client, unit, VALUES_ACTUAL_ADDR, NUM_SERVOS)
+    _write_registers(client, unit, VALUES_ACTUAL_ADDR, actual)
+    return actual
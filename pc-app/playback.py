@@ -0,0 +1,79 @@
+# hand-stand/pc-app/playback.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Deadline-based script playback.
+#
+# Frames are (values, delay_ms) pairs taken straight from the script data.
+# Row i is due at start + sum(delay[0..i-1]) on the monotonic clock, so the
+# time spent sending a row or waiting on the GUI never accumulates as drift.
+# The engine only submits writes and reports progress, it never touches Tk.
+
+import statistics
+import threading
+import time
+
+
+class PlaybackEngine:
+    def __init__(self, frames, send, on_progress=None, on_finished=None, start_index=0):
+        self.frames = frames            # sequence of (values, delay_ms)
+        self.send = send                # send(values), must not block on I/O
+        self.on_progress = on_progress  # on_progress(index), called from the playback thread
+        self.on_finished = on_finished  # on_finished(engine), called from the playback thread
+        self.start_index = start_index
+
+        self.stop_event = threading.Event()
+        self.lateness = []  # seconds, per sent row
+        self.thread = threading.Thread(target=self.run, name="playback", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    @property
+    def running(self):
+        return self.thread.is_alive() and not self.stop_event.is_set()
+
+    def run(self):
+        try:
+            self.play()
+        finally:
+            if self.on_finished:
+                self.on_finished(self)
+
+    def play(self):
+        deadline = time.monotonic()
+        for index in range(self.start_index, len(self.frames)):
+            values, delay_ms = self.frames[index]
+            remaining = deadline - time.monotonic()
+            if remaining > 0 and self.stop_event.wait(remaining):
+                return
+            if self.stop_event.is_set():
+                return
+            self.lateness.append(time.monotonic() - deadline)
+            self.send(values)
+            if self.on_progress:
+                self.on_progress(index)
+            deadline += delay_ms / 1000.0
+        # hold the last row for its delay, like the old Go loop did
+        self.stop_event.wait(max(0.0, deadline - time.monotonic()))
+
+    # lateness of each row against its deadline, in milliseconds
+    def timing_report(self):
+        if not self.lateness:
+            return {"rows": 0}
+        late_ms = sorted(x * 1000.0 for x in self.lateness)
+        return {
+            "rows": len(late_ms),
+            "mean_late_ms": statistics.fmean(late_ms),
+            "p95_late_ms": late_ms[min(len(late_ms) - 1, int(len(late_ms) * 0.95))],
+            "max_late_ms": late_ms[-1],
+            "jitter_ms": statistics.pstdev(late_ms),
+        }
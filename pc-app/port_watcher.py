@@ -0,0 +1,74 @@
+# hand-stand/pc-app/port_watcher.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Serial port discovery off the Tk thread, with hot-plug notifications.
+#
+# comports() walks sysfs or the Windows registry and can take from tens of
+# milliseconds to seconds (Bluetooth serial ports are the slow ones), so the
+# GUI never calls it itself. PortWatcher lists the ports on its own thread
+# every SCAN_INTERVAL and calls on_change(ports) whenever the list changes.
+# pyserial is imported on that thread too, not before the window is up.
+#
+# ports is a sorted list of (device, identity). identity is USB vid:pid plus
+# the adapter serial number, None when the adapter has no serial number: a
+# controller plugged into another USB socket comes back under a new device
+# name (COM7 instead of COM5, ttyUSB1 instead of ttyUSB0) with the same
+# identity.
+
+import threading
+
+SCAN_INTERVAL = 1.0  # s
+
+
+def port_identity(info):
+    if info.vid is None or not info.serial_number:
+        return None
+    return f"{info.vid:04X}:{info.pid:04X}:{info.serial_number}"
+
+
+def list_ports():
+    import serial.tools.list_ports
+    return sorted((info.device, port_identity(info)) for info in serial.tools.list_ports.comports())
+
+
+class PortWatcher:
+    def __init__(self, on_change, interval=SCAN_INTERVAL, lister=list_ports):
+        self.on_change = on_change  # on_change(ports), called from the watcher thread
+        self.interval = interval
+        self.lister = lister
+        self.ports = None
+        self.errors = 0
+        self.stopping = False
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="port-watcher", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping = True
+        self.wake.set()
+        if threading.current_thread() is not self.thread:
+            self.thread.join(timeout=2)
+
+    # scan now instead of at the next interval
+    def rescan(self):
+        self.wake.set()
+
+    def run(self):
+        while not self.stopping:
+            try:
+                ports = self.lister()
+            except Exception as e:
+                if not self.errors:
+                    print("error list serial ports ->", e)
+                self.errors += 1
+            else:
+                if ports != self.ports:
+                    self.ports = ports
+                    self.on_change(ports)
+            self.wake.wait(self.interval)
+            self.wake.clear()
@@ -0,0 +1,254 @@
+# hand-stand/pc-app/recorder.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Teach mode: record a pose stream and reduce it to script keyframes.
+#
+# Recorder samples a source (the Script tab sliders, or the device
+# positions read over Modbus) at a fixed rate on the monotonic clock and
+# appends every sample to a log file. Only a small chunk is buffered in
+# memory, so recordings can be as long as the disk allows.
+#
+# Log format (*.hsr), little-endian, append-only:
+#   header  16 bytes: magic b"HSRL", uint16 version, uint16 servo count, 8 reserved
+#   samples float64 seconds since start + servo count uint16 logical values
+# read_log() memory-maps the file.
+#
+# decimate() is Ramer-Douglas-Peucker on all six axes at once: a sample is
+# kept when some axis is more than tolerance logical units away from the
+# straight line between the kept neighbours (linear in time, the error of
+# "linear" motion playback). Every pass splits all open segments together
+# with numpy; segments already within tolerance drop out of later passes.
+#
+# Usage (from pc-app directory), re-decimate a log with another tolerance:
+#   python -m recorder recording.hsr --tolerance 3 -o script.json
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from registers import (LOGICAL_MAX, LOGICAL_MIN, NUM_SERVOS, VALUES_ACTUAL_ADDR, VALUES_MAX_ADDR,
+                       VALUES_MIN_ADDR)
+from script_model import DELAY_DTYPE, VALUE_DTYPE, ScriptData, save_script
+
+RECORD_RATE = 50.0          # Hz
+DEFAULT_TOLERANCE = 5       # logical units
+CHUNK = 64                  # samples buffered before a write
+FLUSH_INTERVAL = 1.0        # s, a crash loses at most this much of the log
+
+LOG_MAGIC = b"HSRL"
+LOG_VERSION = 1
+LOG_HEADER = struct.Struct("<4sHH8x")
+LOG_SUFFIX = ".hsr"
+SAMPLE_DTYPE = np.dtype([("time", "<f8"), ("values", VALUE_DTYPE, (NUM_SERVOS,))])
+
+
+class RecordLog:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, NUM_SERVOS))
+        self.chunk = np.zeros(CHUNK, dtype=SAMPLE_DTYPE)
+        self.pending = 0
+        self.count = 0
+        self.flushed = time.monotonic()
+
+    def append(self, t, values):
+        sample = self.chunk[self.pending]
+        sample["time"] = t
+        sample["values"] = values
+        self.pending += 1
+        self.count += 1
+        if self.pending == CHUNK or time.monotonic() - self.flushed > FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.chunk[:self.pending].tobytes())
+        self.file.flush()
+        self.pending = 0
+        self.flushed = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def read_log(path):
+    with open(path, "rb") as f:
+        header = f.read(LOG_HEADER.size)
+    if len(header) < LOG_HEADER.size:
+        raise ValueError(f"{path}: truncated header")
+    magic, version, servos = LOG_HEADER.unpack(header)
+    if magic != LOG_MAGIC:
+        raise ValueError(f"{path}: not a hand-stand recording")
+    if version != LOG_VERSION or servos != NUM_SERVOS:
+        raise ValueError(f"{path}: unsupported recording version {version} with {servos} servos")
+    # a sample cut short by a crash is ignored
+    count = (os.path.getsize(path) - LOG_HEADER.size) // SAMPLE_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=SAMPLE_DTYPE)
+    return np.memmap(path, dtype=SAMPLE_DTYPE, mode="r", offset=LOG_HEADER.size, shape=(count,))
+
+
+def default_log_path():
+    return os.path.join(tempfile.gettempdir(), time.strftime("hand-stand-%Y%m%d-%H%M%S") + LOG_SUFFIX)
+
+
+# map() of the sketch, actual pulse widths back to logical values
+def actual_to_logical(actual, mins, maxs):
+    actual, mins, maxs = (np.asarray(x, dtype=np.int64) for x in (actual, mins, maxs))
+    span = np.where(maxs != mins, maxs - mins, 1)
+    logical = LOGICAL_MIN + (actual - mins) * (LOGICAL_MAX - LOGICAL_MIN) // span
+    return np.clip(logical, LOGICAL_MIN, LOGICAL_MAX)
+
+
+# device positions: values_actual polled through the session, min/max read once
+class DeviceSource:
+    def __init__(self, session):
+        self.session = session
+        self.limits = None
+
+    def __call__(self):
+        timeout = self.session.timeout * 3
+        if self.limits is None:
+            self.limits = (self.session.read_registers(VALUES_MIN_ADDR, NUM_SERVOS).result(timeout),
+                           self.session.read_registers(VALUES_MAX_ADDR, NUM_SERVOS).result(timeout))
+        actual = self.session.read_registers(VALUES_ACTUAL_ADDR, NUM_SERVOS).result(timeout)
+        return actual_to_logical(actual, *self.limits)
+
+
+class Recorder:
+    def __init__(self, source, path=None, rate=RECORD_RATE):
+        self.source = source    # source() -> NUM_SERVOS logical values, called from the recorder thread
+        self.path = path or default_log_path()
+        self.period = 1.0 / rate
+        self.errors = 0
+        self.missed = 0         # sample slots skipped because the source was too slow
+
+        self.log = RecordLog(self.path)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="recorder", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    # stop recording and return the log path
+    def stop(self):
+        self.stop_event.set()
+        if threading.current_thread() is not self.thread:
+            self.thread.join()
+        return self.path
+
+    @property
+    def samples(self):
+        return self.log.count
+
+    def run(self):
+        start = deadline = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    values = self.source()
+                except Exception as e:
+                    if not self.errors:
+                        print("error record sample ->", e)
+                    self.errors += 1
+                else:
+                    self.log.append(time.monotonic() - start, values)
+                deadline += self.period
+                late = time.monotonic() - deadline
+                if late > 0:
+                    # a slow source (e.g. polling at 9600 baud) records at the rate it manages
+                    skipped = int(late / self.period) + 1
+                    self.missed += skipped
+                    deadline += skipped * self.period
+                self.stop_event.wait(max(0.0, deadline - time.monotonic()))
+        finally:
+            self.log.close()
+
+
+# ---- keyframe decimation ----
+
+# indices of the samples to keep, the first and the last are always kept
+def decimate(times, values, tolerance=DEFAULT_TOLERANCE):
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    n = len(times)
+    if n <= 2:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    active = np.arange(n)  # samples of the segments that may still need a split
+    while len(active):
+        kept = np.flatnonzero(keep)
+        # the segment every active sample falls in, between kept samples a and b
+        segment = np.minimum(np.searchsorted(kept, active, side="right") - 1, len(kept) - 2)
+        a, b = kept[segment], kept[segment + 1]
+        dt = times[b] - times[a]
+        frac = np.divide(times[active] - times[a], dt, out=np.zeros(len(active)), where=dt > 0)
+        line = values[a] + (values[b] - values[a]) * frac[:, None]
+        error = np.abs(values[active] - line).max(axis=1)
+        error[keep[active]] = 0.0
+        # active samples are sorted, so every segment is one run of them
+        starts = np.flatnonzero(np.diff(segment, prepend=-1))
+        group = np.cumsum(np.diff(segment, prepend=-1) != 0) - 1
+        worst = np.maximum.reduceat(error, starts)
+        split = (error > tolerance) & (error == worst[group])
+        if not split.any():
+            break
+        # one split per segment, the first sample at its maximum error
+        candidates = np.flatnonzero(split)
+        groups, first = np.unique(group[candidates], return_index=True)
+        keep[active[candidates[first]]] = True
+        # segments within tolerance are final, only the split ones are looked at again
+        still_open = np.zeros(len(starts), dtype=bool)
+        still_open[groups] = True
+        active = active[still_open[group]]
+    return np.flatnonzero(keep)
+
+
+# script rows of the kept samples, each row's delay runs until the next keyframe
+def keyframes(times, values, tolerance=DEFAULT_TOLERANCE):
+    if not len(times):
+        return ScriptData()
+    kept = decimate(times, values, tolerance)
+    ms = np.rint(np.asarray(times)[kept] * 1000.0).astype(np.int64)  # rounded once, so delays do not drift
+    delays = np.append(np.diff(ms), 0)
+    return ScriptData(np.ascontiguousarray(np.asarray(values)[kept], dtype=VALUE_DTYPE),
+                      delays.astype(DELAY_DTYPE))
+
+
+def load_recording(path, tolerance=DEFAULT_TOLERANCE):
+    samples = read_log(path)
+    return keyframes(samples["time"], samples["values"], tolerance)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="recorder", description="Reduce a teach mode recording to a script")
+    parser.add_argument("log", help="recording written by the Script tab (.hsr)")
+    parser.add_argument("-o", "--output", required=True, help="script file to write (.json or binary .hss)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="largest deviation from the recording, logical units")
+    args = parser.parse_args(argv)
+    try:
+        samples = read_log(args.log)
+    except (OSError, ValueError) as e:
+        print("error", e)
+        return 1
+    script = keyframes(samples["time"], samples["values"], args.tolerance)
+    save_script(args.output, script)
+    print(f"{len(samples)} samples -> {len(script)} keyframes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+# hand-stand/pc-app/register_cache.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Shadow copy of the controller registers, used to drop redundant writes.
+#
+# RegisterCache holds the value every register will have once the queued
+# writes are done. A write is diffed against it and only the smallest
+# contiguous span holding all changed registers is sent (FC6 for a single
+# register); a write that changes nothing is not sent at all. Min/max
+# writes go to EEPROM on the controller, skipping repeats saves its wear.
+#
+# Reads keep the shadow current. Priority lanes let the session run requests
+# out of submission order, so a read result is only applied to registers
+# with no write submitted after the read and none still in flight - otherwise
+# it may be older than the shadow. A failed, dropped or expired write
+# forgets its registers, and so does a write that lands after a newer one
+# to the same register: the device state is unknown.
+#
+# values_actual (10..15) is published by the controller itself, writes to it
+# always go out and invalidate the servo's logical target, which the
+# firmware derives from the new actual value.
+#
+# CachedSession wraps a ModbusSession / AsyncModbusSession with the same
+# API. It clears the shadow on every (re)connect - the port open resets the
+# controller - and seeds it with a bulk read of 10..35 and 100..111.
+
+import threading
+from concurrent.futures import Future
+
+from instrumentation import tracer
+from registers import (ILLEGAL_ADDRESS, NUM_SERVOS, VALUES_ACTUAL_ADDR, VALUES_LOGICAL_ADDR, VALUES_MAX_ADDR,
+                       VALUES_MIN_ADDR, VALUES_SPEED_ADDR)
+
+VOLATILE = range(VALUES_ACTUAL_ADDR, VALUES_ACTUAL_ADDR + NUM_SERVOS)
+
+# (address, count, fallback blocks for firmware that rejects the span)
+SEED_BLOCKS = [
+    (VALUES_ACTUAL_ADDR, VALUES_MAX_ADDR + NUM_SERVOS - VALUES_ACTUAL_ADDR,
+     [(VALUES_ACTUAL_ADDR, NUM_SERVOS), (VALUES_MIN_ADDR, NUM_SERVOS), (VALUES_MAX_ADDR, NUM_SERVOS)]),
+    (VALUES_LOGICAL_ADDR, VALUES_SPEED_ADDR + NUM_SERVOS - VALUES_LOGICAL_ADDR,
+     [(VALUES_LOGICAL_ADDR, NUM_SERVOS)]),
+]
+
+
+class RegisterCache:
+    def __init__(self, volatile=VOLATILE):
+        self.volatile = set(volatile)
+        self.values = {}    # address -> value once the queued writes are done
+        self.written = {}   # address -> sequence number of the last write submitted to it
+        self.done = {}      # address -> sequence number of the newest write completed on it
+        self.pending = {}   # address -> writes submitted and not completed yet
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.hits = 0       # registers not sent because the device already holds the value
+        self.misses = 0     # registers sent
+        self.suppressed = 0  # writes dropped completely
+        self.invalidations = 0
+
+    # the part of a write that has to be sent: (address, values, seq), None if nothing changes
+    def begin_write(self, address, values):
+        values = list(values)
+        with self.lock:
+            changed = [i for i, value in enumerate(values)
+                       if address + i in self.volatile or self.values.get(address + i) != value]
+            if not changed:
+                self.hits += len(values)
+                self.suppressed += 1
+                tracer.count("cache_hits", len(values))
+                return None
+            first, last = changed[0], changed[-1]
+            span = values[first:last + 1]
+            self.seq += 1
+            for i, value in enumerate(span, address + first):
+                self.values[i] = value
+                self.written[i] = self.seq
+                self.pending[i] = self.pending.get(i, 0) + 1
+                if i in self.volatile:
+                    self.values.pop(VALUES_LOGICAL_ADDR + i - VALUES_ACTUAL_ADDR, None)
+            self.hits += len(values) - len(span)
+            self.misses += len(span)
+        tracer.count("cache_hits", len(values) - len(span))
+        tracer.count("cache_misses", len(span))
+        return address + first, span, self.seq
+
+    # registers the device changes by itself (a hold moves the logical targets): unknown until
+    # read again, reads are not applied to them until end_write(seq, ...) of the returned write
+    def begin_invalidate(self, address, count):
+        with self.lock:
+            self.seq += 1
+            for i in range(address, address + count):
+                self.values.pop(i, None)
+                self.written[i] = self.seq
+                self.pending[i] = self.pending.get(i, 0) + 1
+            return address, [None] * count, self.seq
+
+    def end_write(self, seq, address, count, ok):
+        with self.lock:
+            for i in range(address, address + count):
+                self.pending[i] -= 1
+                if not self.pending[i]:
+                    del self.pending[i]
+                if (not ok and self.written.get(i) == seq) or self.done.get(i, 0) > seq:
+                    self.values.pop(i, None)
+                self.done[i] = max(self.done.get(i, 0), seq)
+
+    # sequence number to pass to end_read, taken when the read is submitted
+    def begin_read(self):
+        with self.lock:
+            return self.seq
+
+    def end_read(self, seq, address, values):
+        with self.lock:
+            for i, value in enumerate(values, address):
+                if self.written.get(i, 0) <= seq and i not in self.pending:
+                    self.values[i] = value
+
+    def get(self, address, count=1):
+        with self.lock:
+            return [self.values.get(i) for i in range(address, address + count)]
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self.lock:
+            sent = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "suppressed_writes": self.suppressed,
+                    "invalidations": self.invalidations, "cached": len(self.values),
+                    "hit_rate": self.hits / sent if sent else 0.0}
+
+
+class CachedSession:
+    def __init__(self, session, cache=None):
+        self.session = session
+        self.cache = cache or RegisterCache()
+        # take over the status callback before the session starts, so a reconnect clears the shadow first
+        self.on_status = session.on_status
+        session.on_status = self.on_link_status
+
+    # everything else (connected, timeout, set_baudrate, close, ...) is the session's
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def start(self):
+        self.session.start()
+        return self
+
+    # kwargs (lane, deadline) go to the session
+    def read_registers(self, address, count, **kwargs):
+        seq = self.cache.begin_read()
+        future = self.session.read_registers(address, count, **kwargs)
+        future.add_done_callback(lambda f: f.exception() is None and self.cache.end_read(seq, address, f.result()))
+        return future
+
+    def write_register(self, address, value, **kwargs):
+        write = self.cache.begin_write(address, [value])
+        if write is None:
+            return cached_future()
+        return self.track(self.session.write_register(address, value, **kwargs), write)
+
+    def write_registers(self, address, values, **kwargs):
+        write = self.cache.begin_write(address, values)
+        if write is None:
+            return cached_future()
+        address, values, _ = write
+        if len(values) == 1:
+            return self.track(self.session.write_register(address, values[0], **kwargs), write)
+        return self.track(self.session.write_registers(address, values, **kwargs), write)
+
+    # the hold writes values_actual, the firmware moves the logical targets after it
+    def hold(self):
+        return self.track(self.session.hold(), self.cache.begin_invalidate(VALUES_LOGICAL_ADDR, NUM_SERVOS))
+
+    # FC23: the write part is diffed like write_registers, when nothing changes nothing is sent
+    # and the Future gives None instead of the registers read
+    def readwrite_registers(self, address, values, read_address, read_count, **kwargs):
+        write = self.cache.begin_write(address, values)
+        if write is None:
+            return cached_future()
+        seq = self.cache.begin_read()  # taken after the write: the read happens after it on the device
+        future = self.track(self.session.readwrite_registers(write[0], write[1], read_address, read_count, **kwargs),
+                            write)
+        future.add_done_callback(
+            lambda f: f.exception() is None and self.cache.end_read(seq, read_address, f.result()))
+        return future
+
+    def track(self, future, write):
+        address, values, seq = write
+        future.add_done_callback(lambda f: self.cache.end_write(seq, address, len(values), f.exception() is None))
+        return future
+
+    # I/O side: a new connection means a freshly reset controller
+    def on_link_status(self, connected):
+        self.cache.clear()
+        if connected:
+            self.seed()
+        if self.on_status:
+            self.on_status(connected)
+
+    def seed(self):
+        for address, count, fallback in SEED_BLOCKS:
+            future = self.read_registers(address, count)
+            future.add_done_callback(lambda f, fallback=fallback: self.seed_fallback(f, fallback))
+
+    # firmware without the gap fillers or the speed block rejects the long read, read block by block
+    def seed_fallback(self, future, fallback):
+        if getattr(future.exception(), "exception_code", None) == ILLEGAL_ADDRESS:
+            for address, count in fallback:
+                self.read_registers(address, count)
+
+
+# a write the device does not need, already done; no transaction id
+def cached_future():
+    future = Future()
+    future.txn_id = None
+    future.set_result(None)
+    return future
@@ -0,0 +1,41 @@
+# hand-stand/pc-app/registers.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Controller register map and value ranges, shared by the GUI and headless tools.
+# Must match servo_controller*.ino.
+
+LOGICAL_MIN = 0
+LOGICAL_MAX = 999
+ACTUAL_MIN = 500
+ACTUAL_MAX = 2500
+
+MODBUS_UNIT_ID = 1
+# Modbus exception reply codes: function code the device does not serve, register outside its map
+ILLEGAL_FUNCTION = 1
+ILLEGAL_ADDRESS = 2
+
+VALUES_LOGICAL_ADDR = 100
+VALUES_ACTUAL_ADDR = 10
+VALUES_MIN_ADDR = 20
+VALUES_MAX_ADDR = 30
+# ramp speed per servo in logical units per controller tick, right after the
+# logical block so targets and speeds go out in one write of 100..111.
+# 0 means no ramp: the servo jumps to its target on the next tick
+VALUES_SPEED_ADDR = 106
+SPEED_MIN = 0
+SPEED_MAX = 999
+DEFAULT_SPEED = 10
+SPEED_TICK = 0.1  # s, Timer1 period of servo_controller_speed_ctrl.ino
+
+SERVO_NAMES = ["yaw", "horizontal", "vertical", "pitch", "twist", "grab"]
+NUM_SERVOS = len(SERVO_NAMES)
+
+# link baud rate: the register holds an index into BAUD_RATES. The controller
+# always boots at BOOT_BAUDRATE and falls back to it unless a new rate is
+# confirmed (same code written again at the new rate) within BAUD_PROBATION s
+BAUD_ADDR = 200
+BAUD_RATES = (9600, 19200, 38400, 57600, 115200, 250000, 500000)
+BOOT_BAUDRATE = 9600
+BAUD_PROBATION = 2.0
@@ -0,0 +1,246 @@
+# hand-stand/pc-app/run_script.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Headless script runner - plays a saved JSON script without tkinter.
+#
+# Usage (from pc-app directory):
+#   python -m run_script script.json --port COM5 [--unit 1] [--loops 3] [--speed 2.0] [--dry-run]
+#                        [--profile minjerk --rate 20]
+#   python -m run_script script.json --simulate     # no hardware, see controller_sim.py
+#   python -m run_script fleet.json --arm left=COM5 --arm right=COM6 [--arms arms.json]   # see fleet.py
+#
+# Uses the same session and playback engine as the GUI. Only the modules
+# needed by the chosen mode are imported, tkinter never is.
+
+import argparse
+import sys
+
+from command_lanes import LANE_PLAYBACK
+from playback import PlaybackEngine
+from registers import BAUD_RATES, BOOT_BAUDRATE, MODBUS_UNIT_ID, VALUES_LOGICAL_ADDR
+from script_model import load_script
+
+
+def first_serial_port():
+    import serial.tools.list_ports
+    ports = serial.tools.list_ports.comports()
+    return ports[0].device if ports else None
+
+
+def build_frames(script_data, loops, speed, profile=None, rate=None, max_velocity=None, max_acceleration=None):
+    if profile:
+        # speed scales the keyframe timing, the stream keeps its fixed rate
+        import numpy as np
+        from trajectory import compile_keyframes, keyframes
+        values, delays = keyframes(script_data)
+        return compile_keyframes(np.tile(values, (loops, 1)), np.tile(delays / speed, loops), rate=rate,
+                                 profile=profile, max_velocity=max_velocity,
+                                 max_acceleration=max_acceleration).frames()
+    frames = script_data.frames() * loops
+    return [(values, delay / speed) for values, delay in frames]
+
+
+def open_session(args, simulator=None):
+    if args.backend == "asyncio":
+        from async_session import AsyncModbusSession as Session
+        kwargs = {}
+    else:
+        from modbus_session import ModbusSession as Session
+        kwargs = {"client_factory": simulator.client_factory} if simulator is not None else {}
+    return Session(args.port, baudrate=args.baud, unit=args.unit, **kwargs).start()
+
+
+# the asyncio backend needs a real serial device, it gets the simulator on a pty
+def start_simulator(args):
+    from controller_sim import SIM_PORT, ControllerSimulator
+    simulator = ControllerSimulator(unit=args.unit).start()  # boots at 9600 like the board, --baud is negotiated
+    args.port = simulator.open_pty() if args.backend == "asyncio" else SIM_PORT
+    return simulator
+
+
+# one simulator per unit id, the arms of one port share a simulated bus
+def start_fleet_simulator(arms):
+    from controller_sim import ControllerSimulator, SimBus
+    from modbus_session import ModbusSession
+    units = {}
+    for config in arms.values():
+        units.setdefault(config["port"], []).append(config.get("unit", MODBUS_UNIT_ID))
+    buses = {port: SimBus(ControllerSimulator(unit=unit) for unit in port_units).start()
+             for port, port_units in units.items()}
+
+    def session_factory(port, **kwargs):
+        return ModbusSession(port, client_factory=buses[port].client_factory, **kwargs)
+    return buses, session_factory
+
+
+def run_fleet(args):
+    from fleet import Fleet, fleet_frames, load_arms, load_fleet_script, parse_arm
+    try:
+        arms = load_arms(args.arms) if args.arms else {}
+        arms.update(parse_arm(spec) for spec in args.arm)
+        frames = fleet_frames(load_fleet_script(args.script), list(arms), args.script)
+    except (OSError, ValueError) as e:
+        print("error", e)
+        return 1
+    for config in arms.values():
+        config.setdefault("baud", args.baud)
+    frames = [(values, delay / args.speed) for values, delay in frames] * args.loops
+    if not frames:
+        print("script is empty")
+        return 0
+    if args.dry_run:
+        engine = PlaybackEngine(frames, lambda values: print("send", values)).start()
+        engine.join()
+        return 0
+
+    buses = {}
+    kwargs = {}
+    if args.simulate:
+        buses, kwargs["session_factory"] = start_fleet_simulator(arms)
+    errors = []
+    try:
+        fleet = Fleet(arms, on_status=lambda port, ok: print(f"{port} {'connected' if ok else 'disconnected'}"),
+                      **kwargs).start()
+    except ValueError as e:
+        print("error", e)
+        for bus in buses.values():
+            bus.stop()
+        return 1
+    for name, arm in fleet.arms.items():
+        print(f"arm {name}: {arm.session.port}, unit {arm.unit}")
+
+    def send(values):
+        for future in fleet.send(values):
+            future.add_done_callback(lambda f: f.exception() and errors.append(f.exception()))
+
+    def on_progress(index):
+        if args.verbose:
+            print(f"row {index + 1}/{len(frames)}")
+
+    engine = PlaybackEngine(frames, send, on_progress=on_progress).start()
+    try:
+        while engine.thread.is_alive():
+            engine.join(0.2)
+    except KeyboardInterrupt:
+        engine.stop()
+        engine.join()
+        # as for one arm: rows still queued would keep the arms moving, they stop where they are instead
+        print("stopped, dropped", fleet.drop(), "queued rows")
+        for name, future in fleet.hold().items():
+            try:
+                print(f"arm {name} hold at", ", ".join(map(str, future.result(fleet.arms[name].session.timeout * 3))))
+            except Exception as e:
+                print(f"error hold {name} ->", e)
+    finally:
+        fleet.close()
+        for bus in buses.values():
+            bus.stop()
+
+    print("playback timing", engine.timing_report())
+    print("arm skew", fleet.skew_report())
+    if errors:
+        print(f"{len(errors)} writes failed, last error -> {errors[-1]}")
+        return 1
+    return 0
+
+
+def run(args):
+    if args.arm or args.arms:
+        return run_fleet(args)
+    try:
+        script_data = load_script(args.script)
+    except (OSError, ValueError) as e:
+        print("error", e)
+        return 1
+    frames = build_frames(script_data, args.loops, args.speed, args.profile, args.rate,
+                          args.max_velocity, args.max_acceleration)
+    if not frames:
+        print("script is empty")
+        return 0
+
+    errors = []
+    session = None
+    simulator = None
+    if args.dry_run:
+        def send(values):
+            print("send values_logical [0..5]", ", ".join(map(str, values)))
+    else:
+        if args.simulate:
+            simulator = start_simulator(args)
+        elif args.port is None:
+            args.port = first_serial_port()
+        if args.port is None:
+            print("No serial ports found.")
+            return 1
+        print(f"Using serial port: {args.port}, unit {args.unit}")
+        session = open_session(args, simulator)
+
+        def send(values):
+            future = session.write_registers(VALUES_LOGICAL_ADDR, values, lane=LANE_PLAYBACK)
+            future.add_done_callback(lambda f: f.exception() and errors.append(f.exception()))
+
+    def on_progress(index):
+        if args.verbose:
+            print(f"row {index + 1}/{len(frames)}")
+
+    engine = PlaybackEngine(frames, send, on_progress=on_progress).start()
+    try:
+        while engine.thread.is_alive():
+            engine.join(0.2)
+    except KeyboardInterrupt:
+        engine.stop()
+        engine.join()
+        if session is not None:
+            # rows still queued would keep the arm moving, it stops where it is instead
+            print("stopped, dropped", session.drop(), "queued rows")
+            try:
+                print("hold at", ", ".join(map(str, session.hold().result(session.timeout * 3))))
+            except Exception as e:
+                print("error hold ->", e)
+    finally:
+        if session is not None:
+            session.close()
+        if simulator is not None:
+            simulator.stop()
+            print("simulator stats", simulator.stats)
+
+    print("playback timing", engine.timing_report())
+    if errors:
+        print(f"{len(errors)} writes failed, last error -> {errors[-1]}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="run_script", description="Play a hand-stand JSON script headless")
+    parser.add_argument("script", help="script file written by the Script tab (.json or binary .hss)")
+    parser.add_argument("--port", help="serial port, default: first port found")
+    parser.add_argument("--unit", type=int, default=MODBUS_UNIT_ID, help="Modbus unit id")
+    parser.add_argument("--baud", type=int, default=BOOT_BAUDRATE, choices=BAUD_RATES,
+                        help="link baud rate, negotiated with the controller after connecting at 9600")
+    parser.add_argument("--backend", choices=["thread", "asyncio"], default="thread")
+    parser.add_argument("--loops", type=int, default=1, help="play the script this many times")
+    parser.add_argument("--speed", type=float, default=1.0, help="speed multiplier, 2.0 halves every delay")
+    parser.add_argument("--profile", choices=["linear", "cubic", "minjerk"],
+                        help="stream an interpolated trajectory instead of jumping between rows")
+    parser.add_argument("--rate", type=float, default=20.0, help="setpoint rate for --profile, Hz")
+    parser.add_argument("--max-velocity", type=float, help="--profile limit, logical units per second")
+    parser.add_argument("--max-acceleration", type=float, help="--profile limit, logical units per second^2")
+    parser.add_argument("--dry-run", action="store_true", help="print frames instead of sending them")
+    parser.add_argument("--simulate", action="store_true", help="play against the built-in controller simulator")
+    parser.add_argument("--arm", action="append", default=[], metavar="NAME=PORT[:UNIT]",
+                        help="add an arm, repeat for several; rows address arms by name (see fleet.py)")
+    parser.add_argument("--arms", help="json file with the arms: {name: {port, unit, baud}}")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every row")
+    args = parser.parse_args(argv)
+    if args.loops < 1 or args.speed <= 0:
+        parser.error("--loops must be >= 1 and --speed > 0")
+    if (args.arm or args.arms) and (args.backend == "asyncio" or args.profile):
+        parser.error("--arm/--arms play with the thread backend and without --profile")
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
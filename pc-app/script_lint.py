@@ -0,0 +1,209 @@
+# hand-stand/pc-app/script_lint.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Offline motion times of a script, from the ramp model of the firmware.
+#
+# servo_controller_speed_ctrl.ino moves every servo towards its logical
+# target by delta_logical (the row speed, DEFAULT_SPEED until a row sets one,
+# 0 - no ramp) on every SPEED_TICK timer tick. A row whose delay is shorter
+# than that move is superseded by the next row half way, on hardware only.
+#
+# A row needs ceil(distance / speed) ticks for its slowest servo and gets
+# the ticks that fall between it and the next row. Ticks are counted from
+# the start of the script; the board timer runs free of the writes, so on
+# hardware a row may get one tick more or less. Positions carry over from
+# row to row - after a late row the next one starts where the arm was cut
+# off. That recurrence is solved for all rows and servos at once with NumPy
+# (see positions()): tens of milliseconds for 100k rows, a few hundred when
+# most rows are late. The arm starts at DEFAULT_LOGICAL, where the
+# controller boots.
+#
+# retime() raises the delay of every row to a whole number of ticks for its
+# move, enough at any timer phase; it never shortens a row.
+#
+# Usage (from pc-app directory):
+#   python -m script_lint script.json [--speed 10] [--margin 100] [--retime fixed.json]
+# exits with 1 when some row is late and the script was not retimed.
+
+import argparse
+import sys
+
+import numpy as np
+
+from registers import DEFAULT_SPEED, LOGICAL_MAX, NUM_SERVOS, SERVO_NAMES, SPEED_TICK
+from script_model import DEFAULT_LOGICAL, DELAY_MAX, NO_SPEED, ScriptData, load_script, save_script
+
+TICK_MS = round(SPEED_TICK * 1000)
+PASS_SHRINK = 0.5  # open rows left after a vectorized pass, as a part of those before it, to go on with passes
+LIST_LIMIT = 20
+
+
+class MotionReport:
+    def __init__(self, starts, delays, ticks, reach, slowest):
+        self.starts = starts    # (N,) ms, time each row is sent
+        self.delays = delays    # (N,) ms
+        self.ticks = ticks      # (N,) ticks the slowest servo of each row needs
+        # (N,) ms from sending a row until all servos are there: the first tick comes before a full period
+        self.motion = np.where(ticks > 0, ticks * TICK_MS - starts % TICK_MS, 0.0)
+        self.late = ticks > reach  # (N,) rows superseded before arrival, the last row: playback ends first
+        self.slowest = slowest  # (N,) servo index that takes longest
+        # (N,) ms the arm arrives at each row, NaN for late rows
+        self.arrivals = np.where(self.late, np.nan, starts + self.motion)
+
+    def __len__(self):
+        return len(self.starts)
+
+    # ms playback takes
+    @property
+    def duration(self):
+        return float(self.starts[-1] + self.delays[-1]) if len(self) else 0.0
+
+    # ms until the arm stands still at the last row
+    @property
+    def finish(self):
+        return max(self.duration, float(self.starts[-1] + self.motion[-1])) if len(self) else 0.0
+
+    def late_rows(self):
+        return np.flatnonzero(self.late)
+
+    def summary(self):
+        late = self.late_rows()
+        overrun = self.motion[late] - self.delays[late]
+        return {"rows": len(self), "late_rows": len(late), "duration_ms": self.duration, "finish_ms": self.finish,
+                "max_overrun_ms": float(overrun.max()) if len(late) else 0.0}
+
+    def describe(self, row):
+        return (f"row {row + 1}: delay {int(self.delays[row])} ms, motion {self.motion[row]:.0f} ms"
+                f" ({SERVO_NAMES[self.slowest[row]]})")
+
+
+# speed of every servo on every row: a row without speed keeps the one before it
+def effective_speeds(script_data, speed=DEFAULT_SPEED):
+    speeds = np.broadcast_to(np.asarray(speed, dtype=np.int64), (len(script_data), NUM_SERVOS))
+    if script_data.speeds is not None:
+        has_speed = script_data.speeds[:, 0] != NO_SPEED
+        source = np.maximum.accumulate(np.where(has_speed, np.arange(len(script_data)), -1))
+        speeds = np.where((source >= 0)[:, None], script_data.speeds[np.maximum(source, 0)], speeds)
+    return np.where(speeds == 0, LOGICAL_MAX, speeds)  # 0 - no ramp, the servo jumps in one tick
+
+
+def estimate(script_data, speed=DEFAULT_SPEED, start=DEFAULT_LOGICAL):
+    if not isinstance(script_data, ScriptData):
+        script_data = ScriptData.from_rows(script_data)
+    values = script_data.values.astype(np.int64)
+    delays = script_data.delays.astype(np.int64)
+    speeds = effective_speeds(script_data, speed)
+    ends = np.cumsum(delays)
+    starts = ends - delays
+    reach = ends // TICK_MS - starts // TICK_MS  # ticks each row gets before the next one
+    p = positions(values, speeds * reach[:, None], np.broadcast_to(start, (NUM_SERVOS,)))
+    ticks = -(-np.abs(values - p) // speeds)  # ceil
+    return MotionReport(starts.astype(np.float64), delays, ticks.max(axis=1, initial=0), reach,
+                        ticks.argmax(axis=1))
+
+
+# (N, servos) position when each row is sent. Row i moves p[i] towards values[i] by at most
+# steps[i]: p[i + 1] = p[i] + clip(values[i] - p[i], -steps[i], steps[i]).
+# Every row that arrives makes p[i + 1] = values[i], so that is the first guess for all rows.
+# A pass recomputes the rows whose start changed in the pass before, until nothing changes -
+# a pass per row of the longest run of late rows. Runs still open while the passes stop
+# paying off (a stream of short rows) are walked one row at a time.
+def positions(values, steps, start):
+    n = len(values)
+    p = np.empty_like(values)
+    if not n:
+        return p
+    p[0] = start
+    p[1:] = values[:-1]
+    rows = np.arange(n - 1)
+    while len(rows):
+        moved = p[rows] + np.clip(values[rows] - p[rows], -steps[rows], steps[rows])
+        changed = np.any(moved != p[rows + 1], axis=1)
+        active = rows[changed] + 1
+        p[active] = moved[changed]
+        if len(active) > len(rows) * PASS_SHRINK:
+            finish_positions(p, values, steps, active[active < n - 1])
+            break
+        rows = active[active < n - 1]
+    return p
+
+
+# walk the open runs servo by servo, in plain Python: a late row starts where the one before it
+# was cut off, the run ends at the first row whose start does not change
+def finish_positions(p, values, steps, rows):
+    heads = rows.tolist()
+    last = len(p) - 1
+    for axis in range(NUM_SERVOS):
+        p_axis, v_axis, s_axis = p[:, axis].tolist(), values[:, axis].tolist(), steps[:, axis].tolist()
+        i = -1
+        for head in heads:
+            if head < i:
+                continue  # inside the run walked last
+            i = head
+            pos = p_axis[i]
+            while i < last:
+                value, step = v_axis[i], s_axis[i]
+                if pos < value - step:
+                    pos += step
+                elif pos > value + step:
+                    pos -= step
+                else:
+                    pos = value
+                i += 1
+                if pos == p_axis[i]:
+                    break
+                p_axis[i] = pos
+        p[:, axis] = p_axis
+
+
+# a copy with every row long enough for its move plus margin ms; the moves are those of the
+# retimed script, where every row arrives: (script, number of rows changed)
+def retime(script_data, margin=0, speed=DEFAULT_SPEED, start=DEFAULT_LOGICAL):
+    if not isinstance(script_data, ScriptData):
+        script_data = ScriptData.from_rows(script_data)
+    values = script_data.values.astype(np.int64)
+    previous = np.vstack((np.broadcast_to(start, (1, NUM_SERVOS)), values[:-1]))
+    ticks = (-(-np.abs(values - previous) // effective_speeds(script_data, speed))).max(axis=1, initial=0)
+    delays = script_data.delays.astype(np.int64)
+    needed = np.where(ticks > 0, ticks * TICK_MS + margin, 0)
+    retimed = np.clip(np.maximum(delays, needed), 0, DELAY_MAX)
+    speeds = None if script_data.speeds is None else np.array(script_data.speeds)
+    return (ScriptData(np.array(script_data.values), retimed.astype(script_data.delays.dtype), speeds),
+            int(np.count_nonzero(retimed != delays)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check script delays against the firmware ramp speed")
+    parser.add_argument("script", help="script file (.json or .hss)")
+    parser.add_argument("--speed", type=int, default=DEFAULT_SPEED,
+                        help="ramp speed before the first row that sets one (logical units per tick)")
+    parser.add_argument("--margin", type=int, default=0, help="ms added to every retimed row")
+    parser.add_argument("--retime", metavar="OUTPUT", help="write a copy with late rows slowed down")
+    parser.add_argument("--all", action="store_true", help="list every late row")
+    args = parser.parse_args(argv)
+
+    try:
+        script_data = load_script(args.script)
+    except (OSError, ValueError) as e:
+        print("error", e)
+        return 1
+    report = estimate(script_data, args.speed)
+    late = report.late_rows()
+    for row in late if args.all else late[:LIST_LIMIT]:
+        print(report.describe(row))
+    if len(late) > LIST_LIMIT and not args.all:
+        print(f"... {len(late) - LIST_LIMIT} more late rows")
+    print("motion", report.summary())
+    if args.retime:
+        retimed, changed = retime(script_data, args.margin, args.speed)
+        save_script(args.retime, retimed)
+        print(f"{changed} rows retimed, {report.duration / 1000:.1f} s ->"
+              f" {estimate(retimed, args.speed).duration / 1000:.1f} s, saved to {args.retime}")
+        return 0
+    return 1 if len(late) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
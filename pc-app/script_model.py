@@ -0,0 +1,417 @@
+# hand-stand/pc-app/script_model.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Script rows and their file formats.
+#
+# A script row is {"servos": {name: logical value}, "delay": ms} with an
+# optional "speed": {name: logical units per tick} (or one number for all
+# servos) that is sent together with the targets, see VALUES_SPEED_ADDR.
+# Missing servos default to DEFAULT_LOGICAL, a missing delay to DEFAULT_DELAY,
+# a servo missing from "speed" to DEFAULT_SPEED.
+#
+# ScriptData keeps the rows in one contiguous uint16 (N x 6) array plus a
+# uint32 delay column and behaves like a list of row dicts, so editing code
+# written for a plain list keeps working. Speeds are a second (N x 6) array,
+# created on the first row that has one; NO_SPEED marks rows without.
+#
+# Binary format (*.hss), little-endian:
+#   header  16 bytes: magic b"HSSC", uint16 version, uint16 servo count, uint32 row count, 4 reserved
+#   values  row count * servo count uint16
+#   delays  row count uint32
+#   speeds  row count * servo count uint16, version 2 only (written when some row has a speed)
+# load_binary() memory-maps the file, nothing is copied until the script is edited.
+#
+# Loading validates every row once: unknown servos and values that are not
+# numbers are errors naming the row, targets are clamped to LOGICAL_MIN..MAX,
+# speeds to SPEED_MIN..MAX. Playback then only sends the ready register
+# lists of frames(). A JSON script is compiled into a cache file next to it
+# (<script>.hsc: sha256 of the JSON text, then the binary format above), the
+# next load maps the cache instead of parsing while the hash matches.
+
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+from registers import DEFAULT_SPEED, LOGICAL_MAX, LOGICAL_MIN, NUM_SERVOS, SERVO_NAMES, SPEED_MAX, SPEED_MIN
+
+DEFAULT_LOGICAL = 499
+DEFAULT_DELAY = 2000
+
+NO_SPEED = 0xFFFF
+
+BINARY_MAGIC = b"HSSC"
+BINARY_VERSION = 1
+BINARY_VERSION_SPEED = 2
+BINARY_HEADER = struct.Struct("<4sHHI4x")
+BINARY_SUFFIX = ".hss"
+COMPILED_SUFFIX = ".hsc"
+DIGEST_SIZE = 32  # sha256
+DELAY_MAX = 0xFFFFFFFF
+
+VALUE_DTYPE = np.dtype("<u2")
+DELAY_DTYPE = np.dtype("<u4")
+
+
+def default_row():
+    return {"servos": {name: DEFAULT_LOGICAL for name in SERVO_NAMES}, "delay": DEFAULT_DELAY}
+
+
+def row_values(row):
+    return [row['servos'].get(name, DEFAULT_LOGICAL) for name in SERVO_NAMES]
+
+
+# per-servo speeds of a row, None when the row has no speed
+def row_speeds(row):
+    speed = row.get('speed')
+    if speed is None:
+        return None
+    if isinstance(speed, dict):
+        return [speed.get(name, DEFAULT_SPEED) for name in SERVO_NAMES]
+    return [speed] * NUM_SERVOS
+
+
+# registers written for a row from VALUES_LOGICAL_ADDR on: targets, then speeds if the row has them
+def row_registers(row):
+    speeds = row_speeds(row)
+    return row_values(row) if speeds is None else row_values(row) + speeds
+
+
+class ScriptData:
+    def __init__(self, values=None, delays=None, speeds=None):
+        if values is None:
+            values = np.zeros((0, NUM_SERVOS), dtype=VALUE_DTYPE)
+            delays = np.zeros(0, dtype=DELAY_DTYPE)
+        self._values = values  # may be larger than len(self): spare capacity for inserts
+        self._delays = delays
+        self._speeds = speeds  # None while no row has a speed
+        self._len = len(values)
+
+    # validated rows: ValueError names the first bad row, out of range values are clamped
+    @classmethod
+    def from_rows(cls, rows, source="script"):
+        rows = list(rows)
+        values = np.full((len(rows), NUM_SERVOS), DEFAULT_LOGICAL, dtype=np.int64)
+        delays = np.full(len(rows), DEFAULT_DELAY, dtype=np.int64)
+        speeds = None
+        speed_rows = np.zeros(len(rows), dtype=bool)
+        for index, row in enumerate(rows):
+            try:
+                if not isinstance(row, dict) or not isinstance(row.get('servos'), dict):
+                    raise ValueError('expected {"servos": {name: value}, "delay": ms}')
+                for name, value in row['servos'].items():
+                    if name not in SERVO_INDEX:
+                        raise ValueError(f"unknown servo {name!r}")
+                    values[index, SERVO_INDEX[name]] = value
+                delays[index] = row.get('delay', DEFAULT_DELAY)
+                if isinstance(row.get('speed'), dict):
+                    for name in row['speed']:
+                        if name not in SERVO_INDEX:
+                            raise ValueError(f"unknown servo {name!r}")
+                row_speed = row_speeds(row)
+                if row_speed is not None:
+                    if speeds is None:
+                        speeds = np.full((len(rows), NUM_SERVOS), NO_SPEED, dtype=np.int64)
+                    speeds[index] = row_speed
+                    speed_rows[index] = True
+            except (OverflowError, TypeError, ValueError) as e:
+                raise ValueError(f"{source}: row {index + 1}: {e}") from None
+        return clamped_script(values, delays, speeds, source, speed_rows)
+
+    # ---- array views ----
+
+    @property
+    def values(self):
+        return self._values[:self._len]
+
+    @property
+    def delays(self):
+        return self._delays[:self._len]
+
+    # NO_SPEED rows have no speed, None if no row has one
+    @property
+    def speeds(self):
+        return None if self._speeds is None else self._speeds[:self._len]
+
+    # registers of one row, see row_registers()
+    def frame(self, index):
+        index = self.normalize_index(index)
+        values = self._values[index].tolist()
+        if self._speeds is None or self._speeds[index, 0] == NO_SPEED:
+            return values
+        return values + self._speeds[index].tolist()
+
+    # (registers, delay_ms) frames as consumed by PlaybackEngine, see row_registers()
+    def frames(self):
+        if self._speeds is None:
+            return list(zip(self.values.tolist(), self.delays.tolist()))
+        return [(values if speeds[0] == NO_SPEED else values + speeds, delay)
+                for values, speeds, delay in zip(self.values.tolist(), self.speeds.tolist(), self.delays.tolist())]
+
+    def to_rows(self):
+        speeds = [None] * self._len if self._speeds is None else self.speeds.tolist()
+        return [self.make_row(values, delay, speed)
+                for values, delay, speed in zip(self.values.tolist(), self.delays.tolist(), speeds)]
+
+    @staticmethod
+    def make_row(values, delay, speeds=None):
+        row = {"servos": dict(zip(SERVO_NAMES, values)), "delay": delay}
+        if speeds is not None and speeds[0] != NO_SPEED:
+            row["speed"] = dict(zip(SERVO_NAMES, speeds))
+        return row
+
+    # ---- list-like API ----
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return iter(self.to_rows())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            speeds = None if self._speeds is None else self.speeds[index].copy()
+            return ScriptData(self.values[index].copy(), self.delays[index].copy(), speeds)
+        index = self.normalize_index(index)
+        speeds = None if self._speeds is None else self._speeds[index].tolist()
+        return self.make_row(self._values[index].tolist(), int(self._delays[index]), speeds)
+
+    def __setitem__(self, index, row):
+        index = self.normalize_index(index)
+        self.ensure_writable()
+        self._values[index] = row_values(row)
+        self._delays[index] = row.get('delay', DEFAULT_DELAY)
+        speeds = row_speeds(row)
+        if speeds is not None:
+            self.ensure_speeds()
+        if self._speeds is not None:
+            self._speeds[index] = NO_SPEED if speeds is None else speeds
+
+    def __delitem__(self, index):
+        self.pop(index)
+
+    def append(self, row):
+        self.insert(self._len, row)
+
+    def insert(self, index, row):
+        index = max(0, min(self._len, index if index >= 0 else self._len + index))
+        self.reserve(self._len + 1)
+        self._values[index + 1:self._len + 1] = self._values[index:self._len]
+        self._delays[index + 1:self._len + 1] = self._delays[index:self._len]
+        if self._speeds is not None:
+            self._speeds[index + 1:self._len + 1] = self._speeds[index:self._len]
+        self._len += 1
+        self[index] = row
+
+    # splice another script in before index, e.g. recorded keyframes
+    def insert_data(self, index, data):
+        index = max(0, min(self._len, index if index >= 0 else self._len + index))
+        count = len(data)
+        self.reserve(self._len + count)
+        if data.speeds is not None:
+            self.ensure_speeds()
+        self._values[index + count:self._len + count] = self._values[index:self._len]
+        self._delays[index + count:self._len + count] = self._delays[index:self._len]
+        self._values[index:index + count] = data.values
+        self._delays[index:index + count] = data.delays
+        if self._speeds is not None:
+            self._speeds[index + count:self._len + count] = self._speeds[index:self._len]
+            self._speeds[index:index + count] = NO_SPEED if data.speeds is None else data.speeds
+        self._len += count
+
+    def pop(self, index=-1):
+        index = self.normalize_index(index)
+        row = self[index]
+        self.ensure_writable()
+        self._values[index:self._len - 1] = self._values[index + 1:self._len]
+        self._delays[index:self._len - 1] = self._delays[index + 1:self._len]
+        if self._speeds is not None:
+            self._speeds[index:self._len - 1] = self._speeds[index + 1:self._len]
+        self._len -= 1
+        return row
+
+    def normalize_index(self, index):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("script row index out of range")
+        return index
+
+    # grow the backing arrays geometrically, so repeated inserts stay amortized O(1) in allocations
+    def reserve(self, size):
+        if size <= len(self._values) and self.owns_data():
+            return
+        capacity = max(size, 2 * len(self._values), 16)
+        values = np.zeros((capacity, NUM_SERVOS), dtype=VALUE_DTYPE)
+        delays = np.zeros(capacity, dtype=DELAY_DTYPE)
+        values[:self._len] = self.values
+        delays[:self._len] = self.delays
+        if self._speeds is not None:
+            speeds = np.full((capacity, NUM_SERVOS), NO_SPEED, dtype=VALUE_DTYPE)
+            speeds[:self._len] = self.speeds
+            self._speeds = speeds
+        self._values, self._delays = values, delays
+
+    # the speed column, all NO_SPEED, once the first row gets a speed
+    def ensure_speeds(self):
+        if self._speeds is None:
+            self._speeds = np.full((len(self._values), NUM_SERVOS), NO_SPEED, dtype=VALUE_DTYPE)
+
+    # a memory-mapped script is copied into memory on its first edit
+    def ensure_writable(self):
+        if not self.owns_data():
+            self.reserve(self._len)
+
+    def owns_data(self):
+        return not isinstance(self._values, np.memmap) and self._values.flags.writeable
+
+
+SERVO_INDEX = {name: index for index, name in enumerate(SERVO_NAMES)}
+
+
+# ScriptData from int64 arrays clipped to the ranges the controller accepts. speed_rows marks the
+# rows that have a speed, by default those not starting with NO_SPEED
+def clamped_script(values, delays, speeds=None, source="script", speed_rows=None):
+    clamped = np.count_nonzero((values < LOGICAL_MIN) | (values > LOGICAL_MAX))
+    clamped += np.count_nonzero((delays < 0) | (delays > DELAY_MAX))
+    values = np.clip(values, LOGICAL_MIN, LOGICAL_MAX).astype(VALUE_DTYPE)
+    delays = np.clip(delays, 0, DELAY_MAX).astype(DELAY_DTYPE)
+    if speeds is not None:
+        if speed_rows is None:
+            speed_rows = speeds[:, 0] != NO_SPEED
+        with_speed = speeds[speed_rows]
+        clamped += np.count_nonzero((with_speed < SPEED_MIN) | (with_speed > SPEED_MAX))
+        speeds = np.full(speeds.shape, NO_SPEED, dtype=VALUE_DTYPE)
+        speeds[speed_rows] = np.clip(with_speed, SPEED_MIN, SPEED_MAX)
+    if clamped:
+        print(f"{source}: {clamped} values out of range, clamped")
+    return ScriptData(values, delays, speeds)
+
+
+def script_frames(script_data):
+    if isinstance(script_data, ScriptData):
+        return script_data.frames()
+    return [(row_registers(row), row.get('delay', DEFAULT_DELAY)) for row in script_data]
+
+
+# a JSON script, from its compiled cache while that matches the text
+def load_json(path):
+    with open(path, "rb") as f:
+        text = f.read()
+    digest = hashlib.sha256(text).digest()
+    try:
+        return load_compiled(path + COMPILED_SUFFIX, digest)
+    except (OSError, ValueError):
+        pass  # no cache, stale, or from another version
+    script_data = ScriptData.from_rows(json.loads(text), path)
+    save_compiled(path + COMPILED_SUFFIX, digest, script_data)
+    return script_data
+
+
+def save_json(path, script_data):
+    if not isinstance(script_data, ScriptData):
+        script_data = ScriptData.from_rows(script_data, path)
+    text = json.dumps(script_data.to_rows(), indent=2).encode()
+    with open(path, "wb") as f:
+        f.write(text)
+    save_compiled(path + COMPILED_SUFFIX, hashlib.sha256(text).digest(), script_data)
+
+
+def load_compiled(path, digest):
+    with open(path, "rb") as f:
+        if f.read(DIGEST_SIZE) != digest:
+            raise ValueError(f"{path}: compiled from another version of the script")
+    return load_binary(path, DIGEST_SIZE)
+
+
+# the cache is an optimization only, a read-only directory just means no cache
+def save_compiled(path, digest, script_data):
+    def write(f):
+        f.write(digest)
+        write_binary(f, script_data)
+
+    try:
+        replace_file(path, script_data, write)
+    except OSError as e:
+        print("error write compiled script ->", e)
+
+
+def load_binary(path, offset=0):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        header = f.read(BINARY_HEADER.size)
+    if len(header) < BINARY_HEADER.size:
+        raise ValueError(f"{path}: truncated header")
+    magic, version, servos, rows = BINARY_HEADER.unpack(header)
+    if magic != BINARY_MAGIC:
+        raise ValueError(f"{path}: not a hand-stand binary script")
+    if version not in (BINARY_VERSION, BINARY_VERSION_SPEED):
+        raise ValueError(f"{path}: unsupported binary script version {version}")
+    if servos != NUM_SERVOS:
+        raise ValueError(f"{path}: script has {servos} servos, expected {NUM_SERVOS}")
+    if rows == 0:
+        return ScriptData()
+    offset += BINARY_HEADER.size
+    values = np.memmap(path, dtype=VALUE_DTYPE, mode="r", offset=offset, shape=(rows, servos))
+    delays = np.memmap(path, dtype=DELAY_DTYPE, mode="r", offset=offset + values.nbytes, shape=(rows,))
+    speeds = None
+    if version == BINARY_VERSION_SPEED:
+        speeds = np.memmap(path, dtype=VALUE_DTYPE, mode="r", offset=offset + values.nbytes + delays.nbytes,
+                           shape=(rows, servos))
+    if values.max() > LOGICAL_MAX or (speeds is not None and (speeds[speeds != NO_SPEED] > SPEED_MAX).any()):
+        # written by some other tool: clamped like a JSON script, in memory
+        return clamped_script(values.astype(np.int64), delays.astype(np.int64),
+                              None if speeds is None else speeds.astype(np.int64), path)
+    return ScriptData(values, delays, speeds)
+
+
+def save_binary(path, script_data):
+    if not isinstance(script_data, ScriptData):
+        script_data = ScriptData.from_rows(script_data, path)
+    replace_file(path, script_data, lambda f: write_binary(f, script_data))
+
+
+# the target may be the file script_data is mapped from: truncating it in place would pull the
+# pages from under the mapping. The script is copied out of it (Windows does not replace a
+# mapped file), written next to the target and renamed over it - a failed write keeps the old file
+def replace_file(path, script_data, write):
+    script_data.ensure_writable()
+    temp = path + ".tmp"
+    try:
+        with open(temp, "wb") as f:
+            write(f)
+        os.replace(temp, path)
+    except OSError:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+def write_binary(f, script_data):
+    speeds = script_data.speeds
+    if speeds is not None and (speeds == NO_SPEED).all():
+        speeds = None  # keep files without speeds readable by version 1 readers
+    version = BINARY_VERSION if speeds is None else BINARY_VERSION_SPEED
+    f.write(BINARY_HEADER.pack(BINARY_MAGIC, version, NUM_SERVOS, len(script_data)))
+    f.write(np.ascontiguousarray(script_data.values, dtype=VALUE_DTYPE).tobytes())
+    f.write(np.ascontiguousarray(script_data.delays, dtype=DELAY_DTYPE).tobytes())
+    if speeds is not None:
+        f.write(np.ascontiguousarray(speeds, dtype=VALUE_DTYPE).tobytes())
+
+
+# pick the format by file extension
+def load_script(path):
+    if path.lower().endswith(BINARY_SUFFIX):
+        return load_binary(path)
+    return load_json(path)
+
+
+def save_script(path, script_data):
+    if path.lower().endswith(BINARY_SUFFIX):
+        save_binary(path, script_data)
+    else:
+        save_json(path, script_data)
@@ -0,0 +1,182 @@
+# hand-stand/pc-app/script_table.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Virtualized script table.
+#
+# The Treeview only holds the rows that fit on screen; iid of an item is its
+# row index in the script, so row <-> iid lookups are O(1). The scrollbar,
+# mouse wheel and Up/Down/PageUp/PageDown keys move the window over the
+# script. Edits are applied incrementally: an updated row rewrites one item,
+# inserts and deletes re-render only the visible window.
+# Marked rows (late rows found by Check) are highlighted until the script
+# is edited or replaced.
+
+import json
+from tkinter import ttk
+
+DEFAULT_WINDOW = 20
+DEFAULT_ROW_HEIGHT = 20
+WHEEL_ROWS = 3
+MARK_COLOR = "#ffd8d0"
+
+
+class ScriptTable:
+    def __init__(self, parent, data, on_select):
+        self.data = data
+        self.on_select = on_select  # on_select(row) when the user picks a row or select_row() is called
+        self.offset = 0             # first script row shown
+        self.window = DEFAULT_WINDOW
+        self.selected = None        # selected script row, may be scrolled out of the window
+        self.user_action = False    # set by input bindings, tells user selections from our own
+        self.marked = set()         # highlighted script rows
+
+        self.tree = ttk.Treeview(parent, columns=("data",), show="headings", selectmode="browse")
+        self.tree.heading("data", text="Script Row")
+        self.tree.tag_configure("marked", background=MARK_COLOR)
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        self.scroll = ttk.Scrollbar(parent, command=self.on_scrollbar)
+        self.scroll.pack(side="right", fill="y")
+
+        self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
+        self.tree.bind("<ButtonPress-1>", self.on_user_input)
+        self.tree.bind("<Configure>", self.on_configure)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll_rows(-WHEEL_ROWS if e.delta > 0 else WHEEL_ROWS))
+        self.tree.bind("<Button-4>", lambda e: self.scroll_rows(-WHEEL_ROWS))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_rows(WHEEL_ROWS))
+        self.tree.bind("<Up>", lambda e: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self.move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self.move_selection(-self.window))
+        self.tree.bind("<Next>", lambda e: self.move_selection(self.window))
+
+        self.render()
+
+    # ---- data changes ----
+
+    def set_data(self, data):
+        self.data = data
+        self.offset = 0
+        self.selected = None
+        self.marked = set()
+        self.render()
+
+    def set_marked(self, rows):
+        self.marked = set(rows)
+        self.render()
+
+    def row_updated(self, row):
+        self.marked.discard(row)
+        if self.is_visible(row):
+            self.tree.item(str(row), values=(self.format_row(row),), tags=())
+
+    def rows_inserted(self, row, count=1):
+        if self.selected is not None and self.selected >= row:
+            self.selected += count
+        self.rows_changed(row)
+
+    def rows_deleted(self, row, count=1):
+        if self.selected is not None:
+            if row <= self.selected < row + count:
+                self.selected = None
+            elif self.selected >= row + count:
+                self.selected -= count
+        self.rows_changed(row)
+
+    # rows from `row` on moved: only the window needs re-rendering, and only if it is affected
+    def rows_changed(self, row):
+        self.marked = {marked for marked in self.marked if marked < row}
+        if row < self.offset + self.window:
+            self.render()
+        else:
+            self.update_scrollbar()
+
+    # ---- selection ----
+
+    def selected_row(self):
+        return self.selected
+
+    def select_row(self, row, notify=True):
+        if len(self.data) == 0:
+            return
+        row = max(0, min(len(self.data) - 1, row))
+        self.selected = row
+        if self.is_visible(row):
+            self.tree.selection_set(str(row))
+            self.tree.focus(str(row))
+        else:
+            self.offset = row if row < self.offset else row - self.window + 1
+            self.render()
+        if notify:
+            self.on_select(row)
+
+    def move_selection(self, delta):
+        start = -1 if self.selected is None else self.selected
+        self.select_row(start + delta if start >= 0 else 0)
+        return "break"
+
+    def on_user_input(self, event):
+        self.user_action = True
+
+    # Treeview selections made by render()/select_row() are ours and are ignored here,
+    # the row was already reported through select_row()
+    def on_tree_select(self, event):
+        user_action = self.user_action
+        self.user_action = False
+        selected = self.tree.selection()
+        if not user_action or not selected:
+            return
+        self.selected = int(selected[0])
+        self.on_select(self.selected)
+
+    # ---- window ----
+
+    def is_visible(self, row):
+        return self.offset <= row < min(len(self.data), self.offset + self.window)
+
+    def format_row(self, row):
+        return json.dumps(self.data[row])
+
+    def render(self):
+        self.user_action = False
+        self.offset = max(0, min(self.offset, len(self.data) - self.window))
+        self.tree.delete(*self.tree.get_children())
+        for row in range(self.offset, min(len(self.data), self.offset + self.window)):
+            self.tree.insert("", "end", iid=str(row), values=(self.format_row(row),),
+                             tags=("marked",) if row in self.marked else ())
+        if self.selected is not None and self.selected >= len(self.data):
+            self.selected = None
+        if self.selected is not None and self.is_visible(self.selected):
+            self.tree.selection_set(str(self.selected))
+            self.tree.focus(str(self.selected))
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        total = len(self.data)
+        if total <= self.window:
+            self.scroll.set(0.0, 1.0)
+        else:
+            self.scroll.set(self.offset / total, (self.offset + self.window) / total)
+
+    def scroll_rows(self, rows):
+        offset = max(0, min(self.offset + rows, len(self.data) - self.window))
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+        return "break"
+
+    def on_scrollbar(self, command, *args):
+        if command == "moveto":
+            self.scroll_rows(int(float(args[0]) * len(self.data)) - self.offset)
+        elif command == "scroll":
+            step = self.window if args[1] == "pages" else 1
+            self.scroll_rows(int(args[0]) * step)
+
+    def on_configure(self, event):
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or DEFAULT_ROW_HEIGHT)
+        # one row of the visible area is taken by the heading
+        window = max(1, event.height // row_height - 1)
+        if window != self.window:
+            self.window = window
+            self.render()
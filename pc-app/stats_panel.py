@@ -0,0 +1,77 @@
+# hand-stand/pc-app/stats_panel.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Small panel with transport counters, latency percentiles and trace export.
+
+import tkinter as tk
+from tkinter import ttk, filedialog
+
+from instrumentation import COUNTERS
+
+REFRESH_MS = 1000
+
+
+class StatsPanel:
+    def __init__(self, parent, tracer, get_baudrate=None):
+        self.tracer = tracer
+        self.get_baudrate = get_baudrate  # baud of the current session, used for tx spans in the trace
+
+        self.frame = ttk.LabelFrame(parent, text="Transport stats")
+        self.frame.pack(fill="x", padx=5, pady=5)
+
+        self.counter_vars = {}
+        for i, name in enumerate(COUNTERS):
+            ttk.Label(self.frame, text=name.replace("_", " ") + ":").grid(row=i // 5, column=(i % 5) * 2,
+                                                                          sticky="e", padx=(5, 0))
+            var = tk.StringVar(value="0")
+            ttk.Label(self.frame, textvariable=var, width=7).grid(row=i // 5, column=(i % 5) * 2 + 1, sticky="w")
+            self.counter_vars[name] = var
+
+        row = (len(COUNTERS) + 4) // 5
+        self.latency_var = tk.StringVar(value="no transactions yet")
+        ttk.Label(self.frame, textvariable=self.latency_var).grid(row=row, column=0, columnspan=8, sticky="w", padx=5)
+        buttons = ttk.Frame(self.frame)
+        buttons.grid(row=row, column=8, columnspan=2, sticky="e")
+        ttk.Button(buttons, text="Export trace", command=self.export).pack(side="left", padx=2)
+        ttk.Button(buttons, text="Reset", command=self.reset).pack(side="left", padx=2)
+
+        self.frame.after(REFRESH_MS, self.refresh)
+
+    def refresh(self):
+        try:
+            if self.frame.winfo_viewable():
+                self.update()
+        finally:
+            self.frame.after(REFRESH_MS, self.refresh)
+
+    def update(self):
+        for name, value in self.tracer.snapshot_counters().items():
+            if name in self.counter_vars:
+                self.counter_vars[name].set(str(value))
+        summary = self.tracer.summary()
+        if "total" not in summary:
+            self.latency_var.set("no transactions yet")
+            return
+        parts = [f"{summary['count']} txns"]
+        for name in ("total", "queue", "wire"):
+            if name in summary:
+                s = summary[name]
+                parts.append(f"{name} p50 {s['p50_ms']:.1f} / p95 {s['p95_ms']:.1f} / max {s['max_ms']:.1f} ms")
+        self.latency_var.set(",  ".join(parts))
+
+    def export(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json",
+                                            filetypes=[("Chrome trace", "*.json"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            count = self.tracer.export_chrome(path, self.get_baudrate() if self.get_baudrate else None)
+            print(f"trace exported to {path}, {count} events")
+        except Exception as e:
+            print("error export trace ->", e)
+
+    def reset(self):
+        self.tracer.reset()
+        self.update()
@@ -0,0 +1,198 @@
+# hand-stand/pc-app/telemetry.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Background telemetry poller with a preallocated ring buffer.
+#
+# Fast polls read values_actual (10..15) only - that is what ramps on the
+# controller. Every FULL_EVERY polls, or on request, the config blocks are
+# read too: 10..35 (actual, min, max; the firmware fills the gaps) in one
+# request plus 100..105 (logical targets). Older firmware without the gap
+# registers is detected and read block by block.
+# The poll interval adapts: fast while the arm moves, backing off towards
+# max_interval while it is still or the port is failing.
+# Polls go in the lowest session lane, behind every command to the arm.
+# Commands sent as FC23 bring values_actual back with them: record() takes
+# such a snapshot like a poll, and the next fast poll is skipped while it is
+# fresh.
+
+import threading
+import time
+
+import numpy as np
+
+from command_lanes import LANE_TELEMETRY
+from registers import (NUM_SERVOS, VALUES_ACTUAL_ADDR, VALUES_LOGICAL_ADDR, VALUES_MAX_ADDR,
+                       VALUES_MIN_ADDR)
+
+MIN_INTERVAL = 0.1  # s
+MAX_INTERVAL = 1.0  # s
+BACKOFF = 1.5
+FULL_EVERY = 20
+HISTORY = 3000      # samples kept for plotting
+
+CONFIG_SPAN = VALUES_MAX_ADDR + NUM_SERVOS - VALUES_ACTUAL_ADDR  # 10..35
+
+
+class RingBuffer:
+    def __init__(self, capacity, channels, dtype=np.float32):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.data = np.zeros((capacity, channels), dtype=dtype)
+        self.head = 0    # next slot to write
+        self.count = 0
+        self.appended = 0  # samples ever appended, new ones are told apart by it
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, t, values):
+        with self.lock:
+            self.times[self.head] = t
+            self.data[self.head] = values
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            self.appended += 1
+
+    # copy the newest n samples, oldest first, into preallocated out arrays; returns n copied
+    def copy_latest(self, out_times, out_data):
+        with self.lock:
+            return self.copy_last(min(self.count, len(out_times)), out_times, out_data)
+
+    # copy the samples appended after the first seen ones, as far as they are still kept;
+    # returns (n copied, samples appended so far) - the seen value for the next call
+    def copy_since(self, seen, out_times, out_data):
+        with self.lock:
+            n = min(self.appended - seen, self.count, len(out_times))
+            return self.copy_last(n, out_times, out_data), self.appended
+
+    def copy_last(self, n, out_times, out_data):
+        start = (self.head - n) % self.capacity
+        first = min(n, self.capacity - start)
+        out_times[:first] = self.times[start:start + first]
+        out_data[:first] = self.data[start:start + first]
+        out_times[first:n] = self.times[:n - first]
+        out_data[first:n] = self.data[:n - first]
+        return n
+
+
+class TelemetryPoller:
+    def __init__(self, get_session, on_sample=None, history=HISTORY,
+                 min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, full_every=FULL_EVERY):
+        self.get_session = get_session  # returns the current session or None
+        self.on_sample = on_sample      # on_sample(dict), called from the poller thread
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.full_every = full_every
+
+        self.history = RingBuffer(history, NUM_SERVOS)
+        self.interval = min_interval
+        self.polls = 0
+        self.errors = 0
+        self.contiguous_config = True  # firmware serves 10..35 in one read
+        self.last_actual = None
+        self.last_sample = 0.0  # monotonic time of the newest values_actual, polled or read back
+        self.readbacks = 0
+        self.skipped = 0        # polls saved by readbacks
+        self.full_requested = True
+
+        self.stop_event = threading.Event()
+        self.wakeup = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="telemetry", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.wakeup.set()
+
+    # poll fast again, e.g. right after a command was sent
+    def boost(self):
+        self.interval = self.min_interval
+        self.wakeup.set()
+
+    # read the config blocks on the next poll, e.g. after connect or Set Min/Max
+    def request_full(self):
+        self.full_requested = True
+        self.wakeup.set()
+
+    # values_actual read back by a command (FC23), from the I/O thread
+    def record(self, actual):
+        self.readbacks += 1
+        self.add_sample({"time": time.monotonic(), "actual": actual})
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            if self.stop_event.is_set():
+                break
+            session = self.get_session()
+            if session is None or not session.connected:
+                self.interval = self.max_interval
+                self.full_requested = True
+                continue
+            if not self.full_requested and time.monotonic() - self.last_sample < self.min_interval:
+                self.skipped += 1
+                continue
+            try:
+                sample = self.poll(session)
+            except Exception as e:
+                self.errors += 1
+                self.interval = self.max_interval
+                print("error poll telemetry ->", e)
+                continue
+            self.add_sample(sample)
+
+    def add_sample(self, sample):
+        moving = self.last_actual is not None and sample["actual"] != self.last_actual
+        self.last_actual = sample["actual"]
+        self.last_sample = sample["time"]
+        self.interval = self.min_interval if moving else min(self.interval * BACKOFF, self.max_interval)
+        self.history.append(sample["time"], sample["actual"])
+        if self.on_sample:
+            self.on_sample(sample)
+
+    def poll(self, session):
+        self.polls += 1
+        full = self.full_requested or self.polls % self.full_every == 0
+        timeout = session.timeout * 3
+        if not full:
+            actual = poll_read(session, VALUES_ACTUAL_ADDR, NUM_SERVOS).result(timeout)
+            return {"time": time.monotonic(), "actual": actual}
+        sample = self.read_config(session, timeout)
+        sample["logical"] = poll_read(session, VALUES_LOGICAL_ADDR, NUM_SERVOS).result(timeout)
+        self.full_requested = False
+        return sample
+
+    def read_config(self, session, timeout):
+        if self.contiguous_config:
+            try:
+                regs = poll_read(session, VALUES_ACTUAL_ADDR, CONFIG_SPAN).result(timeout)
+            except Exception as e:
+                if getattr(e, "exception_code", None) is None:
+                    raise  # no answer or expired in the queue, not a verdict on the firmware
+                # firmware without the gap registers answers with an exception, read per block
+                self.contiguous_config = False
+            else:
+                t = time.monotonic()
+
+                def block(address):
+                    offset = address - VALUES_ACTUAL_ADDR
+                    return regs[offset:offset + NUM_SERVOS]
+
+                return {"time": t, "actual": block(VALUES_ACTUAL_ADDR),
+                        "min": block(VALUES_MIN_ADDR), "max": block(VALUES_MAX_ADDR)}
+        actual = poll_read(session, VALUES_ACTUAL_ADDR, NUM_SERVOS).result(timeout)
+        t = time.monotonic()
+        return {"time": t, "actual": actual,
+                "min": poll_read(session, VALUES_MIN_ADDR, NUM_SERVOS).result(timeout),
+                "max": poll_read(session, VALUES_MAX_ADDR, NUM_SERVOS).result(timeout)}
+
+
+def poll_read(session, address, count):
+    return session.read_registers(address, count, lane=LANE_TELEMETRY)
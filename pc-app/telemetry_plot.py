@@ -0,0 +1,109 @@
+# hand-stand/pc-app/telemetry_plot.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Live per-axis plot of telemetry history on a tk Canvas.
+#
+# Only new samples are drawn: every frame adds one line item per axis from
+# the last point drawn through the samples that came in since, and moves
+# the items drawn before to the left by the time passed. Items scrolled out
+# of the window are deleted; a resize changes the scale, the window is drawn
+# again from the history. New samples are copied in place into buffers
+# allocated up front, sized to the ring buffer.
+
+import time
+import tkinter as tk
+from collections import deque
+
+import numpy as np
+
+from registers import ACTUAL_MIN, ACTUAL_MAX, SERVO_NAMES
+
+REFRESH_MS = 100
+WINDOW_SECONDS = 30.0
+COLORS = ["#d62728", "#1f77b4", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b"]
+TRACE_TAG = "trace"
+
+
+class TelemetryPlot:
+    def __init__(self, parent, history, window_seconds=WINDOW_SECONDS, width=600, height=300):
+        self.history = history
+        self.window_seconds = window_seconds
+
+        legend = tk.Frame(parent)
+        legend.pack(fill="x", padx=5)
+        for name, color in zip(SERVO_NAMES, COLORS):
+            tk.Label(legend, text=name, fg=color).pack(side="left", padx=5)
+
+        self.canvas = tk.Canvas(parent, width=width, height=height, bg="white")
+        self.canvas.pack(fill="both", expand=True, padx=5, pady=5)
+
+        # slot 0 holds the last sample drawn, the next segment starts there
+        size = history.capacity + 1
+        self.times = np.zeros(size, dtype=np.float64)
+        self.data = np.zeros((size, len(SERVO_NAMES)), dtype=history.data.dtype)
+        self.x = np.zeros(size, dtype=np.float64)
+        self.y = np.zeros(size, dtype=np.float64)
+        self.coords = np.zeros(2 * size, dtype=np.float64)
+
+        self.segments = deque()  # (time of the newest sample, line items), oldest first
+        self.seen = 0            # history.appended when samples were copied last
+        self.has_last = False    # slot 0 is set
+        self.drawn_at = 0.0      # time.monotonic() the items are placed for
+        self.size = None         # (width, height) the items are scaled for
+
+        self.canvas.after(REFRESH_MS, self.redraw)
+
+    def redraw(self):
+        try:
+            if self.canvas.winfo_viewable():
+                self.draw()
+        finally:
+            self.canvas.after(REFRESH_MS, self.redraw)
+
+    def clear(self):
+        self.canvas.delete(TRACE_TAG)
+        self.segments.clear()
+        self.seen = 0
+        self.has_last = False
+
+    def draw(self):
+        now = time.monotonic()
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        scale_x = width / self.window_seconds
+        if (width, height) != self.size:
+            self.clear()
+            self.size = (width, height)
+        else:
+            self.canvas.move(TRACE_TAG, (self.drawn_at - now) * scale_x, 0)
+        self.drawn_at = now
+        left = now - self.window_seconds
+        while self.segments and self.segments[0][0] < left:
+            self.canvas.delete(*self.segments.popleft()[1])
+
+        n, self.seen = self.history.copy_since(self.seen, self.times[1:], self.data[1:])
+        if n == 0:
+            return
+        end = n + 1
+        # after a clear the history may reach back further than the window: one sample before it is enough
+        start = max(0 if self.has_last else 1, int(np.searchsorted(self.times[1:end], left)))
+        if end - start >= 2:
+            x, y, coords = self.x[start:end], self.y[start:end], self.coords[2 * start:2 * end]
+            # x: seconds back from now mapped onto the canvas width
+            np.subtract(self.times[start:end], left, out=x)
+            np.multiply(x, scale_x, out=x)
+            coords[0::2] = x
+            scale = -height / float(ACTUAL_MAX - ACTUAL_MIN)
+            items = []
+            for axis, color in enumerate(COLORS):
+                np.subtract(self.data[start:end, axis], ACTUAL_MIN, out=y)
+                np.multiply(y, scale, out=y)
+                np.add(y, height, out=y)
+                coords[1::2] = y
+                items.append(self.canvas.create_line(coords.tolist(), fill=color, tags=TRACE_TAG))
+            self.segments.append((self.times[n], items))
+        self.times[0] = self.times[n]
+        self.data[0] = self.data[n]
+        self.has_last = True
@@ -0,0 +1,51 @@
+# hand-stand/pc-app/tk_bridge.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Thread-safe hand-over of callbacks into the tkinter main loop.
+#
+# Tk widgets may only be touched from the thread running mainloop(). I/O
+# threads and the asyncio loop post callbacks into a queue which is drained
+# from root.after() on the Tk thread.
+
+import queue
+
+PUMP_INTERVAL_MS = 20
+
+
+class TkBridge:
+    def __init__(self, root, interval=PUMP_INTERVAL_MS):
+        self.root = root
+        self.interval = interval
+        self.events = queue.Queue()
+        self.after_id = None
+
+    def start(self):
+        self.pump()
+        return self
+
+    def stop(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    # safe to call from any thread
+    def post(self, callback, *args):
+        self.events.put((callback, args))
+
+    # run callback(future) on the Tk thread once the future (concurrent.futures) is done
+    def deliver(self, future, callback):
+        future.add_done_callback(lambda f: self.post(callback, f))
+
+    def pump(self):
+        while True:
+            try:
+                callback, args = self.events.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                print("error in ui callback ->", e)
+        self.after_id = self.root.after(self.interval, self.pump)
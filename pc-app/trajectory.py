@@ -0,0 +1,186 @@
+# hand-stand/pc-app/trajectory.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Trajectory compiler: script keyframes -> fixed-rate setpoint stream.
+#
+# Row i of a script is a keyframe reached at t_i = sum(delay[0..i-1]); the last
+# row is held for its own delay. All six axes are interpolated at once with
+# NumPy, no per-sample Python loops. Profiles:
+#   linear  - constant velocity between keyframes
+#   cubic   - monotone piecewise cubic Hermite spline (PCHIP), C1 and never
+#             overshoots a keyframe, so values stay inside the logical range
+#   minjerk - minimum-jerk blend 10s^3 - 15s^4 + 6s^5 inside every segment
+# Velocity/acceleration limits (logical units per s / s^2, scalar or per axis)
+# are met by stretching segment durations; acceleration limits do not apply
+# to the linear profile, its velocity steps at every keyframe.
+# The result is streamed to VALUES_LOGICAL_ADDR, one FC16 frame per tick.
+
+import numpy as np
+
+from registers import LOGICAL_MIN, LOGICAL_MAX, NUM_SERVOS
+from script_model import ScriptData
+
+PROFILES = ("linear", "cubic", "minjerk")
+DEFAULT_RATE = 20  # Hz; a 6 register FC16 round-trip takes ~30 ms at 9600 baud
+
+LIMIT_ITERATIONS = 4
+
+
+class Trajectory:
+    def __init__(self, times, setpoints, rows, rate):
+        self.times = times          # (M,) seconds from start
+        self.setpoints = setpoints  # (M, NUM_SERVOS) uint16 logical values
+        self.rows = rows            # (M,) index of the script row each sample moves away from
+        self.rate = rate
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def duration(self):
+        return len(self.times) / self.rate
+
+    # (values, delay_ms) frames for PlaybackEngine - one FC16 write per tick
+    def frames(self):
+        delay = 1000.0 / self.rate
+        return [(values, delay) for values in self.setpoints.tolist()]
+
+
+def keyframes(script_data):
+    if not isinstance(script_data, ScriptData):
+        script_data = ScriptData.from_rows(script_data)
+    return script_data.values.astype(np.float64), script_data.delays / 1000.0
+
+
+def compile_trajectory(script_data, rate=DEFAULT_RATE, profile="minjerk",
+                       max_velocity=None, max_acceleration=None):
+    values, delays = keyframes(script_data)
+    return compile_keyframes(values, delays, rate, profile, max_velocity, max_acceleration)
+
+
+def compile_keyframes(values, delays, rate=DEFAULT_RATE, profile="minjerk",
+                      max_velocity=None, max_acceleration=None):
+    if profile not in PROFILES:
+        raise ValueError(f"unknown profile {profile!r}, expected one of {', '.join(PROFILES)}")
+    n = len(values)
+    if n == 0:
+        empty = np.zeros((0, NUM_SERVOS), dtype=np.uint16)
+        return Trajectory(np.zeros(0), empty, np.zeros(0, dtype=np.intp), rate)
+
+    durations = np.maximum(delays[:-1], 0.0)  # (n-1,) segment durations
+    if n > 1 and (max_velocity is not None or max_acceleration is not None):
+        durations = apply_limits(values, durations, profile, max_velocity, max_acceleration)
+    knots = np.concatenate(([0.0], np.cumsum(durations)))
+    total = knots[-1] + max(delays[-1], 0.0)
+
+    times = np.arange(0.0, total, 1.0 / rate)
+    if n == 1:
+        points = np.broadcast_to(values[0], (len(times), NUM_SERVOS))
+        rows = np.zeros(len(times), dtype=np.intp)
+    else:
+        rows = np.clip(np.searchsorted(knots, times, side="right") - 1, 0, n - 1)
+        seg = np.minimum(rows, n - 2)
+        points = evaluate(values, durations, profile, seg, local_time(times, knots, durations, seg))
+
+    setpoints = np.clip(np.rint(points), LOGICAL_MIN, LOGICAL_MAX).astype(np.uint16)
+    return Trajectory(times, setpoints, rows, rate)
+
+
+def local_time(times, knots, durations, seg):
+    h = durations[seg]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.where(h > 0, (times - knots[seg]) / h, 1.0)
+    return np.clip(s, 0.0, 1.0)
+
+
+# position of every sample; seg (M,) segment index, s (M,) normalized time in segment
+def evaluate(values, durations, profile, seg, s):
+    s = s[:, None]
+    if profile == "cubic":
+        a, b, c, d = cubic_coefficients(values, durations)
+        return a[seg] + s * (b[seg] + s * (c[seg] + s * d[seg]))
+    y0 = values[seg]
+    delta = values[seg + 1] - y0
+    if profile == "linear":
+        return y0 + delta * s
+    return y0 + delta * (s ** 3 * (10.0 - 15.0 * s + 6.0 * s * s))
+
+
+# per-segment polynomial a + b*s + c*s^2 + d*s^3 of the cubic Hermite spline in normalized time
+def cubic_coefficients(values, durations):
+    m = pchip_slopes(values, durations)
+    h = durations[:, None]
+    y0, y1 = values[:-1], values[1:]
+    t0, t1 = m[:-1] * h, m[1:] * h
+    return y0, t0, 3 * (y1 - y0) - 2 * t0 - t1, 2 * (y0 - y1) + t0 + t1
+
+
+# Fritsch-Carlson monotone slopes at every keyframe, (n, axes), units per second
+def pchip_slopes(values, durations):
+    n = len(values)
+    h = durations[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d = np.where(h > 0, np.diff(values, axis=0) / h, 0.0)  # secant slopes (n-1, axes)
+    m = np.zeros_like(values)
+    if n > 2:
+        d0, d1 = d[:-1], d[1:]
+        w0 = 2 * h[1:] + h[:-1]
+        w1 = h[1:] + 2 * h[:-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            harmonic = (w0 + w1) / (w0 / d0 + w1 / d1)
+        # zero slope at local extrema and flat spots keeps the curve monotone
+        m[1:-1] = np.where((d0 * d1) > 0, harmonic, 0.0)
+    # one-sided end slopes
+    m[0] = d[0]
+    m[-1] = d[-1]
+    return np.nan_to_num(m)
+
+
+# stretch segments until peak velocity/acceleration of every axis stays within limits
+def apply_limits(values, durations, profile, max_velocity, max_acceleration):
+    durations = durations.copy()
+    v_lim = None
+    if max_velocity is not None:
+        v_lim = np.broadcast_to(np.asarray(max_velocity, dtype=np.float64), (NUM_SERVOS,))
+    a_lim = None
+    if max_acceleration is not None and profile != "linear":
+        a_lim = np.broadcast_to(np.asarray(max_acceleration, dtype=np.float64), (NUM_SERVOS,))
+    moving = np.any(np.diff(values, axis=0) != 0, axis=1)
+    # a move can not be instantaneous under a limit: give zero-length moves a nominal time
+    durations[moving & (durations <= 0)] = 1e-3
+
+    # slopes of the cubic depend on neighbouring segments, so refine a few times
+    for _ in range(LIMIT_ITERATIONS if profile == "cubic" else 1):
+        peak_v, peak_a = peaks(values, durations, profile)
+        stretch = np.ones(len(durations))
+        if v_lim is not None:
+            stretch = np.maximum(stretch, (peak_v / v_lim).max(axis=1))
+        if a_lim is not None:
+            stretch = np.maximum(stretch, np.sqrt((peak_a / a_lim).max(axis=1)))
+        if np.all(stretch <= 1.0 + 1e-9):
+            break
+        durations *= stretch
+    return durations
+
+
+# analytic peak |velocity| (units/s) and |acceleration| (units/s^2) of every segment and axis
+def peaks(values, durations, profile):
+    h = durations[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if profile == "cubic":
+            _, b, c, d = cubic_coefficients(values, durations)
+            # velocity is quadratic in s: check both ends and the vertex
+            vertex = np.clip(np.where(d != 0, -c / (3 * d), 0.0), 0.0, 1.0)
+            v = np.maximum.reduce([np.abs(b), np.abs(b + 2 * c + 3 * d),
+                                   np.abs(b + vertex * (2 * c + 3 * d * vertex))])
+            # acceleration is linear in s: peak at an end
+            a = np.maximum(np.abs(2 * c), np.abs(2 * c + 6 * d))
+        else:
+            delta = np.abs(np.diff(values, axis=0))
+            v = delta * (1.875 if profile == "minjerk" else 1.0)
+            a = delta * 5.7735 if profile == "minjerk" else np.zeros_like(delta)
+        peak_v = np.where(h > 0, v / h, 0.0)
+        peak_a = np.where(h > 0, a / (h * h), 0.0)
+    return peak_v, peak_a
@@ -0,0 +1,120 @@
+# hand-stand/pc-app/write_coalescer.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Latest-value-wins write scheduler for slider drags.
+#
+# Slider events only mark a register dirty with its newest value. One scheduler
+# thread flushes the dirty map on a fixed tick: contiguous dirty registers
+# (e.g. actual 10..15 or logical 100..105) go out as a single FC16 frame,
+# older values of the same register are dropped without touching the bus.
+
+import threading
+import time
+
+from instrumentation import tracer
+
+DEFAULT_TICK = 0.1  # seconds
+
+
+# split sorted {address: value} items into runs of contiguous addresses
+def contiguous_runs(items):
+    runs = []
+    for address, value in items:
+        if runs and runs[-1][0] + len(runs[-1][1]) == address:
+            runs[-1][1].append(value)
+        else:
+            runs.append((address, [value]))
+    return runs
+
+
+class WriteCoalescer:
+    def __init__(self, write_block, tick=DEFAULT_TICK, on_flush=None):
+        self.write_block = write_block  # write_block(address, values), contiguous FC16 write
+        self.tick = tick
+        self.on_flush = on_flush        # optional on_flush(address, values) for diagnostics
+
+        self.dirty = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+
+        self.events = 0
+        self.coalesced = 0
+        self.frames = 0
+        self.registers_sent = 0
+
+        self.thread = threading.Thread(target=self.run, name="write-coalescer", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+        if threading.current_thread() is not self.thread:
+            self.thread.join(timeout=2)
+
+    def set(self, address, value):
+        with self.lock:
+            self.events += 1
+            if address in self.dirty:
+                self.coalesced += 1
+                tracer.count("coalesced_writes")
+            self.dirty[address] = value
+        self.wakeup.set()
+
+    # forget a pending value, used when the register is about to be written directly
+    def discard(self, address):
+        with self.lock:
+            if self.dirty.pop(address, None) is not None:
+                self.coalesced += 1
+                tracer.count("coalesced_writes")
+
+    # forget every pending value, e.g. on Stop; returns how many were dropped. A flush running
+    # right now is waited for, so its writes are already queued in the session afterwards
+    def clear(self):
+        with self.lock:
+            dropped = len(self.dirty)
+            self.dirty.clear()
+        return dropped
+
+    def flush(self):
+        # write_block only queues, the lock is held until the frames are handed over
+        with self.lock:
+            items = sorted(self.dirty.items())
+            self.dirty.clear()
+            if not items:
+                return
+            start = time.perf_counter()
+            runs = contiguous_runs(items)
+            for address, values in runs:
+                self.frames += 1
+                self.registers_sent += len(values)
+                if self.on_flush:
+                    self.on_flush(address, values)
+                self.write_block(address, values)
+        tracer.count("coalescer_frames", len(runs))
+        tracer.span("coalescer flush", start, time.perf_counter(), frames=len(runs), registers=len(items))
+
+    def stats(self):
+        return {
+            "events": self.events,
+            "coalesced": self.coalesced,
+            "frames": self.frames,
+            "registers_sent": self.registers_sent,
+            "tick": self.tick,
+        }
+
+    def run(self):
+        while not self.stopped:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            if self.stopped:
+                break
+            # let the tick collect more events, the newest value per register wins
+            time.sleep(self.tick)
+            self.flush()
+        self.flush()
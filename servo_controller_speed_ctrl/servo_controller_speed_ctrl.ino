@@ -10,15 +10,29 @@
 //
 // debug logging on Serial (tx: d1, rx: d0) Baudrate 9600
 //
-// Use ModbusRTU on Serial1 (tx: d18, rx: d19) Baudrate 9600
+// Use ModbusRTU on Serial1 (tx: d18, rx: d19) Baudrate 9600 after reset, switchable at runtime
 //   Registers:
 //     - 10..15   - actual value of PWM control to be set on each servo in ms (500..2500)
 //     - 20..25   - minimum allowed actual values in ms (500..2500)
 //     - 30..35   - maximum allowed actual values in ms (500..2500)
+//     - 16..19, 26..29 - reserved, read as 0 so 10..35 can be read in one request
+//     - 200      - Serial1 baud rate code: 0 - 9600, 1 - 19200, 2 - 38400, 3 - 57600,
+//                  4 - 115200, 5 - 250000, 6 - 500000.
+//                  the rate is switched after the reply to the write. the master must write
+//                  the same code again at the new rate within 2 s, otherwise the controller
+//                  falls back to 9600. not stored in EEPROM: every reset starts at 9600
 //     - 100..105 - logical value of each servo (0..999).
 //                  it is mapped to actual values in boundary of defined max/min:
 //                  0   mapped to min allowed actual value
 //                  999 mapped to max allowed actual value
+//     - 106..111 - speed of each servo: logical units per timer tick (100 ms), 0..999,
+//                  10 after reset. 0 - no ramp, the servo jumps to its target on the next tick.
+//                  placed right after the logical values, so targets and speeds can be
+//                  written in one request (100..111). not stored in EEPROM
+//   Function codes: 3 (read), 6 and 16 (write), 23 (write, then read in the same frame).
+//     23 is served by the ModbusRTU library: the write callbacks run first, the read
+//     returns the registers after them. pc-app writes the targets and reads 10..15 back
+//     with it, so it sees the positions without a separate poll
 //   Recommended workflow:
 //     - set actual value for experimental find out end positions of each servo
 //     - set min and max to define end position of each servo
@@ -29,6 +43,7 @@
 #include <Servo.h>
 #include <TimerOne.h>
 
+#define MODBUS_UNIT_ID 1             // give every controller on a shared RS-485 bus its own id
 #define NUM_SERVOS 6
 
 #define LOGICAL_MIN 0
@@ -46,7 +61,7 @@
 // Control arrays
 uint16_t values_logical[NUM_SERVOS] = {};   // Logical values (0..999)
 uint16_t values_logical_target[NUM_SERVOS] = {};   // target logical values (0..999)
-uint16_t delta_logical[NUM_SERVOS] = {DEFAULT_DELTA};   // Logical speed value - change of logical values per timer period
+uint16_t delta_logical[NUM_SERVOS] = {};   // Logical speed value - change of logical values per timer period, set in setup()
 uint16_t values_min[NUM_SERVOS] = {};       // Min pulse width in microseconds
 uint16_t values_max[NUM_SERVOS] = {};       // Max pulse width in microseconds
 uint16_t values_actual[NUM_SERVOS] = {};    // Actual pulse width in microseconds
@@ -56,6 +71,22 @@ const uint16_t ADDR_ACTUAL = 10;
 const uint16_t ADDR_MIN = 20;
 const uint16_t ADDR_MAX = 30;
 const uint16_t ADDR_LOGICAL = 100;
+const uint16_t ADDR_SPEED = 106;
+
+const uint16_t ADDR_BAUD = 200;
+
+// Serial1 baud rates selectable through ADDR_BAUD
+const uint32_t BAUD_RATES[] = {9600, 19200, 38400, 57600, 115200, 250000, 500000};
+#define NUM_BAUD_RATES (sizeof(BAUD_RATES) / sizeof(BAUD_RATES[0]))
+#define BAUD_PROBATION 2000           // ms to confirm a new rate
+uint16_t baud_code = 0;
+int16_t baud_pending = -1;            // code to switch to once the reply is sent
+bool baud_probation = false;
+unsigned long baud_switched = 0;
+
+// values_actual is published to the actual registers this often, ms
+#define PUBLISH_PERIOD 20
+unsigned long last_publish = 0;
 
 // Servo setup
 Servo servos[NUM_SERVOS];
@@ -100,6 +131,10 @@ uint16_t onHregSet(TRegister* reg, uint16_t val) {
     values_logical_target[idx] = constrain(map(values_actual[idx], values_min[idx], values_max[idx], LOGICAL_MIN, LOGICAL_MAX), LOGICAL_MIN, LOGICAL_MAX);
     values_logical[idx] = values_logical_target[idx];
     servos[idx].writeMicroseconds(values_actual[idx]);
+    // keep the logical register in step, the PC caches what it last wrote there
+    mb.cbDisable();
+    mb.Hreg(ADDR_LOGICAL + idx, values_logical_target[idx]);
+    mb.cbEnable();
     snprintf(buffer, sizeof(buffer), "act [%d]: %d (%d)", idx, values_actual[idx], val);
   }
 
@@ -114,6 +149,14 @@ uint16_t onHregSet(TRegister* reg, uint16_t val) {
     snprintf(buffer, sizeof(buffer), "log [%d]: %d (%d)", idx, values_logical_target[idx], val);
   }
 
+  // Update speed. Used by the timer from its next tick
+  else if (addr >= ADDR_SPEED && addr < ADDR_SPEED + NUM_SERVOS) {
+    int idx = addr - ADDR_SPEED;
+    val = constrain(val, 0, LOGICAL_MAX);
+    delta_logical[idx] = val ? val : LOGICAL_MAX;  // 0 - no ramp
+    snprintf(buffer, sizeof(buffer), "spd [%d]: %d", idx, val);
+  }
+
   // Update min values and save to EEPROM
   else if (addr >= ADDR_MIN && addr < ADDR_MIN + NUM_SERVOS) {
     int idx = addr - ADDR_MIN;
@@ -130,6 +173,22 @@ uint16_t onHregSet(TRegister* reg, uint16_t val) {
     snprintf(buffer, sizeof(buffer), "max [%d]: %d", idx, val);
   }
 
+  // Switch Serial1 baud rate. Done in loop() after the reply went out at the old rate
+  else if (addr == ADDR_BAUD) {
+    if (val >= NUM_BAUD_RATES) {
+      snprintf(buffer, sizeof(buffer), "baud: invalid code %d", val);
+      Serial.println(buffer);
+      return baud_code;
+    }
+    if (val == baud_code) {
+      baud_probation = false;  // written again at the new rate - confirmed
+      snprintf(buffer, sizeof(buffer), "baud: %ld confirmed", BAUD_RATES[val]);
+    } else {
+      baud_pending = val;
+      snprintf(buffer, sizeof(buffer), "baud: switch to %ld", BAUD_RATES[val]);
+    }
+  }
+
   else {
     snprintf(buffer, sizeof(buffer), "Error set: unknown addr [%d]: %d", addr, val);
   }
@@ -138,6 +197,33 @@ uint16_t onHregSet(TRegister* reg, uint16_t val) {
   return val;
 }
 
+// copy values_actual to the actual registers so a poll reads where the servos are.
+// callbacks are disabled, Hreg() would call onHregSet() and treat it as a new command
+void publishActual() {
+  uint16_t snapshot[NUM_SERVOS];
+  noInterrupts();  // values_actual is updated by the timer interrupt
+  memcpy(snapshot, values_actual, sizeof(snapshot));
+  interrupts();
+  mb.cbDisable();
+  for (int i = 0; i < NUM_SERVOS; i++) {
+    mb.Hreg(ADDR_ACTUAL + i, snapshot[i]);
+  }
+  mb.cbEnable();
+}
+
+// reopen Serial1 at BAUD_RATES[code]. modbus-esp8266 assumes 9600 on AVR,
+// so the RTU inter-frame time (t3.5, 1750 us above 19200) is set explicitly
+void setBaud(uint16_t code) {
+  Serial1.flush();  // let the pending reply leave at the old rate
+  Serial1.end();
+  Serial1.begin(BAUD_RATES[code]);
+  mb.setBaudrate(BAUD_RATES[code]);
+  baud_code = code;
+  mb.cbDisable();
+  mb.Hreg(ADDR_BAUD, baud_code);
+  mb.cbEnable();
+}
+
 void setup() {
   char buffer[64]; // print buffer
 
@@ -147,16 +233,23 @@ void setup() {
   // config modbus - Serial1 (tx: d18, rx: d19)
   Serial1.begin(9600);
   mb.begin(&Serial1);
-  mb.slave(1);
+  mb.setBaudrate(BAUD_RATES[0]);
+  mb.slave(MODBUS_UNIT_ID);
 
   mb.addHreg(ADDR_ACTUAL,  ACTUAL_DEFAULT,  NUM_SERVOS);
   mb.addHreg(ADDR_MIN,     ACTUAL_MIN,      NUM_SERVOS);
   mb.addHreg(ADDR_MAX,     ACTUAL_MAX,      NUM_SERVOS);
   mb.addHreg(ADDR_LOGICAL, LOGICAL_DEFAULT, NUM_SERVOS);
+  mb.addHreg(ADDR_SPEED,   DEFAULT_DELTA,   NUM_SERVOS);
+  mb.addHreg(ADDR_ACTUAL + NUM_SERVOS, 0, ADDR_MIN - ADDR_ACTUAL - NUM_SERVOS);  // gap fillers
+  mb.addHreg(ADDR_MIN + NUM_SERVOS,    0, ADDR_MAX - ADDR_MIN - NUM_SERVOS);     // gap fillers
   mb.onSetHreg(ADDR_ACTUAL,  onHregSet, NUM_SERVOS);  // register write callback
   mb.onSetHreg(ADDR_MIN,     onHregSet, NUM_SERVOS);  // register write callback
   mb.onSetHreg(ADDR_MAX,     onHregSet, NUM_SERVOS);  // register write callback
   mb.onSetHreg(ADDR_LOGICAL, onHregSet, NUM_SERVOS);  // register write callback
+  mb.onSetHreg(ADDR_SPEED,   onHregSet, NUM_SERVOS);  // register write callback
+  mb.addHreg(ADDR_BAUD, 0);
+  mb.onSetHreg(ADDR_BAUD, onHregSet);                  // register write callback
 
   // setup initial values
   for (int i = 0; i < NUM_SERVOS; i++) {
@@ -172,6 +265,7 @@ void setup() {
     values_actual[i] = (values_min[i] + values_max[i]) / 2;
     values_logical_target[i] = constrain(map(values_actual[i], values_min[i], values_max[i], LOGICAL_MIN, LOGICAL_MAX), LOGICAL_MIN, LOGICAL_MAX);
     values_logical[i] = values_logical_target[i];
+    delta_logical[i] = DEFAULT_DELTA;  // an initializer list would only set element 0
 
     // Set corresponding registers
     // TODO better to set as an array but somewhy mb.Hreg(addr, array, len) does not work
@@ -199,4 +293,18 @@ void setup() {
 
 void loop() {
   mb.task();
+  if (baud_pending >= 0) {
+    setBaud(baud_pending);
+    baud_pending = -1;
+    baud_probation = true;
+    baud_switched = millis();
+  }
+  if (baud_probation && millis() - baud_switched >= BAUD_PROBATION) {
+    baud_probation = false;
+    setBaud(0);  // never confirmed, the master can not hear us - back to 9600
+  }
+  if (millis() - last_publish >= PUBLISH_PERIOD) {
+    last_publish = millis();
+    publishActual();
+  }
 }
@@ -0,0 +1,315 @@
+# hand-stand/test/bench-pc-app/bench-pc-app.py
+# Copyright (C) 2025 Petro Kulakov <https://github.com/koolakoff/hand-stand>
+# This file is part of hand-stand project and is licensed under the GPLv3.
+# See the LICENSE file in the root directory for full details.
+
+# Command path benchmark against the controller simulator (pc-app/controller_sim.py).
+#
+# Measures, through the same session / coalescer / playback code the app uses:
+#   - end-to-end latency of write_register (FC6) and write_logical_array (FC16), percentiles
+#   - one full 6-servo update as 6 x FC6 vs 1 x FC16
+#   - pipelined commands per second
+#   - slider drag through the write coalescer: frames on the bus and lag to the device
+#   - script playback timing error, send time and completion on the device
+#   - Stop with playback rows queued: drop plus hold, until the hold is answered
+#   - the same while the request on the wire gets no reply
+# Results go to a json file and are compared with baseline.json next to this
+# script; a metric worse than its baseline by more than --tolerance fails the run
+# (with --quick, only p50/p95 and the other non-tail metrics are gated).
+#
+# Usage:
+#   python test/bench-pc-app/bench-pc-app.py [--transport inproc|pty] [--backend thread|asyncio]
+#                                            [--output results.json] [--save-baseline] [--quick]
+
+import argparse
+import concurrent.futures
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "pc-app"))
+
+from command_lanes import LANE_PLAYBACK  # noqa: E402
+from controller_sim import SIM_PORT, ControllerSimulator  # noqa: E402
+from playback import PlaybackEngine  # noqa: E402
+from registers import NUM_SERVOS, VALUES_ACTUAL_ADDR, VALUES_LOGICAL_ADDR  # noqa: E402
+from write_coalescer import WriteCoalescer  # noqa: E402
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_TOLERANCE = 0.25
+ABS_SLACK_MS = 10.0     # scheduler noise on a busy machine, not a regression
+RESULT_TIMEOUT = 5.0
+LOST_UNIT = 77          # no simulator answers to it
+
+
+def percentiles(samples, prefix):
+    ms = np.asarray(samples) * 1000.0
+    return {f"{prefix}_p50_ms": float(np.percentile(ms, 50)),
+            f"{prefix}_p95_ms": float(np.percentile(ms, 95)),
+            f"{prefix}_p99_ms": float(np.percentile(ms, 99)),
+            f"{prefix}_max_ms": float(ms.max())}
+
+
+def timed(call):
+    t = time.perf_counter()
+    call().result(RESULT_TIMEOUT)
+    return time.perf_counter() - t
+
+
+# ---- benchmarks ----
+
+def bench_write_register(session, n):
+    samples = [timed(lambda i=i: session.write_register(VALUES_ACTUAL_ADDR, 1000 + i % 500)) for i in range(n)]
+    return percentiles(samples, "write_register")
+
+
+def bench_write_logical_array(session, n):
+    samples = [timed(lambda i=i: session.write_registers(VALUES_LOGICAL_ADDR, [i % 1000] * NUM_SERVOS))
+               for i in range(n)]
+    return percentiles(samples, "write_logical_array")
+
+
+# the same 6-servo update sent register by register and as one FC16 batch
+def bench_update_all(session, n):
+    per_register, batch = [], []
+    for i in range(n):
+        t = time.perf_counter()
+        futures = [session.write_register(VALUES_LOGICAL_ADDR + k, (i + k) % 1000) for k in range(NUM_SERVOS)]
+        for future in futures:
+            future.result(RESULT_TIMEOUT)
+        per_register.append(time.perf_counter() - t)
+        batch.append(timed(lambda i=i: session.write_registers(VALUES_LOGICAL_ADDR, [i % 1000] * NUM_SERVOS)))
+    return {"update6_fc6_ms": float(np.mean(per_register) * 1000.0),
+            "update6_fc16_ms": float(np.mean(batch) * 1000.0)}
+
+
+def bench_throughput(session, n):
+    t = time.perf_counter()
+    futures = [session.write_register(VALUES_ACTUAL_ADDR + i % NUM_SERVOS, 1000 + i % 500) for i in range(n)]
+    for future in futures:
+        future.result(RESULT_TIMEOUT * n)
+    return {"commands_per_s": n / (time.perf_counter() - t)}
+
+
+# 6 sliders dragged at rate Hz, every event goes through the coalescer like in the GUI
+def bench_slider_drag(session, simulator, duration, rate=200.0):
+    requests_before = simulator.stats["requests"]
+    coalescer = WriteCoalescer(lambda address, values: session.write_registers(address, values)).start()
+    events = int(duration * rate)
+    start = time.monotonic()
+    for i in range(events):
+        for k in range(NUM_SERVOS):
+            coalescer.set(VALUES_LOGICAL_ADDR + k, (i + k * 50) % 1000)
+        delay = start + (i + 1) / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    final = [((events - 1) + k * 50) % 1000 for k in range(NUM_SERVOS)]
+    released = time.monotonic()
+    # lag: from the last slider event until the device holds the final values
+    registers = simulator.model.registers
+    while [registers[VALUES_LOGICAL_ADDR + k] for k in range(NUM_SERVOS)] != final:
+        if time.monotonic() - released > RESULT_TIMEOUT:
+            raise RuntimeError("slider drag: final values never reached the device")
+        time.sleep(0.001)
+    lag = time.monotonic() - released
+    coalescer.stop()
+    stats = coalescer.stats()
+    frames = simulator.stats["requests"] - requests_before
+    return {"drag_events_per_s": stats["events"] / (released - start),
+            "drag_bus_frames_per_s": frames / (released - start),
+            "drag_lag_ms": lag * 1000.0}
+
+
+def bench_playback(session, rows, delay_ms):
+    completion = []
+
+    def send(values):
+        sent = time.monotonic()
+        future = session.write_registers(VALUES_LOGICAL_ADDR, values)
+        future.add_done_callback(lambda f: completion.append(time.monotonic() - sent))
+
+    frames = [([(i * 97 + k * 131) % 1000 for k in range(NUM_SERVOS)], delay_ms) for i in range(rows)]
+    start = time.monotonic()
+    engine = PlaybackEngine(frames, send).start()
+    engine.join()
+    deadline = time.monotonic() + RESULT_TIMEOUT
+    while len(completion) < rows and time.monotonic() < deadline:
+        time.sleep(0.01)
+    report = engine.timing_report()
+    duration = time.monotonic() - start
+    expected = rows * delay_ms / 1000.0
+    result = {"playback_" + key: value for key, value in report.items() if key.endswith("_ms")}
+    result.update(percentiles(completion, "playback_completion"))
+    result["playback_overrun_ms"] = max(0.0, duration - expected) * 1000.0
+    return result
+
+
+# rows queued behind the one on the wire, then Stop: the hold must not wait for them
+def bench_stop(session, trials, queued=20):
+    samples = []
+    dropped = 0
+    for trial in range(trials):
+        futures = [session.write_registers(VALUES_LOGICAL_ADDR,
+                                           [(trial * 7 + i * 37 + k * 131) % 1000 for k in range(NUM_SERVOS)],
+                                           lane=LANE_PLAYBACK)
+                   for i in range(queued)]
+        time.sleep(0.01)
+        t = time.perf_counter()
+        dropped += session.drop()
+        session.hold().result(RESULT_TIMEOUT)
+        samples.append(time.perf_counter() - t)
+        concurrent.futures.wait(futures, RESULT_TIMEOUT)
+    result = percentiles(samples, "stop")
+    result["stop_dropped_rows"] = dropped / trials
+    return result
+
+
+# Stop while the request on the wire gets no reply (a unit nobody answers to): the hold waits
+# for that request to time out, once - the client must not retry it
+def bench_stop_lost_reply(session, trials, queued=5):
+    samples = []
+    for trial in range(trials):
+        lost = session.read_registers(VALUES_ACTUAL_ADDR, NUM_SERVOS, unit=LOST_UNIT, lane=LANE_PLAYBACK)
+        futures = [session.write_registers(VALUES_LOGICAL_ADDR, [(trial * 7 + i * 37) % 1000] * NUM_SERVOS,
+                                           lane=LANE_PLAYBACK)
+                   for i in range(queued)]
+        time.sleep(0.05)
+        t = time.perf_counter()
+        session.drop()
+        session.hold().result(RESULT_TIMEOUT * 2)
+        samples.append(time.perf_counter() - t)
+        concurrent.futures.wait([lost] + futures, RESULT_TIMEOUT)
+    return percentiles(samples, "stop_lost_reply")
+
+
+# ---- baseline comparison ----
+
+def lower_is_better(name):
+    return not name.endswith("_per_s")
+
+
+# p99 and max of a --quick run come from a handful of samples, one slow sample is both
+def tail_metric(name):
+    return name.endswith(("_p99_ms", "_max_ms")) or "_max_" in name
+
+
+def compare(metrics, baseline, tolerance, tails=True):
+    regressions = []
+    for name, base in baseline.items():
+        if name not in metrics or (not tails and tail_metric(name)):
+            continue
+        value = metrics[name]
+        if lower_is_better(name):
+            limit = base * (1 + tolerance) + (ABS_SLACK_MS if name.endswith("_ms") else 0.0)
+            if value > limit:
+                regressions.append(f"{name}: {value:.2f} > {limit:.2f} (baseline {base:.2f})")
+        else:
+            limit = base * (1 - tolerance)
+            if value < limit:
+                regressions.append(f"{name}: {value:.2f} < {limit:.2f} (baseline {base:.2f})")
+    return regressions
+
+
+def config_name(args):
+    name = f"{args.backend}-{args.transport}-{args.baud}"
+    return name if args.wire_timing else name + "-nowire"
+
+
+def open_session(args, simulator):
+    if args.backend == "asyncio":
+        from async_session import AsyncModbusSession
+        session = AsyncModbusSession(simulator.open_pty(), baudrate=args.baud)
+    elif args.transport == "pty":
+        from modbus_session import ModbusSession
+        session = ModbusSession(simulator.open_pty(), baudrate=args.baud)
+    else:
+        from modbus_session import ModbusSession
+        session = ModbusSession(SIM_PORT, baudrate=args.baud, client_factory=simulator.client_factory)
+    session.start()
+    deadline = time.monotonic() + RESULT_TIMEOUT
+    while not session.connected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return session
+
+
+def run(args):
+    # --quick only takes fewer latency samples, drag and playback keep their workload comparable
+    n = 20 if args.quick else 100
+    simulator = ControllerSimulator(realtime=args.wire_timing).start()  # boots at 9600, the session negotiates --baud
+    session = open_session(args, simulator)
+    metrics = {}
+    try:
+        for name, bench in [("write_register", lambda: bench_write_register(session, n)),
+                            ("write_logical_array", lambda: bench_write_logical_array(session, n)),
+                            ("update_all", lambda: bench_update_all(session, n // 4)),
+                            ("throughput", lambda: bench_throughput(session, n)),
+                            ("slider_drag", lambda: bench_slider_drag(session, simulator, 2.0)),
+                            ("playback", lambda: bench_playback(session, 20, 150)),
+                            ("stop", lambda: bench_stop(session, n // 10)),
+                            ("stop_lost_reply", lambda: bench_stop_lost_reply(session, max(3, n // 20)))]:
+            t = time.perf_counter()
+            result = bench()
+            metrics.update(result)
+            print(f"{name:20s} {time.perf_counter() - t:6.2f} s  " +
+                  "  ".join(f"{key}={value:.2f}" for key, value in result.items()))
+    finally:
+        session.close()
+        simulator.stop()
+
+    config = config_name(args)
+    results = {"config": config,
+               "meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                        "platform": platform.platform(), "quick": args.quick,
+                        "simulator": simulator.stats},
+               "metrics": metrics}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baselines = json.load(f)
+    if args.save_baseline:
+        baselines[config] = metrics
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"baseline {config} saved to {args.baseline}")
+        return 0
+    if config not in baselines:
+        print(f"no baseline for {config}, nothing to compare")
+        return 0
+    # --quick reports the tails but gates p50/p95 only
+    regressions = compare(metrics, baselines[config], args.tolerance, tails=not args.quick)
+    for line in regressions:
+        print("REGRESSION", line)
+    print(f"{len(regressions)} regressions against baseline {config}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pc-app command path against the simulator")
+    parser.add_argument("--transport", choices=["inproc", "pty"], default="inproc")
+    parser.add_argument("--backend", choices=["thread", "asyncio"], default="thread",
+                        help="asyncio always runs over a pty")
+    parser.add_argument("--baud", type=int, default=9600, help="link baud rate negotiated with the simulator")
+    parser.add_argument("--no-wire-timing", dest="wire_timing", action="store_false",
+                        help="answer instantly, measures the PC side only")
+    parser.add_argument("--output", help="write results to this json file")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline json file")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative regression, 0.25 = 25%%")
+    parser.add_argument("--quick", action="store_true", help="fewer latency samples, p99 and max are not gated")
+    args = parser.parse_args(argv)
+    if args.backend == "asyncio":
+        args.transport = "pty"
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,8 @@
 # Test app. Work with modbus. Read array, write array and read again to validate
 # uses 2nd com port in thse system (suppose 1st is used by arduino serial monitor)
+# or the port given as the first argument, e.g. the pty of pc-app/controller_sim.py
 
+import sys
 import serial.tools.list_ports
 from pymodbus.client import ModbusSerialClient
 
@@ -13,7 +15,7 @@ def find_first_serial_port():
     return ports[1].device  # Example: 'COM3', 'COM5', etc. - use second [1] port in the system
 
 # Main code
-serial_port = find_first_serial_port()
+serial_port = sys.argv[1] if len(sys.argv) > 1 else find_first_serial_port()
 if serial_port is None:
     exit()
 